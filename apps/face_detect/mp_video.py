@@ -1,8 +1,10 @@
 # Multiprocessing video with queue
    
+import argparse
 import multiprocessing as mp
 
 import os
+import sys
 import cv2    
 import time
 import ctypes
@@ -11,6 +13,8 @@ import threading
 from detect_ap2 import det_preprocess, det_postprocess
 
 from xfdnn.rt import xdnn
+from xfdnn.rt.xdnn_affinity import Placement
+from xfdnn.rt.xdnn_shm import SharedMemoryRing
 import numpy as np
 
 ##################################################
@@ -19,91 +23,22 @@ import numpy as np
 num_shared_slots = 200
     
 
-# Current version does copies...
-# Assumes all types are np.float32/ctypes.c_float
-class SharedMemoryQueue:
-    def __init__(self, name, length, buf_shapes_list):
-
-        print "Creating SharedMemoryQueue",name
-        self._name = name
-        self._len = length
-
-        # Hard coded for floats...
-        self._mem_type = ctypes.c_float
-        self._np_type = np.float32
-        
-        # put() function copies into the free list
-        self._freeList = mp.Queue(length)
-
-        # get() function gets id of open slot. consumer needs to confirm when data is read
-        self._readList = mp.Queue(length)
-
-        self._buf_shapes_list = buf_shapes_list
-        self._buf_sizes_list = map(lambda x: np.prod(x), buf_shapes_list)
-
-        print "Creating Shared Memory with buf_shape_list=",self._buf_shapes_list
-        
-        self._shared_memory_arrs = list()
-        for i in range(length):
-            buf_list = list()
-            for buf_size in self._buf_sizes_list:
-                buf_list.append(mp.Array(self._mem_type, buf_size))
-            self._shared_memory_arrs.append(buf_list)
-            self._freeList.put(i)
-
-        
-    def close(self):
-        self._readList.put(None)
-
-
-    def accessBuffer(self, slot_id):
-        return self._shared_memory_arrs[slot_id]
-
-
-    def accessNumpyBuffer(self, slot_id):
-        buf_list = list()
-        for i in range(len(self._buf_shapes_list)):
-            np_arr = np.frombuffer(self._shared_memory_arrs[slot_id][i].get_obj(), dtype = self._np_type)
-            np_arr = np.reshape(np_arr, self._buf_shapes_list[i], order = 'C')
-            buf_list.append(np_arr)
-        
-        return buf_list
-
-    
-    def openWriteId(self):
-        id = self._freeList.get()
-        return id
-
-
-    def closeWriteId(self, id):
-        # finished writing slot id 
-        self._readList.put(id)
-
-
-    def openReadId(self):
-        id = self._readList.get()
-        return id
-
-
-    def closeReadId(self, id):
-        # finished reading slot id
-        self._freeList.put(id)
-
-
-    def dump(self):
-        for i in range(self._len):
-          buf_list = self.accessNumpyBUffer(i)
-          for np_arr in buf_list:
-              print "Slot=",i,"Array=",j,"Val=",np_arr
-        
-
-
-
 import inspect
 def funcname():
     return inspect.stack()[1][0].f_code.co_name
 
-def cam_loop(shared_frame_arrs, ready_fpga):
+def place_stage(placement, stage):
+    # pin the calling process before it starts any thread, and report it
+    if not placement:
+        return
+    placement.apply(stage)
+    # one write per line so lines of concurrently starting stages do not interleave
+    for line in placement.report({stage: [os.getpid()]}):
+        sys.stdout.write("[placement] %s\n" % line)
+    sys.stdout.flush()
+
+def cam_loop(shared_frame_arrs, ready_fpga, placement):
+    place_stage(placement, 'cam')
     cap = cv2.VideoCapture('Pedestrians.mp4')
 
     # First read frames into a list
@@ -137,7 +72,8 @@ def cam_loop(shared_frame_arrs, ready_fpga):
     print('{0} cam loading time: {1} seconds'.format(funcname(),end_time - start_time))
 
 
-def detect_pre(shared_frame_arrs, shared_trans_arrs):
+def detect_pre(shared_frame_arrs, shared_trans_arrs, placement):
+    place_stage(placement, 'pre')
 
     start_time = None
     frame_id = 0
@@ -186,7 +122,8 @@ def fpga_wait( fpgaRT, qWait, shared_output_arrs):
     frame_id += 1
 
 
-def detect_forward(shared_trans_arrs, shared_output_arrs, ready_fpga):
+def detect_forward(shared_trans_arrs, shared_output_arrs, ready_fpga, placement):
+    place_stage(placement, 'fpga')
 
     MLSUITE_ROOT = os.getenv("MLSUITE_ROOT","/opt/ml-suite")
     MLSUITE_PLATFORM = os.getenv("MLSUITE_PLATFORM","alveo-u200")
@@ -247,7 +184,8 @@ def detect_forward(shared_trans_arrs, shared_output_arrs, ready_fpga):
     t.join()
 
 
-def detect_post(shared_output_arrs, face_q):
+def detect_post(shared_output_arrs, face_q, placement):
+    place_stage(placement, 'post')
     start_time = None
     frame_cnt = 0
     while True:
@@ -276,7 +214,8 @@ def detect_post(shared_output_arrs, face_q):
     print('Total run: {0} frames in {1} seconds ({2} fps)'.format(frame_cnt, total_time, frame_cnt/total_time))
 
             
-def show_loop(face_q):
+def show_loop(face_q, placement):
+    place_stage(placement, 'show')
 
     cv2.namedWindow('face_detection')
     frame_id = 0
@@ -314,6 +253,13 @@ def show_loop(face_q):
  
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    for stage in ('cam', 'pre', 'fpga', 'post', 'show'):
+        parser.add_argument('--cpus_%s' % stage, default=None,
+                            help='CPUs for the %s process, as a cpu list (0-3,8) or node:N' % stage)
+    parser.add_argument('--shm_node', type=int, default=-1,
+                        help='NUMA node to allocate shared-memory slots on; -1 leaves it to the kernel')
+    placement = Placement.fromArgs(vars(parser.parse_args()), ('cam', 'pre', 'fpga', 'post', 'show'))
  
     frame_q = mp.Queue()
     resize_q = mp.Queue()
@@ -336,23 +282,30 @@ if __name__ == '__main__':
     print input_shapes
     print output_shapes
 
-    # shared memory from video capture to preprocessing
-    shared_frame_arrs = SharedMemoryQueue("frame",num_shared_slots, [(320,320,3)])
+    with placement.shmScope():
+        # shared memory from video capture to preprocessing
+        shared_frame_arrs = SharedMemoryRing("frame",num_shared_slots, [(320,320,3)])
+
+        # shared memory from preprocessing to fpga forward
+        shared_trans_arrs = SharedMemoryRing("trans",num_shared_slots, [(320,320,3)]+input_shapes)
 
-    # shared memory from preprocessing to fpga forward
-    shared_trans_arrs = SharedMemoryQueue("trans",num_shared_slots, [(320,320,3)]+input_shapes)
+        # shared memory from fpga forward to postprocessing
+        shared_output_arrs = SharedMemoryRing("output",num_shared_slots, [(320,320,3)]+output_shapes)
 
-    # shared memory from fpga forward to postprocessing
-    shared_output_arrs = SharedMemoryQueue("output",num_shared_slots, [(320,320,3)]+output_shapes)
+        # shared memory from postprocessing to display
+        shared_display_arrs = SharedMemoryRing("display",num_shared_slots, [320*320*3])
 
-    # shared memory from postprocessing to display
-    shared_display_arrs = SharedMemoryQueue("display",num_shared_slots, [320*320*3])
+    if placement:
+        segments = {'frame': shared_frame_arrs.baseAddress(), 'trans': shared_trans_arrs.baseAddress(),
+                    'output': shared_output_arrs.baseAddress(), 'display': shared_display_arrs.baseAddress()}
+        for line in placement.report({}, segments):
+            print "[placement] %s" % line
 
-    cam_process = mp.Process(target=cam_loop,args=(shared_frame_arrs,ready_fpga, ))
-    detect_process1 = mp.Process(target=detect_pre,args=(shared_frame_arrs,shared_trans_arrs, ))
-    detect_process2 = mp.Process(target=detect_forward,args=(shared_trans_arrs, shared_output_arrs, ready_fpga, ))
-    detect_process3 = mp.Process(target=detect_post,args=(shared_output_arrs, face_q, ))
-    show_process = mp.Process(target=show_loop,args=(face_q, ))
+    cam_process = mp.Process(target=cam_loop,args=(shared_frame_arrs,ready_fpga, placement, ))
+    detect_process1 = mp.Process(target=detect_pre,args=(shared_frame_arrs,shared_trans_arrs, placement, ))
+    detect_process2 = mp.Process(target=detect_forward,args=(shared_trans_arrs, shared_output_arrs, ready_fpga, placement, ))
+    detect_process3 = mp.Process(target=detect_post,args=(shared_output_arrs, face_q, placement, ))
+    show_process = mp.Process(target=show_loop,args=(face_q, placement, ))
 
     start_time = time.time()     
     cam_process.start()
@@ -1,9 +1,8 @@
 import numpy as np
 
-import nms
 import time
 
-from  yolo_utils import process_all_yolo_layers,  apply_nms 
+from  yolo_utils import decode_yolo_layers,  apply_nms_batch
 from xfdnn.rt import xdnn_io
 
 def correct_region_boxes(boxes_array, x_idx, y_idx, w_idx, h_idx, w, h, net_w, net_h):
@@ -38,35 +37,19 @@ def det_preprocess(image, dest, net_h, net_w):
 # returns bounding boxes
 def det_postprocess(fpgaOutput, config, image_shape):
     #print fpgaOutput[0].shape , fpgaOutput[1].shape,  config['classes'], config['anchorCnt'], config['net_w'], config['net_h']    
-    out_yolo_layers = process_all_yolo_layers(fpgaOutput, config['classes'], config['anchorCnt'], config['net_w'], config['net_h'])
     anchorCnt = config['anchorCnt']
     classes =  config['classes']
     
-    num_proposals_layer=[0]
-    total_proposals = 0
-    for layr_idx in range (len(out_yolo_layers)):
-        yolo_layer_shape = out_yolo_layers[layr_idx].shape
-        #print "layr_idx , yolo_layer_shape", layr_idx , yolo_layer_shape
-        out_yolo_layers[layr_idx] = out_yolo_layers[layr_idx].reshape(yolo_layer_shape[0], anchorCnt, (5+classes), yolo_layer_shape[2]*yolo_layer_shape[3])
-        out_yolo_layers[layr_idx] = out_yolo_layers[layr_idx].transpose(0,3,1,2)
-        out_yolo_layers[layr_idx] = out_yolo_layers[layr_idx].reshape(yolo_layer_shape[0],yolo_layer_shape[2]*yolo_layer_shape[3] * anchorCnt, (5+classes))           
-        #print "layr_idx, final in layer sape, outlayer shape", layr_idx, yolo_layer_shape, out_yolo_layers[layr_idx].shape
-        total_proposals += yolo_layer_shape[2]*yolo_layer_shape[3] * anchorCnt
-        num_proposals_layer.append(total_proposals)
-        
-    boxes_array = np.empty([config['batch_sz'], total_proposals, (5+classes)])
-    
-    
-    for layr_idx in range (len(out_yolo_layers)):
-        proposal_st = num_proposals_layer[layr_idx]
-        proposal_ed = num_proposals_layer[layr_idx + 1]
-        #print "proposal_st proposal_ed", proposal_st, proposal_ed
-        boxes_array[:,proposal_st:proposal_ed,:] = out_yolo_layers[layr_idx][...]
+    # only proposals scoring scorethresh for some class become boxes
+    boxes_array, num_boxes = decode_yolo_layers(fpgaOutput, classes, anchorCnt, config['net_w'], config['net_h'], config['scorethresh'])
     
+    for i in range(config['batch_sz']):
+        boxes_array[i,:num_boxes[i],:] = correct_region_boxes(boxes_array[i,:num_boxes[i],:], 0, 1, 2, 3, float(image_shape[i][1]), float(image_shape[i][0]), float(config['net_w']), float(config['net_h']))
+    detected_boxes_for_images = apply_nms_batch(boxes_array, classes, config['scorethresh'], config['iouthresh'])
+
     bboxlist_for_images = []    
     for i in range(config['batch_sz']):
-        boxes_array[i,:,:] = correct_region_boxes(boxes_array[i,:,:], 0, 1, 2, 3, float(image_shape[i][1]), float(image_shape[i][0]), float(config['net_w']), float(config['net_h']))
-        detected_boxes = apply_nms(boxes_array[i,:,:], classes, config['scorethresh'], config['iouthresh'])
+        detected_boxes = detected_boxes_for_images[i]
         
         bboxlist=[]
         
@@ -31,50 +31,292 @@ class Bbox:
         self.x = x
         self.y = y
 
-class PR_info:
-    def __init__(self, precision=0.0, recall=0.0, tp=0.0,fp=0.0,fn=0.0):
-        self.precision = precision
-        self.recall = recall
-        self.tp = tp
-        self.fp = fp
-        self.fn = fn     	
-        
-class Detection_info:
-    def __init__(self, class_id=-1, prob=1.0, x=0.0,y=0.0,w=0.0,h=0.0, truth_flag=0, unique_truth_index=-1):
-        self.class_id = class_id
-        self.prob = prob
-        self.w = w
-        self.h = h
-        self.x = x
-        self.y = y
-        self.truth_flag = truth_flag
-        self.unique_truth_index = unique_truth_index
-        
-def compute_iou(gt_detection, detection):
-    
-    gt_x_start = gt_detection.x - gt_detection.w/2
-    gt_y_start = gt_detection.y - gt_detection.h/2
-    gt_x_end = gt_detection.x + gt_detection.w/2
-    gt_y_end = gt_detection.y + gt_detection.h/2
-    
-    x_start = detection.x - detection.w/2
-    y_start = detection.y - detection.h/2
-    x_end = detection.x + detection.w/2
-    y_end = detection.y + detection.h/2
-    
-    intersection_w = min(gt_x_end, x_end) - max(gt_x_start, x_start)
-    intersection_h = min(gt_y_end, y_end) - max(gt_y_start, y_start)
-    
-    if ((intersection_w < 0) or (intersection_h < 0)):
-        intersection_val = 0        
-    else:
-        intersection_val = intersection_w * intersection_h
-    
-    uniou_val = (gt_detection.w * gt_detection.h) + (detection.w * detection.h) - intersection_val
-    
-    return (intersection_val/uniou_val)    
-    
-        
+
+COCO_IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+DARKNET_RECALL_POINTS = np.arange(11) * 0.1
+COCO_RECALL_POINTS = np.linspace(0.0, 1.0, 101)
+
+
+def box_iou(boxes, gt_boxes):
+    """
+    :param boxes: [N, 4] center boxes (x, y, w, h).
+    :param gt_boxes: [N, 4] center boxes paired with boxes.
+    :returns: numpy.ndarray -- [N] IoU of each pair.
+    """
+    gt_x_start = gt_boxes[:, 0] - gt_boxes[:, 2]/2
+    gt_y_start = gt_boxes[:, 1] - gt_boxes[:, 3]/2
+    gt_x_end = gt_boxes[:, 0] + gt_boxes[:, 2]/2
+    gt_y_end = gt_boxes[:, 1] + gt_boxes[:, 3]/2
+
+    x_start = boxes[:, 0] - boxes[:, 2]/2
+    y_start = boxes[:, 1] - boxes[:, 3]/2
+    x_end = boxes[:, 0] + boxes[:, 2]/2
+    y_end = boxes[:, 1] + boxes[:, 3]/2
+
+    intersection_w = np.minimum(gt_x_end, x_end) - np.maximum(gt_x_start, x_start)
+    intersection_h = np.minimum(gt_y_end, y_end) - np.maximum(gt_y_start, y_start)
+    intersection_val = np.where((intersection_w < 0) | (intersection_h < 0), 0., intersection_w * intersection_h)
+
+    union_val = (gt_boxes[:, 2] * gt_boxes[:, 3]) + (boxes[:, 2] * boxes[:, 3]) - intersection_val
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return intersection_val / union_val
+
+
+def _candidate_pairs(det_images, det_boxes, gt_images, gt_boxes):
+    # every (detection, ground truth box) pair of the same image, grouped by detection
+    gt_order = np.argsort(gt_images, kind='mergesort')
+    sorted_images = gt_images[gt_order]
+    start = np.searchsorted(sorted_images, det_images, side='left')
+    counts = np.searchsorted(sorted_images, det_images, side='right') - start
+    det_idx = np.repeat(np.arange(len(det_images)), counts)
+    first = np.cumsum(counts) - counts
+    gt_idx = gt_order[start[det_idx] + np.arange(len(det_idx)) - first[det_idx]]
+    return det_idx, gt_idx, box_iou(det_boxes[det_idx], gt_boxes[gt_idx])
+
+
+def _greedy_matches(num_dets, num_gts, det_idx, gt_idx, iou, iou_thresh):
+    # detections in rank order take their best free ground truth box, as COCO and VOC do
+    valid = iou >= iou_thresh
+    det_idx, gt_idx, iou = det_idx[valid], gt_idx[valid], iou[valid]
+    order = np.lexsort((gt_idx, -iou, det_idx))
+    tp = np.zeros(num_dets, dtype=bool)
+    taken = np.zeros(num_gts, dtype=bool)
+    for det, gt in zip(det_idx[order].tolist(), gt_idx[order].tolist()):
+        if not tp[det] and not taken[gt]:
+            tp[det] = True
+            taken[gt] = True
+    return tp
+
+
+def _darknet_ap(tp, fp, num_gt):
+    # 11 point interpolated AP of darknet's detector map
+    tp = np.cumsum(tp, dtype=np.float64)
+    fp = np.cumsum(fp, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.)
+        recall = tp / num_gt if num_gt > 0 else np.zeros(len(tp))
+    avg_precision = 0
+    for cur_recall in DARKNET_RECALL_POINTS:
+        reached = precision[recall >= cur_recall]
+        avg_precision += max(reached.max(), 0) if len(reached) else 0
+    return avg_precision / 11
+
+
+def _envelope(tp, num_gt):
+    # recall and monotonically decreasing precision of the ranked detections
+    tp_sum = np.cumsum(tp, dtype=np.float64)
+    recall = tp_sum / num_gt
+    precision = tp_sum / np.arange(1, len(tp) + 1)
+    return recall, np.maximum.accumulate(precision[::-1])[::-1]
+
+
+def _voc_ap(tp, num_gt):
+    # all point interpolated AP (VOC2010 and later)
+    if len(tp) == 0:
+        return 0.
+    recall, precision = _envelope(tp, num_gt)
+    return float(np.sum(np.diff(np.concatenate(([0.], recall))) * precision))
+
+
+def _coco_ap(tp, num_gt):
+    # 101 point interpolated AP
+    if len(tp) == 0:
+        return 0.
+    recall, precision = _envelope(tp, num_gt)
+    idx = np.searchsorted(recall, COCO_RECALL_POINTS, side='left')
+    return float(np.where(idx < len(precision), precision[np.minimum(idx, len(precision) - 1)], 0.).mean())
+
+
+def _evaluate_class(job):
+    """
+    Matches and scores the detections of one class.
+
+    :param job: (det_images, det_scores, det_boxes, gt_images, gt_boxes, iou_thresh, metrics), detections in rank order.
+    :returns: dict -- 'matched' and 'iou' per detection (darknet matching), and the AP of each metric.
+    """
+    det_images, det_scores, det_boxes, gt_images, gt_boxes, iou_thresh, metrics = job
+    num_dets, num_gts = len(det_images), len(gt_images)
+    det_idx, gt_idx, iou = _candidate_pairs(det_images, det_boxes, gt_images, gt_boxes)
+    result = {}
+
+    # darknet: each detection is matched to its best box above iou_thresh on its own;
+    # only the best ranked detection of a box counts, later ones are neither TP nor FP
+    valid = (iou > iou_thresh) & (iou > 0)
+    order = np.lexsort((gt_idx[valid], -iou[valid], det_idx[valid]))
+    best_det, best_gt, best_iou = det_idx[valid][order], gt_idx[valid][order], iou[valid][order]
+    first = np.ones(len(best_det), dtype=bool)
+    first[1:] = best_det[1:] != best_det[:-1]
+    truth = np.full(num_dets, -1, dtype=np.int64)
+    truth[best_det[first]] = best_gt[first]
+    result['iou'] = np.zeros(num_dets)
+    result['iou'][best_det[first]] = best_iou[first]
+    result['matched'] = truth >= 0
+    if 'darknet' in metrics:
+        matched = np.flatnonzero(result['matched'])
+        counted = matched[np.unique(truth[matched], return_index=True)[1]]
+        tp = np.zeros(num_dets, dtype=bool)
+        tp[counted] = True
+        result['darknet'] = _darknet_ap(tp, ~result['matched'], num_gts)
+
+    if num_gts > 0:
+        if 'voc' in metrics:
+            result['voc'] = _voc_ap(_greedy_matches(num_dets, num_gts, det_idx, gt_idx, iou, iou_thresh), num_gts)
+        if 'coco' in metrics:
+            result['coco'] = float(np.mean([_coco_ap(_greedy_matches(num_dets, num_gts, det_idx, gt_idx, iou, t), num_gts)
+                                            for t in COCO_IOU_THRESHOLDS]))
+    return result
+
+
+class DetectionEvaluator:
+    """
+    Accumulates detections and ground truth as columnar arrays, and computes
+    per-class AP at any time, e.g. every few hundred images of a long run:
+
+      evaluator = DetectionEvaluator(len(class_names))
+      for image_id, ... in results:
+          evaluator.add_ground_truth(image_id, gt_classes, gt_boxes)
+          evaluator.add_detections(image_id, classes, scores, boxes)
+      ap = evaluator.evaluate()['darknet']
+
+    Boxes are (x, y, w, h) centers, in any unit shared by both. Only images
+    with ground truth (possibly empty) are evaluated. Metrics:
+
+      darknet   11 point AP with darknet's matching, as calc_detector_mAP
+      voc       all point AP at iou_thresh
+      coco      101 point AP averaged over IoU 0.5:0.95
+    """
+    def __init__(self, num_classes, iou_thresh=0.5):
+        """
+        :param num_classes: Number of classes.
+        :type num_classes: int.
+        :param iou_thresh: Overlap needed for a match (darknet: above it, voc: at least it).
+        :type iou_thresh: float.
+        """
+        self.num_classes = num_classes
+        self.iou_thresh = iou_thresh
+        self._imageIds = {}
+        self._annotated = set()    # images given ground truth
+        self._detected = set()     # images given detections
+        self._dets = []
+        self._gts = []
+        self._cache = {}    # (class, metrics) -> result, until the class gets new data
+
+    def _imageIndex(self, image_id):
+        return self._imageIds.setdefault(image_id, len(self._imageIds))
+
+    def _invalidate(self, classes):
+        stale = set(np.unique(classes).tolist())
+        for key in [k for k in self._cache if k[0] in stale]:
+            del self._cache[key]
+
+    def add_ground_truth(self, image_id, classes, boxes):
+        """
+        :param image_id: Any hashable image key, shared with add_detections.
+        :param classes: [N] class ids.
+        :param boxes: [N, 4] boxes.
+        """
+        classes = np.asarray(classes, dtype=np.int64).reshape(-1)
+        image = self._imageIndex(image_id)
+        if image not in self._annotated and image in self._detected:
+            # its earlier detections now count
+            self._cache.clear()
+        self._annotated.add(image)
+        self._gts.append((np.full(len(classes), image, dtype=np.int64), classes,
+                          np.asarray(boxes, dtype=np.float64).reshape(-1, 4)))
+        self._invalidate(classes)
+
+    def add_detections(self, image_id, classes, scores, boxes):
+        """
+        :param image_id: Any hashable image key, shared with add_ground_truth.
+        :param classes: [N] class ids.
+        :param scores: [N] confidences.
+        :param boxes: [N, 4] boxes.
+        """
+        classes = np.asarray(classes, dtype=np.int64).reshape(-1)
+        image = self._imageIndex(image_id)
+        self._detected.add(image)
+        self._dets.append((np.full(len(classes), image, dtype=np.int64), classes,
+                           np.asarray(scores, dtype=np.float64).reshape(-1),
+                           np.asarray(boxes, dtype=np.float64).reshape(-1, 4)))
+        self._invalidate(classes)
+
+    def _columns(self):
+        # compact the accumulated chunks, so later calls concatenate little
+        if not self._dets:
+            self._dets = [(np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0), np.zeros((0, 4)))]
+        if not self._gts:
+            self._gts = [(np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros((0, 4)))]
+        self._dets = [tuple(np.concatenate(c) for c in zip(*self._dets))]
+        self._gts = [tuple(np.concatenate(c) for c in zip(*self._gts))]
+        return self._dets[0], self._gts[0]
+
+    def evaluate(self, metrics=('darknet', 'voc', 'coco'), pool=None, prob_thresh=None):
+        """
+        :param metrics: AP flavours to compute, see the class docstring.
+        :type metrics: tuple.
+        :param pool: Optional multiprocessing.Pool to spread classes over.
+        :param prob_thresh: Also report darknet's TP/FP/average IoU for detections scoring above this.
+        :type prob_thresh: float.
+        :returns: dict -- per-class AP array and its mean as '<metric>' and '<metric>_mAP' for each metric. Classes without ground truth count as 0 in darknet's mean and are left out (nan) otherwise. With prob_thresh, also 'tp', 'fp', 'fn' and 'avg_iou'.
+        """
+        metrics = tuple(metrics)
+        (det_images, det_classes, det_scores, det_boxes), (gt_images, gt_classes, gt_boxes) = self._columns()
+
+        # rank by score, ties in the order added; ignore images without ground truth
+        evaluated = np.zeros(len(self._imageIds), dtype=bool)
+        evaluated[list(self._annotated)] = True
+        rank = np.argsort(-det_scores, kind='mergesort')
+        rank = rank[evaluated[det_images[rank]]]
+
+        todo = []
+        jobs = []
+        results = {}
+        for c in range(self.num_classes):
+            if (c, metrics) in self._cache:
+                results[c] = self._cache[(c, metrics)]
+                continue
+            dets = rank[det_classes[rank] == c]
+            gts = np.flatnonzero(gt_classes == c)
+            todo.append((c, dets))
+            jobs.append((det_images[dets], det_scores[dets], det_boxes[dets], gt_images[gts], gt_boxes[gts],
+                         self.iou_thresh, metrics))
+        done = pool.map(_evaluate_class, jobs) if pool is not None and len(jobs) > 1 else map(_evaluate_class, jobs)
+        for (c, dets), result in zip(todo, done):
+            result['dets'] = dets
+            results[c] = self._cache[(c, metrics)] = result
+
+        summary = {}
+        num_gt = np.bincount(gt_classes, minlength=self.num_classes)
+        for metric in metrics:
+            if metric == 'darknet':
+                ap = np.array([results[c]['darknet'] for c in range(self.num_classes)])
+                mean_average_precision = 0.0
+                for avg_precision in ap:
+                    mean_average_precision += avg_precision
+                summary['darknet_mAP'] = mean_average_precision / self.num_classes
+            else:
+                ap = np.array([results[c].get(metric, np.nan) for c in range(self.num_classes)])
+                summary[metric + '_mAP'] = float(np.nanmean(ap)) if (num_gt > 0).any() else 0.
+            summary[metric] = ap
+
+        if prob_thresh is not None:
+            matched = np.zeros(len(det_scores), dtype=bool)
+            ious = np.zeros(len(det_scores))
+            for c in range(self.num_classes):
+                matched[results[c]['dets']] = results[c]['matched']
+                ious[results[c]['dets']] = results[c]['iou']
+            scored = np.zeros(len(det_scores), dtype=bool)
+            scored[rank] = det_scores[rank] > prob_thresh
+            summary['tp'] = float(np.count_nonzero(scored & matched))
+            summary['fp'] = float(np.count_nonzero(scored & ~matched))
+            summary['fn'] = len(gt_classes) - summary['tp']
+            # running sum in the order added, as darknet adds them up
+            matched_ious = ious[scored & matched]
+            total_iou = np.cumsum(matched_ious)[-1] if len(matched_ious) else 0.
+            summary['avg_iou'] = total_iou / (summary['tp'] + summary['fp']) if summary['tp'] + summary['fp'] else 0.
+        return summary
+
+
 def list_lines(file_path):
     # open txt file lines to a list
     with open(file_path) as f:
@@ -82,7 +324,21 @@ def list_lines(file_path):
     content = [x.strip() for x in content]
     return content
         
-def calc_detector_mAP(labels_fpga_basepath, labels_gt_basepath, num_classes, class_names, thresh_calc_avg_iou, iou_thresh):
+def read_label_file(file_path, with_prob):
+    """
+    :param file_path: Darknet label file, "class [prob] x y w h" per line.
+    :param with_prob: Lines have a confidence column.
+    :returns: tuple -- classes, (probs,) and [N, 4] boxes as arrays.
+    """
+    rows = [line.split() for line in list_lines(file_path) if line]
+    cols = 6 if with_prob else 5
+    values = np.array(rows, dtype=np.float64).reshape(-1, cols)
+    classes = values[:, 0].astype(np.int64)
+    if with_prob:
+        return classes, values[:, 1], values[:, 2:]
+    return classes, values[:, 1:]
+
+def calc_detector_mAP(labels_fpga_basepath, labels_gt_basepath, num_classes, class_names, thresh_calc_avg_iou, iou_thresh, pool=None):
     
     name_list = os.listdir(labels_fpga_basepath)
     detect_box_files = sorted([os.path.join(labels_fpga_basepath,name) for name in name_list])
@@ -95,12 +351,7 @@ def calc_detector_mAP(labels_fpga_basepath, labels_gt_basepath, num_classes, cla
                 the_file.write("data/obj/"+name_new+".jpg\n")
     
     print("Number of label files found=", len(name_list)) 
-    gt_class_hist = np.zeros(num_classes)
-    detection_list = []
-    unique_truth_count = 0
-    avg_iou = 0.0
-    tp_for_thresh = 0.0
-    fp_for_thresh = 0.0
+    evaluator = DetectionEvaluator(num_classes, iou_thresh)
     
     for file_num in range(len(name_list)):
         gt_exists = os.path.exists(gt_box_files[file_num])
@@ -109,137 +360,19 @@ def calc_detector_mAP(labels_fpga_basepath, labels_gt_basepath, num_classes, cla
         if(gt_exists == False or dt_exists== False):
             continue
         
-        
-        list_detections_gt = list_lines(gt_box_files[file_num])
-        list_detections = list_lines(detect_box_files[file_num])
-#        print("file:",name_list[file_num], " has ", len(list_detections_gt), " gt lines and ",  len(list_detections), " detections")
-        gt_detections = []
-        
-        for line in list_detections_gt:
-            tmp_class_name, x, y, w, h = line.split()
-            detection = Detection_info(class_id = int(tmp_class_name),
-                                           prob = 1,
-                                           x = float(x),
-                                           y = float(y),
-                                           w= float(w),
-                                           h= float(h))
-            gt_class_hist[int(tmp_class_name)] = gt_class_hist[int(tmp_class_name)] + 1
-            gt_detections.append(detection)
-        
-        num_gt_labels = len(gt_detections)
-        
-        for line in list_detections:
-            tmp_class_name, confidence, x, y, w, h = line.split()
-            if(float(confidence) > 0):
-                detection = Detection_info(class_id = int(tmp_class_name),
-                                           prob = float(confidence),
-                                           x = float(x),
-                                           y = float(y),
-                                           w= float(w),
-                                           h= float(h))           
-                       
-                truth_index = -1
-                max_iou = 0.0
-                
-                for label_num in range(num_gt_labels):
-                    current_iou = compute_iou(gt_detections[label_num], detection)
-                    
-                    if((current_iou > iou_thresh) and (gt_detections[label_num].class_id == detection.class_id)):
-                        if(current_iou > max_iou):
-                            max_iou = current_iou
-                            truth_index = unique_truth_count + label_num
-                
-                if (truth_index > -1):
-                    detection.unique_truth_index = truth_index
-                    detection.truth_flag = 1
-                # changes may be needed related to difficult case
-                
-                detection_list.append(detection)
-		#print("detection.prob=",detection.prob,"  thresh_calc_avg_iou:",  thresh_calc_avg_iou)
-                if(detection.prob > thresh_calc_avg_iou):
-                    if(truth_index > -1):
-                        avg_iou += max_iou
-                        tp_for_thresh += 1
-                    else:
-                        fp_for_thresh += 1
-                #print("detection.prob=",detection.prob,"  thresh_calc_avg_iou:",  thresh_calc_avg_iou, " tp_for_thresh:", tp_for_thresh)
-        unique_truth_count += num_gt_labels
-        
+        evaluator.add_ground_truth(file_num, *read_label_file(gt_box_files[file_num], False))
+        classes, probs, boxes = read_label_file(detect_box_files[file_num], True)
+        keep = probs > 0
+        evaluator.add_detections(file_num, classes[keep], probs[keep], boxes[keep])
     
-    avg_iou = avg_iou / (tp_for_thresh + fp_for_thresh)    
-    detection_list.sort(key=lambda x: x.prob, reverse=True)
-    utc_array = np.zeros(unique_truth_count)
-    
-    PR_info_list_of_lists =[]
-    
-    
-    for rank in range(len(detection_list)):
-        
-        PR_info_list = []
-        if(rank > 0):
-            for class_um in range(num_classes):
-                PR_info_elem_prev = PR_info_list_of_lists[rank - 1][class_um]
-                PR_info_elem = PR_info(precision = PR_info_elem_prev.precision,
-                                       recall = PR_info_elem_prev.recall,
-                                       tp = PR_info_elem_prev.tp,
-                                       fp = PR_info_elem_prev.fp,
-                                       fn = PR_info_elem_prev.fn)
-                PR_info_list.append(PR_info_elem)
-        else:
-            for class_um in range(num_classes):                
-                PR_info_elem = PR_info()
-                PR_info_list.append(PR_info_elem)
-        
-        PR_info_list_of_lists.append(PR_info_list)
-        
-        detection = detection_list[rank]
-        
-        if(detection.truth_flag == 1):
-            if(utc_array[detection.unique_truth_index] == 0):
-                utc_array[detection.unique_truth_index] = 1
-                PR_info_list_of_lists[rank][detection.class_id].tp += 1
-        else:
-            PR_info_list_of_lists[rank][detection.class_id].fp += 1
-            
-        for class_num in range(num_classes):
-            tp = PR_info_list_of_lists[rank][class_num].tp 
-            fp = PR_info_list_of_lists[rank][class_num].fp
-            fn = gt_class_hist[class_num] - tp
-            PR_info_list_of_lists[rank][class_num].fn = fn
-            
-            if((tp+fp) > 0):
-                PR_info_list_of_lists[rank][class_num].precision = tp/(tp+fp)
-            else:
-                PR_info_list_of_lists[rank][class_num].precision = 0
-            
-            if((tp+fn) > 0):
-                PR_info_list_of_lists[rank][class_num].recall = tp/(tp+fn)
-            else:
-                PR_info_list_of_lists[rank][class_num].recall = 0
-        
-    
-    mean_average_precision = 0.0
+    summary = evaluator.evaluate(metrics=('darknet',), pool=pool, prob_thresh=thresh_calc_avg_iou)
     
     for class_num in range(num_classes):
-        
-        avg_precision = 0
-        for point in range(11):
-            
-            cur_recall = point * 0.1
-            cur_precision = 0
-            
-            for rank in range(len(detection_list)):
-                if((PR_info_list_of_lists[rank][class_num].recall >= cur_recall) and
-                   (PR_info_list_of_lists[rank][class_num].precision > cur_precision)):
-                                              
-                       cur_precision = PR_info_list_of_lists[rank][class_num].precision
-            
-            avg_precision += cur_precision
-        
-        avg_precision = avg_precision/11
-        print("class_id = ",class_num, " name = ", class_names[class_num], " ap = " , avg_precision*100)
-        mean_average_precision += avg_precision
+        print("class_id = ",class_num, " name = ", class_names[class_num], " ap = " , summary['darknet'][class_num]*100)
     
+    tp_for_thresh = summary['tp']
+    fp_for_thresh = summary['fp']
+    unique_truth_count = summary['tp'] + summary['fn']
     print("tp_for_thresh= ",tp_for_thresh, " fp_for_thresh= ", fp_for_thresh)    
     cur_precision = tp_for_thresh/(tp_for_thresh + fp_for_thresh)
     cur_recall = tp_for_thresh / (tp_for_thresh + (unique_truth_count - tp_for_thresh))
@@ -247,11 +380,9 @@ def calc_detector_mAP(labels_fpga_basepath, labels_gt_basepath, num_classes, cla
     
     print("for thresh = " ,thresh_calc_avg_iou," precision = " , cur_precision, " recall = " ,cur_recall, " F1-score =  ",  f1_score)
     
-    print("for thresh = " ,thresh_calc_avg_iou, " TP = ", tp_for_thresh, " FP = ",fp_for_thresh," FN = ",unique_truth_count - tp_for_thresh, " average IoU = ",  avg_iou * 100)
-    
-    mean_average_precision = mean_average_precision / num_classes
+    print("for thresh = " ,thresh_calc_avg_iou, " TP = ", tp_for_thresh, " FP = ",fp_for_thresh," FN = ",unique_truth_count - tp_for_thresh, " average IoU = ",  summary['avg_iou'] * 100)
     
-    #print("\n mean average precision (mAP) =  \n", mean_average_precision, mean_average_precision*100)
+    mean_average_precision = summary['darknet_mAP']
    
     print "mean average precision (mAP) =", mean_average_precision, round(mean_average_precision*100, 2)
     
@@ -50,13 +50,13 @@ int max_index(float *a, int n) {
 }
 
 
-int gen_detections(int im_w, int im_h, int planes, int pw, int ph, float thresh, nms_box_t *boxes, float **probs, int classes, bbox *bboxout) {
+int gen_detections(int im_w, int im_h, int planes, int pw, int ph, float thresh, nms_box_t *boxes, float **probs, int classes, bbox *bboxout, int maxBoxes) {
   int pixel;
   int plane;
   
   int bboxcnt = 0;
   for(plane = 0; plane < planes; ++plane) {
-    for(pixel = 0; pixel < pw*ph; ++pixel) {
+    for(pixel = 0; pixel < pw*ph && bboxcnt < maxBoxes; ++pixel) {
       int i = plane*(pw*ph) + pixel;
       int class = max_index(probs[i], classes);
       float prob = probs[i][class];
@@ -91,21 +91,22 @@ int gen_detections(int im_w, int im_h, int planes, int pw, int ph, float thresh,
 
 
 
-/* example code for how NMS returns bounding box structures from C/C++ into python */
-int do_nms(float *arr, int cnt,
-	   int im_w, int im_h,
-	   int net_w, int net_h,
-	   int out_w, int out_h,
-	   int bboxplanes,
-	   int classes,
-	   float scoreThreshold, 
-	   float iouThreshold,
-	   int *numBoxes, bbox **bboxes) {
+/* NMS of one image, writing at most maxBoxes boxes to bboxes */
+static int nms_image(float *arr,
+		     int im_w, int im_h,
+		     int net_w, int net_h,
+		     int out_w, int out_h,
+		     int bboxplanes,
+		     int classes,
+		     float scoreThreshold,
+		     float iouThreshold,
+		     int maxBoxes, bbox *bboxes) {
 
   nms_ctx_t nmsCtx;
   nms_net_t nmsNet;
   nms_cfg_t nmsCfg;
   int       nmsSeq[] = {NMS_MCS_OBJ, NMS_UNDEFINED};
+  int       numBoxes;
   
   int numcoords = 4;
   
@@ -127,13 +128,56 @@ int do_nms(float *arr, int cnt,
   nms_extract(&nmsCtx, arr);
   nms_run(&nmsCtx);
 
-  /* Initialize final output max size array */  
-  *bboxes = (bbox*)calloc(out_w*out_h*bboxplanes, sizeof(bbox));
-  *numBoxes = gen_detections(im_w, im_h, bboxplanes, out_w, out_h, nmsCfg.mcsScoreThresh, nmsCtx.boxes, nmsCtx.scores, classes, *bboxes);
+  numBoxes = gen_detections(im_w, im_h, bboxplanes, out_w, out_h, nmsCfg.mcsScoreThresh, nmsCtx.boxes, nmsCtx.scores, classes, bboxes, maxBoxes);
 
   nms_uninit(&nmsCtx);
 
+  return numBoxes;
+}
+
+
+/* example code for how NMS returns bounding box structures from C/C++ into python */
+int do_nms(float *arr, int cnt,
+	   int im_w, int im_h,
+	   int net_w, int net_h,
+	   int out_w, int out_h,
+	   int bboxplanes,
+	   int classes,
+	   float scoreThreshold, 
+	   float iouThreshold,
+	   int *numBoxes, bbox **bboxes) {
+
+  /* Initialize final output max size array */  
+  *bboxes = (bbox*)calloc(out_w*out_h*bboxplanes, sizeof(bbox));
+  *numBoxes = nms_image(arr, im_w, im_h, net_w, net_h, out_w, out_h, bboxplanes, classes,
+			scoreThreshold, iouThreshold, out_w*out_h*bboxplanes, *bboxes);
+
   return *numBoxes;
 }
 
 
+/*
+ * NMS of a batch of images, without allocations on the caller's side:
+ * image b reads arr + b*stride and writes its numBoxes[b] boxes to
+ * bboxes + b*maxBoxes.
+ */
+int do_nms_batch(float *arr, int batch, int stride,
+		 const int *im_w, const int *im_h,
+		 int net_w, int net_h,
+		 int out_w, int out_h,
+		 int bboxplanes,
+		 int classes,
+		 float scoreThreshold,
+		 float iouThreshold,
+		 int maxBoxes,
+		 int *numBoxes, bbox *bboxes) {
+
+  int b;
+  int total = 0;
+  for(b = 0; b < batch; ++b) {
+    numBoxes[b] = nms_image(arr + (long)b*stride, im_w[b], im_h[b], net_w, net_h, out_w, out_h, bboxplanes, classes,
+			    scoreThreshold, iouThreshold, maxBoxes, bboxes + (long)b*maxBoxes);
+    total += numBoxes[b];
+  }
+  return total;
+}
@@ -10,6 +10,7 @@ import os
 moddir = os.path.dirname(__file__)
 
 import ctypes
+import numpy as np
 lib = ctypes.cdll.LoadLibrary('%s/libnms.so' % moddir)
 
 class BBOX(ctypes.Structure):
@@ -20,55 +21,93 @@ class BBOX(ctypes.Structure):
                 ("ylo", ctypes.c_int),
                 ("yhi", ctypes.c_int)]
 
+# numpy view of BBOX, for boxes returned in preallocated arrays
+BBOX_DTYPE = np.dtype([("classid", np.int32),
+                       ("prob", np.float32),
+                       ("xlo", np.int32),
+                       ("xhi", np.int32),
+                       ("ylo", np.int32),
+                       ("yhi", np.int32)])
+assert BBOX_DTYPE.itemsize == ctypes.sizeof(BBOX)
+
+_floats = np.ctypeslib.ndpointer(dtype=np.float32, flags='C_CONTIGUOUS')
+_ints = np.ctypeslib.ndpointer(dtype=np.int32, flags='C_CONTIGUOUS')
+_bboxes = np.ctypeslib.ndpointer(dtype=BBOX_DTYPE, flags='C_CONTIGUOUS')
+
+lib.do_nms_batch.restype = ctypes.c_int
+lib.do_nms_batch.argtypes = [_floats,
+                             ctypes.c_int,   # batch
+                             ctypes.c_int,   # stride
+                             _ints,          # imw
+                             _ints,          # imh
+                             ctypes.c_int,   # netw
+                             ctypes.c_int,   # neth
+                             ctypes.c_int,   # outw
+                             ctypes.c_int,   # outh
+                             ctypes.c_int,   # bboxplanes
+                             ctypes.c_int,   # classes
+                             ctypes.c_float, # scorethreshold
+                             ctypes.c_float, # iouthreshold
+                             ctypes.c_int,   # maxboxes
+                             _ints,          # numb (out)
+                             _bboxes]        # bboxes (out)
+
+
+def alloc_nms_output(batch, out_w, out_h, bboxplanes):
+    """
+    :returns: (numpy.ndarray, numpy.ndarray) -- box counts [batch] and BBOX_DTYPE boxes [batch, out_w*out_h*bboxplanes], for the out argument of do_baseline_nms_batch.
+    """
+    return (np.zeros(batch, dtype=np.int32),
+            np.zeros((batch, out_w*out_h*bboxplanes), dtype=BBOX_DTYPE))
+
+
+def do_baseline_nms_batch(conv_out, im_shapes, net_w, net_h, out_w, out_h, bboxplanes, classes, scorethresh, iouthresh, out=None):
+    """
+    Region NMS of a batch of images in one call. C-contiguous float32 input
+    is passed to the library as is, and boxes are written to numpy arrays.
+
+    :param conv_out: [B, ...] activated region outputs, out_w*out_h*bboxplanes*(5+classes) values per image.
+    :type conv_out: numpy.ndarray.
+    :param im_shapes: (height, width, ...) of each image.
+    :param out: (counts, boxes) from alloc_nms_output to fill, e.g. reused across calls. Default allocates them.
+    :returns: (numpy.ndarray, numpy.ndarray) -- box counts and boxes; image b's boxes are boxes[b, :counts[b]].
+    """
+    conv_out = np.ascontiguousarray(conv_out, dtype=np.float32)
+    batch = len(im_shapes)
+    stride = out_w*out_h*bboxplanes*(5 + classes)
+    if conv_out.size < batch*stride:
+        raise ValueError("conv_out has %d values, %d images need %d" % (conv_out.size, batch, batch*stride))
+
+    if out is None:
+        out = alloc_nms_output(batch, out_w, out_h, bboxplanes)
+    counts, boxes = out
+    if counts.shape[0] < batch or boxes.shape[0] < batch or boxes.ndim != 2:
+        raise ValueError("out is too small for %d images" % batch)
+
+    im_w = np.array([s[1] for s in im_shapes], dtype=np.int32)
+    im_h = np.array([s[0] for s in im_shapes], dtype=np.int32)
+    lib.do_nms_batch(conv_out.reshape(-1), batch, stride, im_w, im_h, net_w, net_h, out_w, out_h,
+                     bboxplanes, classes, scorethresh, iouthresh, boxes.shape[1], counts, boxes)
+    return counts, boxes
+
+
+def to_bboxlist(boxes):
+    """
+    :param boxes: BBOX_DTYPE boxes of one image.
+    :returns: list -- {'classid', 'prob', 'll': {'x', 'y'}, 'ur': {'x', 'y'}} dicts.
+    """
+    return [{'classid' : int(b['classid']),
+             'prob' : float(b['prob']),
+             'll' : {'x' : int(b['xlo']),
+                     'y' : int(b['ylo'])},
+             'ur' : {'x' : int(b['xhi']),
+                     'y' : int(b['yhi'])}} for b in boxes]
+
 
 def do_baseline_nms(conv_out, im_w, im_h, net_w, net_h, out_w, out_h, bboxplanes, classes, scorethresh, iouthresh):
 
-    numbb = ctypes.c_int()
-    bboxes_p = ctypes.c_void_p()
-    
-    lib.do_nms.argtypes = [ctypes.c_float*len(conv_out),
-                           ctypes.c_int, # num
-                           ctypes.c_int, # imw
-                           ctypes.c_int, # imh
-                           ctypes.c_int, # netw
-                           ctypes.c_int, # neth
-                           ctypes.c_int, # outw
-                           ctypes.c_int, # outh
-                           ctypes.c_int, # bboxplanes
-                           ctypes.c_int, # classes
-                           ctypes.c_float,  # scorethreshold
-                           ctypes.c_float,  # iouthreshold
-                           ctypes.c_void_p, # numb (out)
-                           ctypes.c_void_p] # bboxes (out)
-
-    lib.do_nms((ctypes.c_float * len(conv_out))(*conv_out),
-               len(conv_out),
-               im_w,
-               im_h,
-               net_w,
-               net_h,
-               out_w,
-               out_h,
-               bboxplanes,
-               classes,
-               scorethresh,
-               iouthresh,
-               ctypes.byref(numbb),
-               ctypes.byref(bboxes_p))
-
-    bboxes = ctypes.cast(bboxes_p, ctypes.POINTER(BBOX * numbb.value))
-
-    bboxlist = []
-    for x in range(0, numbb.value):
-        bboxlist.append({'classid' : bboxes.contents[x].classid,
-                         'prob' : bboxes.contents[x].prob,
-                        'll' : {'x' : bboxes.contents[x].xlo,
-                                'y' : bboxes.contents[x].ylo},
-                         'ur' : {'x' : bboxes.contents[x].xhi,
-                                 'y' : bboxes.contents[x].yhi}})
-
-    lib.free_bboxes(bboxes_p)
-        
-    return bboxlist
-    
+    counts, boxes = do_baseline_nms_batch(conv_out, [(im_h, im_w)], net_w, net_h, out_w, out_h,
+                                          bboxplanes, classes, scorethresh, iouthresh)
+    return to_bboxlist(boxes[0, :counts[0]])
+
 ##############################
@@ -12,13 +12,9 @@ from multiprocessing import Process, Queue
 import logging as log
 
 # Bring in some utility functions from local file
-from yolo_utils import darknet_style_xywh, cornersToxywh,sigmoid,softmax,generate_colors,draw_boxes, process_all_yolo_layers, apply_nms
+from yolo_utils import darknet_style_xywh, cornersToxywh,generate_colors,draw_boxes, decode_yolo_layers, apply_nms_batch, decode_region_layer, region_detections
 import numpy as np
 
-# Bring in a C implementation of non-max suppression
-sys.path.append('nms')
-import nms
-
 # Bring in Xilinx Caffe Compiler, and Quantizer
 # We directly compile the entire graph to minimize data movement between host, and card
 from xfdnn.tools.compile.bin.xfdnn_compiler_caffe import CaffeFrontend as xfdnnCompiler
@@ -423,33 +419,15 @@ class xyolo():
               classes = 80
               #config['classes'] = 3   
           #print "classes fpgaOutput len", classes, len(fpgaOutput)
-          out_yolo_layers = process_all_yolo_layers(fpgaOutput, classes, anchorCnt, config['net_w'], config['net_h'])
-          
-          num_proposals_layer=[0]
-          total_proposals = 0
-          for layr_idx in range (len(out_yolo_layers)):
-              yolo_layer_shape = out_yolo_layers[layr_idx].shape
-              #print "layr_idx , yolo_layer_shape", layr_idx , yolo_layer_shape
-              out_yolo_layers[layr_idx] = out_yolo_layers[layr_idx].reshape(yolo_layer_shape[0], anchorCnt, (5+classes), yolo_layer_shape[2]*yolo_layer_shape[3])
-              out_yolo_layers[layr_idx] = out_yolo_layers[layr_idx].transpose(0,3,1,2)
-              out_yolo_layers[layr_idx] = out_yolo_layers[layr_idx].reshape(yolo_layer_shape[0],yolo_layer_shape[2]*yolo_layer_shape[3] * anchorCnt, (5+classes))           
-              #print "layr_idx, final in layer sape, outlayer shape", layr_idx, yolo_layer_shape, out_yolo_layers[layr_idx].shape
-              total_proposals += yolo_layer_shape[2]*yolo_layer_shape[3] * anchorCnt
-              num_proposals_layer.append(total_proposals)
-              
-         
-          boxes_array = np.empty([config['batch_sz'], total_proposals, (5+classes)]) 
-          
-          for layr_idx in range (len(out_yolo_layers)):
-              proposal_st = num_proposals_layer[layr_idx]
-              proposal_ed = num_proposals_layer[layr_idx + 1]
-              #print "proposal_st proposal_ed", proposal_st, proposal_ed
-              boxes_array[:,proposal_st:proposal_ed,:] = out_yolo_layers[layr_idx][...]
-              
+          # only proposals scoring scorethresh for some class become boxes
+          boxes_array, num_boxes = decode_yolo_layers(fpgaOutput, classes, anchorCnt, config['net_w'], config['net_h'], config['scorethresh'])
           
           for i in range(config['batch_sz']):
-              boxes_array[i,:,:] = correct_region_boxes(boxes_array[i,:,:], 0, 1, 2, 3, float(job['shapes'][i][1]), float(job['shapes'][i][0]), float(config['net_w']), float(config['net_h']))
-              detected_boxes = apply_nms(boxes_array[i,:,:], classes, config['scorethresh'], config['iouthresh'])
+              boxes_array[i,:num_boxes[i],:] = correct_region_boxes(boxes_array[i,:num_boxes[i],:], 0, 1, 2, 3, float(job['shapes'][i][1]), float(job['shapes'][i][0]), float(config['net_w']), float(config['net_h']))
+          detected_boxes_for_images = apply_nms_batch(boxes_array, classes, config['scorethresh'], config['iouthresh'])
+
+          for i in range(config['batch_sz']):
+              detected_boxes = detected_boxes_for_images[i]
               
               bboxes=[]
               for det_idx in range(len(detected_boxes)):
@@ -500,26 +478,13 @@ class xyolo():
           continue
           
       
-      fpgaOutput = fpgaOutput.flatten()  
+      # region activations, thresholding and NMS for the whole batch
+      fpgaOutput = np.asarray(fpgaOutput, dtype=np.float32).reshape(config['batch_sz'], -1, config['out_h'], config['out_w'])
+      boxes, num_boxes = decode_region_layer(fpgaOutput, config['classes'], config['bboxplanes'], config['scorethresh'])
+      bboxlist_for_images = region_detections(boxes, num_boxes, job['shapes'], config['net_w'], config['net_h'], config['scorethresh'], config['iouthresh'])
       for i in range(config['batch_sz']):
         log.info("Results for image %d: %s"%(i, images[i]))
-        startidx = i*config['outsize']
-        softmaxout = fpgaOutput[startidx:startidx+config['outsize']]
-
-        # first activate first two channels of each bbox subgroup (n)
-        for b in range(config['bboxplanes']):
-          for r in range(config['batchstride']*b, config['batchstride']*b+2*config['groups']):
-            softmaxout[r] = sigmoid(softmaxout[r])
-          for r in range(config['batchstride']*b+config['groups']*config['coords'], config['batchstride']*b+config['groups']*config['coords']+config['groups']):
-            softmaxout[r] = sigmoid(softmaxout[r])
-      
-        # Now softmax on all classification arrays in image
-        for b in range(config['bboxplanes']):
-          for g in range(config['groups']):
-            softmax(config['beginoffset'] + b*config['batchstride'] + g*config['groupstride'], softmaxout, softmaxout, config['classes'], config['groups'])
-
-        # NMS
-        bboxes = nms.do_baseline_nms(softmaxout, job['shapes'][i][1], job['shapes'][i][0], config['net_w'], config['net_h'], config['out_w'], config['out_h'], config['bboxplanes'], config['classes'], config['scorethresh'], config['iouthresh'])
+        bboxes = bboxlist_for_images[i]
 
         # REPORT BOXES
         log.info("Found %d boxes"%(len(bboxes)))
@@ -11,8 +11,6 @@ import os
 import random
 import cv2
 import numpy as np
-import os
-from PIL import Image, ImageDraw, ImageFont
 
 
 def overlap(x1, w1,  x2, w2):
@@ -37,45 +35,103 @@ def cal_iou(box, truth) :
 def sortSecond(val):
     return val[1]
 
-def  apply_nms(boxes, classes, scorethresh, overlap_threshold):
-    
-    result_boxes=[]
-    box_len = (boxes.shape)[0]
-    #print "apply_nms :box shape", boxes.shape
-    for k in range(classes):  
-        
-        key_box_class=[]    
-        for i in range(box_len):
-            key_box_class.append((i, boxes[i,5+k]))
-
-        key_box_class.sort(key = sortSecond, reverse = True)
-
-        exist_box=np.ones(box_len)        
-        for i in range(box_len):
-            
-            box_id = key_box_class[i][0]
-            
-            if(exist_box[box_id] == 0):
-                continue
-                
-            if(boxes[box_id,5 + k] < scorethresh):
-                exist_box[box_id] = 0;
+def batched_nms(boxes, scores, overlap_threshold, scorethresh=0., top_k=None, per_class=True, inclusive=True):
+    """
+    Greedy non-maximum suppression over a batch of images at once.
+
+    Candidates are (box, class) pairs scoring at least scorethresh. They are
+    grouped by image, and by class when per_class, then visited best first;
+    a kept candidate suppresses the remaining ones of its group that overlap
+    it by at least overlap_threshold (cal_iou). Grouping restricts the IoU
+    comparisons to boxes that may suppress each other, which is what the
+    usual per-class coordinate offset achieves, without shifting the box
+    coordinates and thereby changing the IoU values compared.
+
+    :param boxes: [B, N, 4] or [N, 4] center boxes (x, y, w, h).
+    :type boxes: numpy.ndarray.
+    :param scores: [B, N, C] or [N, C] class scores.
+    :type scores: numpy.ndarray.
+    :param overlap_threshold: IoU at which a box is suppressed.
+    :type overlap_threshold: float.
+    :param scorethresh: Candidates scoring below this are dropped before suppression.
+    :type scorethresh: float.
+    :param top_k: Keep at most this many candidates per image before suppression. Default keeps all.
+    :type top_k: int.
+    :param per_class: Only suppress boxes of the same class; otherwise boxes of any class suppress each other.
+    :type per_class: bool.
+    :param inclusive: Suppress at an IoU of exactly overlap_threshold (apply_nms); otherwise only above it (darknet region NMS).
+    :type inclusive: bool.
+    :returns: list -- per image, (box indices, class ids) of the kept detections, ordered by class (if per_class) and score.
+    """
+    boxes = np.asarray(boxes)
+    scores = np.asarray(scores)
+    if boxes.ndim == 2:
+        return batched_nms(boxes[None], scores[None], overlap_threshold, scorethresh, top_k, per_class, inclusive)[0]
+    batch, num_boxes, classes = scores.shape
+
+    img, box, cls = np.nonzero(scores >= scorethresh)
+    score = scores[img, box, cls]
+    if top_k is not None:
+        order = np.lexsort((cls, box, -score, img))
+        first = np.searchsorted(img[order], np.arange(batch))
+        order = order[np.arange(len(order)) - first[img[order]] < top_k]
+        img, box, cls, score = img[order], box[order], cls[order], score[order]
+
+    # visit groups in turn, best first; ties in box order like a stable sort
+    group = img * classes + cls if per_class else img
+    order = np.lexsort((box, -score, group))
+    img, box, cls, group = img[order], box[order], cls[order], group[order]
+    ends = np.searchsorted(group, group, side='right')
+
+    xywh = boxes[img, box, :4]
+    halfw = xywh[:, 2] / 2
+    halfh = xywh[:, 3] / 2
+    left, right = xywh[:, 0] - halfw, xywh[:, 0] + halfw
+    top, bottom = xywh[:, 1] - halfh, xywh[:, 1] + halfh
+    area = xywh[:, 2] * xywh[:, 3]
+
+    keep = np.zeros(len(order), dtype=bool)
+    suppressed = np.zeros(len(order), dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i in range(len(order)):
+            if suppressed[i]:
                 continue
-            
-            result_boxes.append([boxes[box_id,0], boxes[box_id,1], boxes[box_id,2], boxes[box_id,3], k, boxes[box_id,5+k]])
-            
-            for j in range(i+1, box_len):
-                
-                box_id_compare = key_box_class[j][0]
-                if(exist_box[box_id_compare] == 0):
-                    continue
-                
-                overlap = cal_iou(boxes[box_id_compare,:], boxes[box_id,:])
-                if(overlap >= overlap_threshold):
-                    exist_box[box_id_compare] = 0
-    
-    return result_boxes
-                
+            keep[i] = True
+            rest = slice(i + 1, ends[i])
+            w = np.minimum(right[rest], right[i]) - np.maximum(left[rest], left[i])
+            h = np.minimum(bottom[rest], bottom[i]) - np.maximum(top[rest], top[i])
+            inter = w * h
+            iou = np.where((w < 0) | (h < 0), 0, inter / (area[rest] + area[i] - inter))
+            suppressed[rest] |= iou >= overlap_threshold if inclusive else iou > overlap_threshold
+
+    img, box, cls = img[keep], box[keep], cls[keep]
+    if not per_class:
+        # report by class like the per-class mode
+        order = np.lexsort((np.arange(len(img)), cls, img))
+        img, box, cls = img[order], box[order], cls[order]
+    bounds = np.searchsorted(img, np.arange(batch + 1))
+    return [(box[bounds[b]:bounds[b + 1]], cls[bounds[b]:bounds[b + 1]]) for b in range(batch)]
+
+
+def apply_nms_batch(boxes, classes, scorethresh, overlap_threshold, top_k=None, per_class=True):
+    """
+    :param boxes: [B, N, 5 + classes] region boxes (x, y, w, h, objectness, class scores...).
+    :type boxes: numpy.ndarray.
+    :returns: list -- per image, the detections as apply_nms returns them.
+    """
+    kept = batched_nms(boxes[:, :, :4], boxes[:, :, 5:5 + classes], overlap_threshold, scorethresh, top_k, per_class)
+    return [[[boxes[b, i, 0], boxes[b, i, 1], boxes[b, i, 2], boxes[b, i, 3], int(k), boxes[b, i, 5 + k]]
+             for i, k in zip(idx, cls)] for b, (idx, cls) in enumerate(kept)]
+
+
+def apply_nms(boxes, classes, scorethresh, overlap_threshold):
+    """
+    :param boxes: [N, 5 + classes] region boxes (x, y, w, h, objectness, class scores...).
+    :type boxes: numpy.ndarray.
+    :returns: list -- [x, y, w, h, class, score] per detection, by class, then best first.
+    """
+    return apply_nms_batch(boxes[None], classes, scorethresh, overlap_threshold)[0]
+
 def sigmoid_ndarray(data_in):
     data_in = -1*data_in
     data_in = np.exp(data_in) + 1
@@ -83,60 +139,250 @@ def sigmoid_ndarray(data_in):
     
     return data_in
                  
-def process_all_yolo_layers(yolo_layers, classes, anchorCnt, nw_in_width, nw_in_height):
-    
-    biases =[10,13,16,30,33,23, 30,61,62,45,59,119, 116,90,156,198,373,326]
-    
-    scale_feature=[]
-    out_yolo_layers=[]
-    for output_id in range(len(yolo_layers)):
-        scale_feature.append([output_id,yolo_layers[output_id].shape[3]])
-    
-    scale_feature.sort(key = sortSecond, reverse = True)
-    
-    for output_id in range(len(yolo_layers)):
-        
-        out_id_process = scale_feature[output_id][0]
-        #print "process_all_yolo_layers :layer shape", out_id_process, yolo_layers[out_id_process].shape
-        width  = yolo_layers[out_id_process].shape[3]
-        height = yolo_layers[out_id_process].shape[2]
-        w_range = np.arange(float(width))
-        h_range = np.arange(float(height)).reshape(height,1)
-        
-        
-        yolo_layers[out_id_process][:,4::(5+classes),:,:] = sigmoid_ndarray(yolo_layers[out_id_process][:,4::(5+classes),:,:])
-        
-        yolo_layers[out_id_process][:,0::(5+classes),:,:] = sigmoid_ndarray(yolo_layers[out_id_process][:,0::(5+classes),:,:])
-        yolo_layers[out_id_process][:,1::(5+classes),:,:] = sigmoid_ndarray(yolo_layers[out_id_process][:,1::(5+classes),:,:])
-        yolo_layers[out_id_process][:,0::(5+classes),:,:] = (yolo_layers[out_id_process][:,0::(5+classes),:,:] + w_range)/float(width)
-        yolo_layers[out_id_process][:,1::(5+classes),:,:] = (yolo_layers[out_id_process][:,1::(5+classes),:,:] + h_range)/float(height)
-        
-        yolo_layers[out_id_process][:,2::(5+classes),:,:] = np.exp(yolo_layers[out_id_process][:,2::(5+classes),:,:])
-        yolo_layers[out_id_process][:,3::(5+classes),:,:] = np.exp(yolo_layers[out_id_process][:,3::(5+classes),:,:])
-        
-        
-        
-        for ankr_cnt in range(anchorCnt):
-            channel_number_box_width = ankr_cnt * (5+classes) + 2
-            scale_value_width = float(biases[2*ankr_cnt + 2 * anchorCnt * output_id]) /float(nw_in_width)
-            channel_number_box_height = ankr_cnt * (5+classes) + 3
-            scale_value_height = float(biases[2*ankr_cnt + 2 * anchorCnt * output_id + 1]) /float(nw_in_height)
-            
-            yolo_layers[out_id_process][:,channel_number_box_width,:,:] = yolo_layers[out_id_process][:,channel_number_box_width,:,:] * scale_value_width
-            yolo_layers[out_id_process][:,channel_number_box_height,:,:] = yolo_layers[out_id_process][:,channel_number_box_height,:,:] * scale_value_height
-            
-            channel_number_classes = ankr_cnt * (5+classes) + 5
-            channel_number_obj_score = ankr_cnt * (5+classes) + 4
-            
-            for class_id in range(classes):                
-                cur_channel = channel_number_classes + class_id                
-                yolo_layers[out_id_process][:,cur_channel,:,:] = np.multiply(sigmoid_ndarray(yolo_layers[out_id_process][:,cur_channel,:,:]) , yolo_layers[out_id_process][:,channel_number_obj_score,:,:])
-                
-        yolo_layer_shape = yolo_layers[out_id_process].shape
-        out_yolo_layers.append(yolo_layers[out_id_process])
-        
+YOLOV3_BIASES = [10,13,16,30,33,23, 30,61,62,45,59,119, 116,90,156,198,373,326]
+# YOLOv2 region anchors in grid cells, as used by the C region NMS
+YOLOV2_BIASES = [0.57273,0.677385, 1.87446,2.06253, 3.33843,5.47434, 7.88282,3.52778, 9.77052,9.16828]
+YOLOV2_VOC_BIASES = [1.08,1.19, 3.42,4.41, 6.63,11.38, 9.42,5.11, 16.62,10.52]
+
+_yolo_grid_cache = {}
+_yolo_anchor_cache = {}
+_region_anchor_cache = {}
+
+def _sigmoid_inplace(data):
+    # same operations as sigmoid_ndarray, without temporaries
+    np.negative(data, out=data)
+    np.exp(data, out=data)
+    data += 1
+    np.reciprocal(data, out=data)
+    return data
+
+def _yolo_layer_order(yolo_layers):
+    # largest grid first, it uses the first (smallest) anchors
+    return sorted(range(len(yolo_layers)), key=lambda i: yolo_layers[i].shape[3], reverse=True)
+
+def _yolo_grid(height, width):
+    key = (height, width)
+    if key not in _yolo_grid_cache:
+        _yolo_grid_cache[key] = (np.arange(float(width)), np.arange(float(height)).reshape(height, 1))
+    return _yolo_grid_cache[key]
+
+def _yolo_anchors(anchorCnt, output_id, nw_in_width, nw_in_height, biases):
+    key = (anchorCnt, output_id, nw_in_width, nw_in_height, tuple(biases))
+    if key not in _yolo_anchor_cache:
+        first = 2 * anchorCnt * output_id
+        anchors = np.array(biases[first:first + 2 * anchorCnt], dtype=np.float64).reshape(anchorCnt, 2)
+        anchors /= [float(nw_in_width), float(nw_in_height)]
+        # float32 like the scalar products the layers were scaled with before
+        _yolo_anchor_cache[key] = anchors.astype(np.float32)
+    return _yolo_anchor_cache[key]
+
+def _yolo_layer_view(layer, anchorCnt, classes):
+    # [B, A*(5+C), H, W] -> [B, A, 5+C, H, W]; a view unless layer is not contiguous
+    batch, channels, height, width = layer.shape
+    return layer.reshape(batch, anchorCnt, 5 + classes, height, width)
+
+def process_all_yolo_layers(yolo_layers, classes, anchorCnt, nw_in_width, nw_in_height, biases=YOLOV3_BIASES):
+    """
+    Decodes YOLOv3 output layers in place: x, y relative to the image,
+    w, h scaled by the anchors, objectness, and class scores multiplied
+    by objectness.
+
+    :param yolo_layers: [B, anchorCnt*(5+classes), H, W] layer outputs.
+    :type yolo_layers: list.
+    :returns: list -- the decoded layers, largest grid first.
+    """
+    out_yolo_layers = []
+    for output_id, layer_id in enumerate(_yolo_layer_order(yolo_layers)):
+        layer = yolo_layers[layer_id]
+        view = _yolo_layer_view(layer, anchorCnt, classes)
+        height, width = layer.shape[2:]
+        w_range, h_range = _yolo_grid(height, width)
+        anchors = _yolo_anchors(anchorCnt, output_id, nw_in_width, nw_in_height, biases)
+
+        _sigmoid_inplace(view[:, :, :2])
+        view[:, :, 0] = (view[:, :, 0] + w_range) / float(width)
+        view[:, :, 1] = (view[:, :, 1] + h_range) / float(height)
+        np.exp(view[:, :, 2:4], out=view[:, :, 2:4])
+        view[:, :, 2:4] *= anchors[:, :, None, None]
+        _sigmoid_inplace(view[:, :, 4:])
+        view[:, :, 5:] *= view[:, :, 4:5]
+
+        out_yolo_layers.append(view.reshape(layer.shape))
+
     return out_yolo_layers
 
+def decode_yolo_layers(yolo_layers, classes, anchorCnt, nw_in_width, nw_in_height, scorethresh, biases=YOLOV3_BIASES):
+    """
+    Decodes YOLOv3 output layers into region boxes for NMS, for the whole
+    batch at once. Only proposals with a class score of at least
+    scorethresh are decoded further than their best score; the layers
+    are left untouched.
+
+    :param yolo_layers: [B, anchorCnt*(5+classes), H, W] layer outputs.
+    :type yolo_layers: list.
+    :param scorethresh: Lowest objectness x class score of interest.
+    :type scorethresh: float.
+    :returns: (numpy.ndarray, numpy.ndarray) -- [B, M, 5+classes] region boxes (x, y, w, h, objectness, class scores) per image, and the number of valid rows of each image. Rows keep the proposal order of process_all_yolo_layers (grid, then cell, then anchor); padding rows score -inf.
+    """
+    batch = yolo_layers[0].shape[0]
+    selected = []
+    counts = np.zeros(batch, dtype=np.int64)
+    for output_id, layer_id in enumerate(_yolo_layer_order(yolo_layers)):
+        view = _yolo_layer_view(yolo_layers[layer_id], anchorCnt, classes)
+
+        # sigmoid is monotonic: the best class score is sigmoid(best logit) x objectness
+        objectness = _sigmoid_inplace(view[:, :, 4].copy())
+        best = _sigmoid_inplace(view[:, :, 5:].max(axis=2))
+        best *= objectness
+
+        # [B, H, W, A] order, as flattened for NMS
+        img, y, x, anchor = np.nonzero((best >= scorethresh).transpose(0, 2, 3, 1))
+        selected.append((output_id, view, objectness, img, y, x, anchor))
+        counts += np.bincount(img, minlength=batch)
+
+    boxes = np.empty((batch, counts.max() if batch else 0, 5 + classes))
+    for b in range(batch):
+        boxes[b, counts[b]:, :5] = 0
+        boxes[b, counts[b]:, 5:] = -np.inf
+
+    starts = np.zeros(batch, dtype=np.int64)
+    for output_id, view, objectness, img, y, x, anchor in selected:
+        height, width = view.shape[3:]
+        w_range, h_range = _yolo_grid(height, width)
+        anchors = _yolo_anchors(anchorCnt, output_id, nw_in_width, nw_in_height, biases)
+
+        # decode the selected cells in place, in the layer's precision
+        cells = view[img, anchor, :, y, x]
+        xy = _sigmoid_inplace(cells[:, :2])
+        cells[:, 0] = (xy[:, 0] + w_range[x]) / float(width)
+        cells[:, 1] = (xy[:, 1] + h_range[y, 0]) / float(height)
+        np.exp(cells[:, 2:4], out=cells[:, 2:4])
+        cells[:, 2:4] *= anchors[anchor]
+        cells[:, 4] = objectness[img, anchor, y, x]
+        _sigmoid_inplace(cells[:, 5:])
+        cells[:, 5:] *= cells[:, 4:5]
+
+        bounds = np.searchsorted(img, np.arange(batch + 1))
+        for b in range(batch):
+            num = bounds[b + 1] - bounds[b]
+            boxes[b, starts[b]:starts[b] + num] = cells[bounds[b]:bounds[b + 1]]
+            starts[b] += num
+
+    return boxes, counts
+
+def _region_anchors(anchorCnt, height, width, biases):
+    key = (anchorCnt, height, width, tuple(biases))
+    if key not in _region_anchor_cache:
+        anchors = np.array(biases[:2 * anchorCnt], dtype=np.float64).reshape(anchorCnt, 2)
+        anchors /= [float(width), float(height)]
+        _region_anchor_cache[key] = anchors.astype(np.float32)
+    return _region_anchor_cache[key]
+
+def decode_region_layer(output, classes, anchorCnt, scorethresh, biases=None):
+    """
+    Decodes a YOLOv2 region layer output into region boxes for NMS, for the
+    whole batch at once: sigmoid on x, y and objectness, softmax over the
+    classes. As in the C region NMS, a proposal is kept when its best
+    objectness x class probability is above scorethresh; only those are
+    turned into boxes. The output is left untouched.
+
+    :param output: [B, anchorCnt*(5+classes), H, W] region layer output.
+    :type output: numpy.ndarray.
+    :param scorethresh: Proposals scoring at most this are dropped.
+    :type scorethresh: float.
+    :param biases: Anchor (w, h) pairs in grid cells. Default is YOLOV2_BIASES, or YOLOV2_VOC_BIASES for 20 classes like the C code.
+    :type biases: list.
+    :returns: (numpy.ndarray, numpy.ndarray) -- [B, M, 5+classes] region boxes (x, y, w, h relative to the network input, objectness, class probabilities) per image, and the number of valid rows of each image. Rows are in anchor, then cell order; padding rows score -inf.
+    """
+    if biases is None:
+        biases = YOLOV2_VOC_BIASES if classes == 20 else YOLOV2_BIASES
+    batch, channels, height, width = output.shape
+    view = _yolo_layer_view(output, anchorCnt, classes)
+    anchors = _region_anchors(anchorCnt, height, width, biases)
+
+    # the best softmax probability is 1/sum(exp(logit - best logit))
+    objectness = _sigmoid_inplace(view[:, :, 4].copy())
+    logits = view[:, :, 5:]
+    best_logits = logits.max(axis=2)
+    expsum = np.exp(logits - best_logits[:, :, None]).sum(axis=2)
+    inv_expsum = np.reciprocal(expsum, out=expsum)
+    best = inv_expsum * objectness
+
+    img, anchor, y, x = np.nonzero(best > scorethresh)
+    cells = view[img, anchor, :, y, x]
+    xy = _sigmoid_inplace(cells[:, :2])
+    cells[:, 0] = (x + xy[:, 0]) / float(width)
+    cells[:, 1] = (y + xy[:, 1]) / float(height)
+    np.exp(cells[:, 2:4], out=cells[:, 2:4])
+    cells[:, 2:4] *= anchors[anchor]
+    cells[:, 4] = objectness[img, anchor, y, x]
+    probs = cells[:, 5:]
+    probs -= best_logits[img, anchor, y, x][:, None]
+    np.exp(probs, out=probs)
+    # same products as best, so the row maximum is exactly what was thresholded
+    probs *= inv_expsum[img, anchor, y, x][:, None]
+    probs *= cells[:, 4:5]
+
+    counts = np.bincount(img, minlength=batch)
+    boxes = np.empty((batch, counts.max() if batch else 0, 5 + classes))
+    bounds = np.searchsorted(img, np.arange(batch + 1))
+    for b in range(batch):
+        boxes[b, :counts[b]] = cells[bounds[b]:bounds[b + 1]]
+        boxes[b, counts[b]:, :5] = 0
+        boxes[b, counts[b]:, 5:] = -np.inf
+    return boxes, counts
+
+def region_detections(boxes, num_boxes, image_shapes, net_w, net_h, scorethresh, iouthresh):
+    """
+    Region NMS of nms.do_baseline_nms on decode_region_layer output: boxes
+    are corrected for the letterbox, suppressed class-agnostically by their
+    best class probability, and each survivor is reported with its best
+    class in image pixels.
+
+    :param boxes: [B, M, 5+classes] region boxes from decode_region_layer.
+    :type boxes: numpy.ndarray.
+    :param num_boxes: Valid rows of each image.
+    :param image_shapes: (height, width, ...) of each image.
+    :param scorethresh: Boxes scoring at most this are dropped.
+    :type scorethresh: float.
+    :param iouthresh: IoU above which a box is suppressed.
+    :type iouthresh: float.
+    :returns: list -- per image, {'classid', 'prob', 'll': {'x', 'y'}, 'ur': {'x', 'y'}} dicts like nms.do_baseline_nms, in box order.
+    """
+    batch = len(num_boxes)
+    xywh = boxes[:batch, :, :4].copy()
+    for b in range(batch):
+        im_h, im_w = int(image_shapes[b][0]), int(image_shapes[b][1])
+        if float(net_w) / im_w < float(net_h) / im_h:
+            new_w, new_h = net_w, (im_h * net_w) // im_w
+        else:
+            new_w, new_h = (im_w * net_h) // im_h, net_h
+        xywh[b, :, 0] = (xywh[b, :, 0] - (net_w - new_w) / 2. / net_w) / (float(new_w) / net_w)
+        xywh[b, :, 1] = (xywh[b, :, 1] - (net_h - new_h) / 2. / net_h) / (float(new_h) / net_h)
+        xywh[b, :, 2] *= float(net_w) / new_w
+        xywh[b, :, 3] *= float(net_h) / new_h
+    # the C code keeps boxes in single precision
+    xywh = xywh.astype(np.float32).astype(np.float64)
+
+    classids = boxes[:batch, :, 5:].argmax(axis=2)
+    scores = boxes[:batch, :, 5:].max(axis=2)
+    kept = batched_nms(xywh, scores[:, :, None], iouthresh, scorethresh, inclusive=False)
+
+    bboxlist_for_images = []
+    for b, (idx, _) in enumerate(kept):
+        idx = np.sort(idx)
+        im_h, im_w = int(image_shapes[b][0]), int(image_shapes[b][1])
+        x, y, w, h = xywh[b, idx].T
+        left = np.maximum(((x - w / 2.) * im_w).astype(np.int64), 0)
+        right = np.minimum(((x + w / 2.) * im_w).astype(np.int64), im_w - 1)
+        top = np.maximum(((y - h / 2.) * im_h).astype(np.int64), 0)
+        bot = np.minimum(((y + h / 2.) * im_h).astype(np.int64), im_h - 1)
+        bboxlist_for_images.append([{'classid' : int(classids[b, i]),
+                                     'prob' : float(scores[b, i]),
+                                     'll' : {'x' : int(left[j]), 'y' : int(bot[j])},
+                                     'ur' : {'x' : int(right[j]), 'y' : int(top[j])}} for j, i in enumerate(idx)])
+    return bboxlist_for_images
+
 def darknet_style_xywh(image_width, image_height, llx,lly,urx,ury):
     # Assumes (llx,ury) is upper left corner, and (urx,lly always bottom right
     dw = 1./(image_width)
@@ -224,7 +470,8 @@ def generate_colors(classes):
     return colors
 
 def draw_boxes(iimage,bboxes,names,colors,outpath="out",fontpath="font",display=True):
-    
+    from PIL import Image, ImageDraw, ImageFont
+
     if os.path.isdir('./out') is False:
         os.makedirs('./out')
 
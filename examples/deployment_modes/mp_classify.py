@@ -5,6 +5,9 @@
 # (C) Copyright 2018, Xilinx, Inc.
 #
 
+import functools
+import ntpath
+import os
 import sys
 import timeit
 import numpy as np
@@ -12,9 +15,17 @@ import multiprocessing as mp
 import ctypes
 import signal
 import threading
-from xfdnn.rt import xdnn, xdnn_io
+from xfdnn.rt import xdnn, xdnn_io, xdnn_source
+from xfdnn.rt.xdnn_affinity import Placement
+from xfdnn.rt.xdnn_async import XDNNAsyncExecutor
+from xfdnn.rt.xdnn_autoscale import QueueDepthScaler
+from xfdnn.rt.xdnn_dispatch import XDNNDispatcher
+from xfdnn.rt.xdnn_shm import CLOSED, NamedSharedMemoryRing, SharedMemoryBatchRing, SharedMemoryRing, SharedNameTable
+from xfdnn.rt.xdnn_tensor_cache import TensorCache
 import time
 
+# trans meta image id of a row whose preprocessing failed
+SKIPPED = -2
 
 ###################################################
 # Pre-process
@@ -37,21 +48,119 @@ class UserPreProcess():
     self._meanarr = np.zeros ( (self._firstInputShape[2], self._firstInputShape[3], self._firstInputShape[1],), dtype = np.float32, order='C' )
     self._meanarr += args['img_mean']
 
-  def run(self, inum):
-    
-    write_slot = self._shared_trans_arrs.openWriteId()
-    write_arrs = self._shared_trans_arrs.accessNumpyBuffer(write_slot)
+    self._cache = None
+    if args.get('preprocess_cache'):
+      self._cache = TensorCache(args['preprocess_cache'], args['preprocess_cache_mb'] << 20)
+
+    # uint8 slots carry resized pixels; fpga_process applies scale/mean
+    self._rawSlots = args.get('slot_dtype', 'float32') == 'uint8'
+    self._plan = self.makePlan(args, self._firstInputShape) if self._rawSlots else None
+
+  @classmethod
+  def makePlan(cls, args, inputShape):
+    """
+    PreprocessPlan equivalent to run(), used to split preprocessing between
+    this process (PreprocessPlan.runRaw) and fpga_process (PreprocessPlan.finish).
+    """
+    return xdnn_io.getImageBlobPlan(args['img_raw_scale'], np.array(args['img_mean'], dtype=np.float32),
+                                    args['img_input_scale'], inputShape[2], inputShape[3],
+                                    args.get('scaled_decode', False))
+
+  @classmethod
+  def ingestConfig(cls, args, inputShape):
+    """
+    Slot format for external producers writing through xdnn_ingest; must describe the same preprocessing as makePlan.
+    """
+    return {'transform': 'resize', 'height': int(inputShape[2]), 'width': int(inputShape[3]),
+            'slot_dtype': args.get('slot_dtype', 'float32'), 'img_raw_scale': float(args['img_raw_scale']),
+            'img_mean': np.ravel(args['img_mean']).tolist(), 'img_input_scale': float(args['img_input_scale'])}
+
+  def loadRaw(self, path, write_arrs):
+    """
+    Writes the uint8 image and its letterbox box (meta[4:8], -1 if none) to a slot.
+
+    :returns: tuple -- decoded image shape.
+    """
+    _, shape, box = self._plan.runRaw(path, out=write_arrs[0])
+    write_arrs[-1][4:8] = box if box is not None else -1
+    return shape
+
+  def specKey(self):
+    """
+    :returns: tuple -- equal for instances that write the same tensor for an image, so mp_multinet can share it.
+    """
+    a = self._args
+    return (type(self), tuple(self._firstInputShape[1:]), a['img_raw_scale'], tuple(np.ravel(a['img_mean'])),
+            a['img_input_scale'], a.get('slot_dtype', 'float32'), bool(a.get('scaled_decode')))
+
+  def openWrite(self):
+    """
+    Reserves room for one image.
+
+    :returns: (handle, list) -- handle for closeWrite, and the image's input and [inum, H, W, C] buffers.
+    """
+    if self._args.get('batchslots'):
+      slot, row = self._shared_trans_arrs.openWriteRow()
+      return (slot, row), [arr[row] for arr in self._shared_trans_arrs.accessNumpyBuffer(slot)]
+    slot = self._shared_trans_arrs.openWriteId()
+    return slot, self._shared_trans_arrs.accessNumpyBuffer(slot)
+
+  def closeWrite(self, handle):
+    if self._args.get('batchslots'):
+      self._shared_trans_arrs.closeWriteRow(*handle)
+    else:
+      self._shared_trans_arrs.closeWriteId(handle)
+
+  def abortWrite(self, handle):
+    """
+    Gives up room reserved by openWrite without publishing an image.
+    """
+    if self._args.get('batchslots'):
+      # a claimed row must be closed; fpga_process drops rows marked SKIPPED
+      slot, row = handle
+      self._shared_trans_arrs.accessNumpyBuffer(slot)[-1][row][0] = SKIPPED
+      self._shared_trans_arrs.closeWriteRow(slot, row)
+    else:
+      self._shared_trans_arrs.abortWriteId(handle)
+
+  def run(self, inum, data=None):
+    """
+    Preprocesses image inum into shared memory.
+
+    :param data: Item data from an xdnn_source input source. Default reads the inum-th image path.
+    """
+    # decode encoded items before taking a slot, so a bad one does not hold it
+    img = self._imgpaths[inum] if data is None else xdnn_source.decodeItem(data)
+    write_slot, write_arrs = self.openWrite()
     #self._qPrep.put(inum)
     #print "UserPreProcess write_slot, inum " , write_slot,inum
    
     if not self._args['benchmarkmode']:
-      write_arrs[0][:], shape = xdnn_io.loadImageBlobFromFile(self._imgpaths[inum], self._args['img_raw_scale'], self._meanarr,
-                                             self._args['img_input_scale'], self._firstInputShape[2], self._firstInputShape[3])
-      write_arrs[-1][1:4] = shape
+      try:
+        write_arrs[-1][1:4] = self.load(img, write_arrs)
+      except:
+        self.abortWrite(write_slot)
+        raise
     
     write_arrs[-1][0] = inum
     
-    self._shared_trans_arrs.closeWriteId(write_slot)
+    self.closeWrite(write_slot)
+
+  def load(self, img, write_arrs):
+    """
+    Preprocesses one image into the buffers returned by openWrite.
+
+    :param img: Image path or decoded image.
+    :returns: tuple -- decoded image shape.
+    """
+    if self._rawSlots:
+      return self.loadRaw(img, write_arrs)
+    # preprocess straight into the shared memory slot
+    _, shape = xdnn_io.loadImageBlobFromFile(img, self._args['img_raw_scale'], self._meanarr,
+                                           self._args['img_input_scale'], self._firstInputShape[2], self._firstInputShape[3],
+                                           out=write_arrs[0], scaledDecode=self._args.get('scaled_decode', False),
+                                           cache=self._cache)
+    return shape
 
 ###################################################
 # Post-process
@@ -67,8 +176,25 @@ class ZmqResultPublisher:
   def send(self, data):
     self.socket.send(data)
 
+class ResultPublisher:
+  """
+  Sends per-batch messages: ('zmq', data) to the ZMQ result socket,
+  ('print', text) to stdout.
+  """
+  def __init__(self, args):
+    self._args = args
+    self._zmqPub = None
+
+  def publish(self, kind, msg):
+    if kind == 'zmq':
+      if self._zmqPub is None:
+        self._zmqPub = ZmqResultPublisher(self._args['deviceID'])
+      self._zmqPub.send(msg)
+    else:
+      print msg
+
 class UserPostProcess():
-  def __init__(self,  args, img_paths,  fpgaOutputs, output_shapes,shared_output_arrs):
+  def __init__(self,  args, img_paths,  fpgaOutputs, output_shapes,shared_output_arrs, emitQ=None):
     (self.fcWeight, self.fcBias) = xdnn_io.loadFCWeightsBias(args)
     self.args = args
     self.img_paths = img_paths
@@ -77,9 +203,27 @@ class UserPostProcess():
     self.output_shapes = output_shapes
     self._shared_output_arrs = shared_output_arrs
 
+    # with several post-processing workers, messages and final stats go to
+    # collect_post in the parent instead of being published here
+    self._emitQ = emitQ
+    self._publisher = ResultPublisher(args) if emitQ is None else None
+    self._outbox = []
+    self._outBufs = None
+
     self.numProcessed = 0
+    self.top1Count = 0
+    self.top5Count = 0
     self.startTime = timeit.default_timer()
 
+  def emit(self, kind, msg):
+    """
+    Publishes a message for the current batch, see ResultPublisher.
+    """
+    if self._emitQ is None:
+      self._publisher.publish(kind, msg)
+    else:
+      self._outbox.append((kind, msg))
+
   #
   # This function post-processes FPGA output:
   # 1) Compute the final FC + Softmax layers
@@ -91,83 +235,120 @@ class UserPostProcess():
     if self.numProcessed == 0:
       self.startTime = timeit.default_timer()
       self.labels = xdnn_io.get_labels(self.args['labels'])
-      self.zmqPub = None
-      if self.args['zmqpub']:
-        self.zmqPub = ZmqResultPublisher(self.args['deviceID'])
       self.goldenMap = None
       if self.args['golden']:
         self.goldenMap = xdnn_io.getGoldenMap(self.args['golden'])
-        self.top5Count = 0
-        self.top1Count = 0
-      self.fcOutput = np.empty((self.args['batch_sz'], self.args['outsz'],), 
-        dtype=np.float32, order='C')
+      self.fcHead = xdnn_io.ClassificationHead(self.fcWeight, self.fcBias, self.args['batch_sz'])
+      self.labelArr = np.array(self.labels) if self.labels else None
 
     self.numProcessed += len(imgList)
   
-    npout_view = fpgaOutput
-    xdnn.computeFC(self.fcWeight, self.fcBias, npout_view, self.fcOutput)
+    # FC + softmax + top-5 for the whole batch in one pass
+    topKIdx, topKVals = self.fcHead.run(fpgaOutput, 5, len(imgList))
 
     #self.streamQ.put(sId)
   
-    smaxOutput = xdnn.computeSoftmax(self.fcOutput)
     if self.args['golden']:
-      for i,p in enumerate ( imgList ):
-        #topk = xdnn_io.getTopK( smaxOutput[i], self.labels, 1)
-        #print imgList[i], topk
-        self.top1Count += xdnn_io.isTopK(\
-          smaxOutput[i], self.goldenMap, p, self.labels, 1)
-        self.top5Count += xdnn_io.isTopK(\
-          smaxOutput[i], self.goldenMap, p, self.labels, 5)
-  
-    if self.zmqPub is not None:
-      predictMsg = xdnn_io.getClassification(\
-        smaxOutput, imgList, self.labels, zmqPub=True)
-      self.zmqPub.send(predictMsg)
+      # compare labels, not indices, to match xdnn_io.isTopK on duplicate synset names
+      goldenIdx = np.array([self.goldenMap[ntpath.basename(p)] for p in imgList])
+      hits = self.labelArr[topKIdx] == self.labelArr[goldenIdx][:, None]
+      self.top1Count += int(hits[:, 0].sum())
+      self.top5Count += int(hits.any(axis=1).sum())
   
+    if self.args.get('join_results'):
+      for i, image_id in enumerate(self.imgIds):
+        best = topKIdx[i, 0]
+        self.emit('result', (image_id, "%s (%.3f)" % (self.labels[best] if self.labels else best, topKVals[i, 0])))
+
+    if self.args['zmqpub']:
+      predictMsg = xdnn_io.formatClassification(\
+        topKIdx, topKVals, imgList, self.labels, zmqPub=True)
+      self.emit('zmq', predictMsg)
+
+  def readBatch(self):
+    """
+    Takes the next batch from shared memory. Outputs are copied to private
+    buffers so the slot goes back to fpga_process before post-processing.
+
+    :returns: tuple -- (batch sequence number, image paths, image shapes, outputs), or None once closed.
+    """
+    read_slot = self._shared_output_arrs.openReadId()
+    if read_slot is None:
+      return None
+
+    read_slot_arrs = self._shared_output_arrs.accessNumpyBuffer(read_slot)
+    if self._outBufs is None:
+      self._outBufs = [np.empty_like(arr) for arr in read_slot_arrs[:-1]]
+    for buf, arr in zip(self._outBufs, read_slot_arrs[:-1]):
+      np.copyto(buf, arr)
+    meta = read_slot_arrs[-1]
+    seq = int(meta[0][4])
+
+    imgList = []
+    shape_list = []
+    # image ids of the batch, for results joined across networks by mp_multinet
+    self.imgIds = []
+    for image_num in range(meta.shape[0]):
+      image_id = meta[image_num][0]
+      if image_id == -1:
+        break
+      self.imgIds.append(int(image_id))
+      imgList.append(self.img_paths[int(image_id)])
+      shape_list.append(meta[image_num][1:4].copy())
+    self._shared_output_arrs.closeReadId(read_slot)
+    return seq, imgList, shape_list, self._outBufs
+
   def loop(self):
-    fpgaOutputShape = self.output_shapes[0]
-    fpgaOutputShape[0] = self.args['batch_sz']
-    frame_count = 0
+    fpgaOutputShapes = []
+    for shape in self.output_shapes:
+      shape = list(shape)
+      shape[0] = self.args['batch_sz']
+      fpgaOutputShapes.append(shape)
 
     while True:
-      read_slot = self._shared_output_arrs.openReadId()
-      if read_slot is None:
-          break
-      
-      read_slot_arrs = self._shared_output_arrs.accessNumpyBuffer(read_slot)  
-      imgList = []
-      shape_list = []
-      #image_id = self._qFrom.get()
-      num_images = (read_slot_arrs[-1].shape)[0]
-      for image_num in range(num_images):
-          image_id = read_slot_arrs[-1][image_num][0]
-          
-          if image_id == -1:
-              break
-          
-          imgList.append(self.img_paths[int(image_id)])
-          shape_list.append(read_slot_arrs[-1][image_num][1:4])
-      
-             
+      batch = self.readBatch()
+      if batch is None:
+        break
+      seq, imgList, shape_list, outputs = batch
+
       if self.args["benchmarkmode"]:
         self.numProcessed += len(imgList)
-        #self.streamQ.put(sId)
-        self._shared_output_arrs.closeReadId(read_slot)        
-        continue
+      else:
+        self.run(imgList, outputs, fpgaOutputShapes, shape_list)
 
-      self.run(imgList,read_slot_arrs[0:-1], [fpgaOutputShape], shape_list)
-      self._shared_output_arrs.closeReadId(read_slot)
+      if self._emitQ is not None:
+        self._emitQ.put((seq, self._outbox))
+        self._outbox = []
 
     self.finish()
 
+  def stats(self):
+    """
+    :returns: dict -- counters merged across workers by summarize.
+    """
+    return {'numProcessed': self.numProcessed, 'startTime': self.startTime,
+            'endTime': timeit.default_timer(), 'top1Count': self.top1Count, 'top5Count': self.top5Count}
+
   def finish(self):
-    print ( "%g images/s" % ( float(self.numProcessed) / (timeit.default_timer() - self.startTime )  ))
+    if self._emitQ is not None:
+      self._emitQ.put((None, self.stats()))
+    else:
+      self.summarize(self.args, [self.stats()])
+
+  @classmethod
+  def summarize(cls, args, stats_list):
+    """
+    Prints throughput and accuracy over the stats of every post-processing worker.
+    """
+    numProcessed = sum(s['numProcessed'] for s in stats_list)
+    elapsed = max(s['endTime'] for s in stats_list) - min(s['startTime'] for s in stats_list)
+    print ( "%g images/s" % ( float(numProcessed) / elapsed ))
   
-    if self.args['golden'] and self.numProcessed:
+    if args['golden'] and numProcessed:
       print ("\nAverage accuracy (n=%d) Top-1: %.1f%%, Top-5: %.1f%%\n") \
-        % (self.numProcessed,
-           float(self.top1Count)/float(self.numProcessed)*100.,
-           float(self.top5Count)/float(self.numProcessed)*100.)
+        % (numProcessed,
+           float(sum(s['top1Count'] for s in stats_list))/float(numProcessed)*100.,
+           float(sum(s['top5Count'] for s in stats_list))/float(numProcessed)*100.)
 
 ###################################################
 # Instantiate pre/post processes,
@@ -188,60 +369,250 @@ def register_post(postClass):
   g_postClass = postClass
 
 
+def place_stage(args, stage):
+  # pin the calling process as requested by args['placement'] and report it
+  placement = args.get('placement')
+  if not placement:
+    return
+  placement.apply(stage)
+  # one write per line so lines of concurrently starting stages do not interleave
+  for line in placement.report({stage: [os.getpid()]}):
+    sys.stdout.write("[placement] %s\n" % line)
+  sys.stdout.flush()
+
 def init_pre_process(args, img_paths,  input_shapes, shared_trans_arrs):
   global g_preClass
   global g_preInst
+  place_stage(args, 'pre')
   g_preInst = g_preClass(args,   img_paths,  input_shapes, shared_trans_arrs)
 
 def run_pre_process(imgpath_idx):
   global g_preInst
   return g_preInst.run(imgpath_idx)
 
-def post_process( args, img_paths, fpgaOutputs, output_shapes,shared_output_arrs):
+def run_source_item(inum, data):
+  # a bad item from a stream is logged and dropped, the pipeline keeps running
+  global g_preInst
+  try:
+    g_preInst.run(inum, data)
+  except Exception as e:
+    print ( "Skipping %s: %s" % (g_preInst._imgpaths[inum], e) )
+
+def pre_process_worker(wid, gen, gens, num_active, next_img, num_img, perpetual,
+                       args, img_paths, input_shapes, shared_trans_arrs, itemQ=None):
+  # worker wid runs while wid < num_active and it still owns its slot (gens[wid]
+  # == gen); images are handed out by a shared counter, or with itemQ as
+  # (inum, data) items until a None end marker
+  init_pre_process(args, img_paths, input_shapes, shared_trans_arrs)
+  while wid < num_active.value and gens[wid] == gen:
+    if itemQ is not None:
+      item = itemQ.get()
+      if item is None:
+        return
+      run_source_item(*item)
+      continue
+    with next_img.get_lock():
+      inum = next_img.value
+      if inum >= num_img and not perpetual:
+        return
+      next_img.value = inum + 1
+    run_pre_process(inum % num_img)
+
+class PreProcessWorkers:
+  """
+  Resizable set of preprocessing processes, used instead of a fixed mp.Pool
+  when preprocessing autoscales. Removed workers exit after their current image.
+  """
+  def __init__(self, maxWorkers, num_img, perpetual, initargs, itemQ=None):
+    self._procs = [None] * maxWorkers
+    self._retired = []    # removed workers, possibly still finishing an image
+    # bumped when a slot's worker is removed, so it exits even if the slot is reused
+    self._gens = mp.RawArray(ctypes.c_long, maxWorkers)
+    self._num_active = mp.RawValue(ctypes.c_long, 0)
+    self._next_img = mp.Value(ctypes.c_long, 0)
+    self._num_img = num_img
+    self._perpetual = perpetual
+    self._initargs = initargs
+    self._itemQ = itemQ
+
+  def size(self):
+    return self._num_active.value
+
+  def resize(self, num):
+    for wid in range(num, len(self._procs)):
+      if self._procs[wid] is not None:
+        self._gens[wid] += 1
+        self._retired.append(self._procs[wid])
+        self._procs[wid] = None
+    for proc in [proc for proc in self._retired if not proc.is_alive()]:
+      proc.join()
+      self._retired.remove(proc)
+    self._num_active.value = num
+    for wid in range(num):
+      proc = self._procs[wid]
+      if proc is not None and proc.is_alive():
+        continue
+      if proc is not None:
+        proc.join()
+      proc = mp.Process(target=pre_process_worker,
+        args=(wid, self._gens[wid], self._gens, self._num_active, self._next_img, self._num_img, self._perpetual)
+          + self._initargs + (self._itemQ,))
+      # like mp.Pool workers, do not outlive the pipeline
+      proc.daemon = True
+      proc.start()
+      self._procs[wid] = proc
+
+  def join(self):
+    for proc in self._procs + self._retired:
+      if proc is not None:
+        proc.join()
+
+def autoscale_pre_process(workers, scaler, shared_trans_arrs, until, interval=0.5):
+  """
+  Resizes workers until the process until exits. Occupancy is the share of
+  ready slots among those fpga_process is not holding (ready or free).
+  """
+  while until.is_alive():
+    until.join(interval)
+    ready = shared_trans_arrs.numReady()
+    free = shared_trans_arrs.numFree()
+    num = scaler.update(float(ready) / max(1, ready + free))
+    if num != workers.size():
+      print ( "[autoscale] preprocessing workers %d -> %d (ready slot share %.2f)" \
+        % (workers.size(), num, scaler.occupancy))
+      workers.resize(num)
+
+def feed_source(source, itemQ, names, num_workers):
+  """
+  Hands the items of an xdnn_source input source to preprocessing workers.
+  Image ids wrap around the names table, then every worker gets an end marker.
+  """
+  try:
+    for count, (name, data) in enumerate(source):
+      inum = count % len(names)
+      names[inum] = name
+      # blocks while the workers are behind, bounding decoded items in flight
+      itemQ.put((inum, data))
+  finally:
+    source.close()
+    for i in range(num_workers):
+      itemQ.put(None)
+
+def post_process( args, img_paths, fpgaOutputs, output_shapes,shared_output_arrs, emitQ=None):
   global g_postClass
   global g_postInst
-  g_postInst = g_postClass( args, img_paths, fpgaOutputs, output_shapes, shared_output_arrs)
+  place_stage(args, 'post')
+  g_postInst = g_postClass( args, img_paths, fpgaOutputs, output_shapes, shared_output_arrs, emitQ)
   g_postInst.loop()
 
+# collectors of several nets (mp_multinet) finish around the same time
+_summaryLock = threading.Lock()
+
+def collect_post(args, emitQ, num_workers, ordered, postClass=None, publisher=None, header=None):
+  """
+  Publishes the messages of sharded post-processing workers, in batch
+  submission order if ordered, and summarizes once every worker is done.
+
+  :param postClass: Post-process class whose summarize is used. Default is the registered one.
+  :param publisher: Object with publish(kind, msg). Default is a ResultPublisher for args.
+  :param header: Optional title printed above the summary, e.g. the net's name.
+  """
+  if publisher is None:
+    publisher = ResultPublisher(args)
+  pending = {}    # reorder buffer: batch sequence number -> messages
+  next_seq = 0
+  stats_list = []
+  while len(stats_list) < num_workers:
+    seq, msgs = emitQ.get()
+    if seq is None:
+      stats_list.append(msgs)
+      continue
+    if not ordered:
+      for kind, msg in msgs:
+        publisher.publish(kind, msg)
+      continue
+    pending[seq] = msgs
+    while next_seq in pending:
+      for kind, msg in pending.pop(next_seq):
+        publisher.publish(kind, msg)
+      next_seq += 1
+
+  for seq in sorted(pending):
+    for kind, msg in pending[seq]:
+      publisher.publish(kind, msg)
+  # keep each summary in one piece
+  with _summaryLock:
+    if header is not None:
+      print ( "\n[%s]" % header )
+    (postClass or g_postClass).summarize(args, stats_list)
+
 ###################################################
 # FPGA
 ###################################################
 
-def fpga_wait( fpgaRT, q, shared_output_arrs, shared_trans_arrs):
-  numProcessed = 0
-  while True:
-    write_slot , read_slot_list, img_num = q.get()
-    
-    if write_slot is None:
-      break
+def fpga_done(fut, shared_output_arrs, shared_trans_arrs, write_slot, read_slot_list):
+  for read_slot in read_slot_list:
+      shared_trans_arrs.closeReadId(read_slot)
+
+  shared_output_arrs.closeWriteId(write_slot)
+
+
+def open_batch(shared_trans_arrs, bsz, remaining, perpetual, max_wait=0.):
+    # the last batch of a finite run is partial: flush it once its rows are written.
+    # with max_wait, a batch is also flushed max_wait seconds after its first row arrived
+    tail = not perpetual and remaining < bsz
+    if not tail and max_wait <= 0:
+        return shared_trans_arrs.openReadId()
+    while True:
+        if tail:
+            wait = 0.005
+        else:
+            age = shared_trans_arrs.pendingAge()
+            wait = max_wait / 2 if age is None else max(max_wait - age, 0.)
+        read_slot = shared_trans_arrs.tryOpenReadId(wait)
+        if read_slot is not None:
+            return None if read_slot == CLOSED else read_slot
+        shared_trans_arrs.flush(0. if tail else max_wait)
 
-    fpgaRT.get_result(write_slot)
-    #qFpga.put(img_num)
-    for read_slot in read_slot_list:
-        shared_trans_arrs.closeReadId(read_slot)
-    
-    shared_output_arrs.closeWriteId(write_slot)
 
-  shared_output_arrs.close()
+def finish_raw(plan, raw, meta, out):
+    box = meta[4:8] if meta[4] >= 0 else None
+    plan.finish(raw.reshape(out.shape), out=out, box=box)
 
 
 def fpga_process(fpgaRT,  args, num_img,  compJson, shared_trans_arrs,shared_output_arrs):
-    if fpgaRT is None:
-        ret, handles = xdnn.createHandle(args['xclbin'], "kernelSxdnn_0", [args["deviceID"]])
-        if ret != 0:
-            sys.exit(1)
-        fpgaRT = xdnn.XDNNFPGAOp(handles, args)
+    place_stage(args, 'fpga')
+    numStreams = args['numstream']
+    if args.get('deviceIDs'):
+        # one process feeds every card; batches go to the least loaded one
+        executor = XDNNDispatcher.fromDevices(args['xclbin'], args, args['deviceIDs'], maxInFlight=numStreams)
     else:
-        print "fpga process handle was ready:"
-    qWait = mp.Queue(maxsize=100)
+        if fpgaRT is None:
+            ret, handles = xdnn.createHandle(args['xclbin'], "kernelSxdnn_0", [args["deviceID"]])
+            if ret != 0:
+                sys.exit(1)
+            fpgaRT = xdnn.XDNNFPGAOp(handles, args)
+        else:
+            print "fpga process handle was ready:"
+        executor = XDNNAsyncExecutor(fpgaRT, maxInFlight=numStreams)
+    fpga_loop(executor, args, num_img, compJson, shared_trans_arrs, shared_output_arrs)
+    xdnn.closeHandle()
+
+
+def fpga_loop(executor, args, num_img, compJson, shared_trans_arrs, shared_output_arrs, preClass=None):
+    """
+    Batches preprocessed images from shared_trans_arrs onto executor until
+    num_img images (None: until the ring is closed) are done, then closes
+    the executor and shared_output_arrs.
+
+    :param preClass: Pre-process class whose makePlan finishes uint8 slots. Default is the registered one.
+    """
     numStreams = args['numstream']
     bsz = args['batch_sz']
     input_ptrs = [[] for i in range(numStreams)]
     
     
     numProcessed = 0
-    t = threading.Thread(target=fpga_wait, args=(fpgaRT, qWait, shared_output_arrs, shared_trans_arrs))
-    t.start()
     
     input_shapes = map(lambda x: (x), compJson.getInputs().itervalues())
     output_shapes = map(lambda x: (x), compJson.getOutputs().itervalues()) 
@@ -252,8 +623,24 @@ def fpga_process(fpgaRT,  args, num_img,  compJson, shared_trans_arrs,shared_out
     num_inputs = len(input_shapes)
     num_outputs = len(output_shapes)
 
+    plan = None
+    if args.get('slot_dtype', 'float32') == 'uint8':
+        if num_inputs != 1:
+            raise ValueError("--slot_dtype uint8 supports single input networks only")
+        plan = (preClass or g_preClass).makePlan(args, input_shapes[0])
+        # float32 input per output slot, alive until that slot's batch completes
+        staging = [np.empty([bsz] + list(input_shapes[0][1:]), dtype=np.float32) for i in range(numStreams)]
+
+    # latency mode: submit a partial batch max_batch_wait_ms after its first image
+    max_wait = args.get('max_batch_wait_ms', 0) / 1000.
+    num_batches = 0
+    closed = False
+    # output meta rows are [inum, H, W, C, batch sequence number]
+    batch_seq = 0
+
     startTime = time.time()
-    while numProcessed < num_img or args['perpetual']: 
+    # num_img None: a streaming source, run until the trans ring is closed
+    while (num_img is None or numProcessed < num_img or args['perpetual']) and not closed: 
 
         
         write_slot = shared_output_arrs.openWriteId()        
@@ -265,18 +652,67 @@ def fpga_process(fpgaRT,  args, num_img,  compJson, shared_trans_arrs,shared_out
         for out_idx in range(num_outputs):
             out_dict[OutputName_list[out_idx]] = write_slot_arrs[out_idx]
             
+        if args.get('batchslots'):
+            # workers wrote straight into the rows of one [batch, ...] block
+            remaining = bsz if num_img is None else num_img - numProcessed
+            read_slot = open_batch(shared_trans_arrs, bsz, remaining, args['perpetual'], max_wait)
+            if read_slot is None:
+                break
+            read_slot_arrs = shared_trans_arrs.accessNumpyBuffer(read_slot)
+            images_added = shared_trans_arrs.numRows(read_slot)
+            numProcessed += images_added
+            keep = np.flatnonzero(read_slot_arrs[-1][:images_added, 0] != SKIPPED)
+            if len(keep) < images_added:
+                # drop rows whose preprocessing failed
+                for arr in read_slot_arrs:
+                    arr[:len(keep)] = arr[keep]
+                images_added = len(keep)
+                if images_added == 0:
+                    shared_trans_arrs.closeReadId(read_slot)
+                    shared_output_arrs.abortWriteId(write_slot)
+                    continue
+            if plan is not None:
+                for img_idx in range(images_added):
+                    finish_raw(plan, read_slot_arrs[0][img_idx], read_slot_arrs[-1][img_idx], staging[write_slot][img_idx])
+                in_dict[InputName_list[0]] = staging[write_slot][:images_added]
+            else:
+                for in_idx in range(num_inputs):
+                    in_dict[InputName_list[in_idx]] = read_slot_arrs[in_idx][:images_added]
+            write_slot_arrs[-1][:images_added, :4] = read_slot_arrs[-1][:images_added, :4]
+            write_slot_arrs[-1][images_added:] = -1
+            write_slot_arrs[-1][:, 4] = batch_seq
+            batch_seq += 1
+            num_batches += 1
+
+            fut = executor.submit( in_dict, out_dict)
+            fut.add_done_callback(functools.partial(fpga_done,
+              shared_output_arrs=shared_output_arrs, shared_trans_arrs=shared_trans_arrs,
+              write_slot=write_slot, read_slot_list=[read_slot]))
+            continue
+
         read_slot_arrs_list =[]
         read_slot_list =[]        
         for img_num in range(args['batch_sz']):
-            read_slot = shared_trans_arrs.openReadId()
+            if img_num == 0 or max_wait <= 0:
+                read_slot = shared_trans_arrs.openReadId()
+            else:
+                read_slot = shared_trans_arrs.tryOpenReadId(max(deadline - time.time(), 0.))
+                if read_slot is None:
+                    # deadline passed: submit what has arrived
+                    break
+                if read_slot == CLOSED:
+                    read_slot = None
             
             if read_slot is None:
+                closed = True
                 break            
+            if img_num == 0:
+                deadline = time.time() + max_wait
             read_slot_arrs = shared_trans_arrs.accessNumpyBuffer(read_slot)
             read_slot_arrs_list.append(read_slot_arrs)
             read_slot_list.append(read_slot)
             
-            write_slot_arrs[-1][img_num][:] = read_slot_arrs[-1][:]            
+            write_slot_arrs[-1][img_num][:4] = read_slot_arrs[-1][:4]
             
             numProcessed += 1
             if(args['perpetual'] == False):
@@ -284,125 +720,148 @@ def fpga_process(fpgaRT,  args, num_img,  compJson, shared_trans_arrs,shared_out
                     break
         
         images_added = len(read_slot_arrs_list)
+        if images_added == 0:
+            break
+        num_batches += 1
         
         # when number of images avaiable are less than the batch size, fill the rest of the out buffer image-id  slots with -1
         for img_num in range(images_added,args['batch_sz']):
              write_slot_arrs[-1][img_num][:] = -1
+        write_slot_arrs[-1][:, 4] = batch_seq
+        batch_seq += 1
             
-        for in_idx in range(num_inputs):            
-            in_dict[InputName_list[in_idx]] = []            
-            for img_idx in range(len(read_slot_arrs_list)):
-                in_dict[InputName_list[in_idx]].append(read_slot_arrs_list[img_idx][in_idx])
+        if plan is not None:
+            for img_idx in range(images_added):
+                finish_raw(plan, read_slot_arrs_list[img_idx][0], read_slot_arrs_list[img_idx][-1],
+                           staging[write_slot][img_idx])
+            in_dict[InputName_list[0]] = staging[write_slot][:images_added]
+        else:
+            for in_idx in range(num_inputs):            
+                in_dict[InputName_list[in_idx]] = []            
+                for img_idx in range(len(read_slot_arrs_list)):
+                    in_dict[InputName_list[in_idx]].append(read_slot_arrs_list[img_idx][in_idx])
             
            
-        fpgaRT.exec_async( in_dict, out_dict, write_slot)
-        qWait.put((write_slot, read_slot_list, img_num))
-        #shared_trans_arrs.closeReadId(read_slot)
+        fut = executor.submit( in_dict, out_dict)
+        fut.add_done_callback(functools.partial(fpga_done,
+          shared_output_arrs=shared_output_arrs, shared_trans_arrs=shared_trans_arrs,
+          write_slot=write_slot, read_slot_list=read_slot_list))
         
-    qWait.put ((None, None, None))
-    t.join()
+    executor.close()
+    # one end marker per post-processing worker
+    for i in range(args.get('numpostproc', 1)):
+        shared_output_arrs.close()
     elapsedTime = ( time.time() - startTime )
-    print ( "FPGA_process: ", float(numProcessed)/elapsedTime, "img/s")
-
-    xdnn.closeHandle()
-
-
-# Current version does copies...
-# Assumes all types are np.float32/ctypes.c_float
-class SharedMemoryQueue:
-    def __init__(self, name, length, buf_shapes_list):
-
-        print "Creating SharedMemoryQueue",name
-        self._name = name
-        self._len = length
-
-        # Hard coded for floats...
-        self._mem_type = ctypes.c_float
-        self._np_type = np.float32
-        
-        # put() function copies into the free list
-        self._freeList = mp.Queue(length)
-
-        # get() function gets id of open slot. consumer needs to confirm when data is read
-        self._readList = mp.Queue(length)
-
-        self._buf_shapes_list = buf_shapes_list
-        self._buf_sizes_list = map(lambda x: np.prod(x), buf_shapes_list)
-
-        print "Creating Shared Memory with buf_shape_list=",self._buf_shapes_list
-        
-        self._shared_memory_arrs = list()
-        for i in range(length):
-            buf_list = list()
-            for buf_size in self._buf_sizes_list:
-                buf_list.append(mp.Array(self._mem_type, buf_size))
-            self._shared_memory_arrs.append(buf_list)
-            self._freeList.put(i)
-
-        
-    def close(self):
-        self._readList.put(None)
-
-
-    def accessBuffer(self, slot_id):
-        return self._shared_memory_arrs[slot_id]
-
-
-    def accessNumpyBuffer(self, slot_id):
-        buf_list = list()
-        for i in range(len(self._buf_shapes_list)):
-            np_arr = np.frombuffer(self._shared_memory_arrs[slot_id][i].get_obj(), dtype = self._np_type)
-            np_arr = np.reshape(np_arr, self._buf_shapes_list[i], order = 'C')
-            buf_list.append(np_arr)
-        
-        return buf_list
-
-    
-    def openWriteId(self):
-        id = self._freeList.get()
-        return id
+    tag = "FPGA_process %s:" % args['name'] if args.get('name') else "FPGA_process:"
+    print ( tag, float(numProcessed)/elapsedTime, "img/s")
+    if num_batches:
+        print ( "%s batch fill ratio %.3f (%d images in %d batches of %d)" \
+          % (tag, float(numProcessed) / (num_batches * bsz), numProcessed, num_batches, bsz))
 
 
-    def closeWriteId(self, id):
-        # finished writing slot id 
-        self._readList.put(id)
-
-
-    def openReadId(self):
-        id = self._readList.get()
-        return id
-
-
-    def closeReadId(self, id):
-        # finished reading slot id
-        self._freeList.put(id)
-
-
-    def dump(self):
-        for i in range(self._len):
-          buf_list = self.accessNumpyBUffer(i)
-          for np_arr in buf_list:
-              print "Slot=",i,"Array=",j,"Val=",np_arr
-        
-
 ###################################################
 # "Main"
 ###################################################
 
-def run(args=None):
+def make_parser():
+  """
+  :returns: argparse.ArgumentParser -- xdnn_io.default_parser_args plus the pipeline options.
+  """
+  parser = xdnn_io.default_parser_args()
+  parser.add_argument('--numprepproc', type=int, default=1,
+                      help='number of parallel processes used to decode and quantize images')
+  parser.add_argument('--numprepproc_max', type=int, default=0,
+                      help='autoscale preprocessing between --numprepproc_min and this many processes, starting from --numprepproc; 0 disables')
+  parser.add_argument('--numprepproc_min', type=int, default=1,
+                      help='lower bound for autoscaled preprocessing')
+  parser.add_argument('--numstream', type=int, default=16,
+                      help='number of FPGA streams')
+  parser.add_argument('--deviceID', type=int, default=0,
+                      help='FPGA no. -> FPGA ID to run in case multiple FPGAs')
+  parser.add_argument('--deviceIDs', type=int, nargs='+', default=None,
+                      help='FPGA IDs to load balance across from a single process (overrides --deviceID)')
+  parser.add_argument('--benchmarkmode', type=int, default=0,
+                      help='bypass pre/post processing for benchmarking')
+  parser.add_argument('--batchslots', default=False, action='store_true',
+                      help='preprocess into batch-contiguous shared memory submitted to the FPGA without gathering')
+  parser.add_argument('--slot_dtype', default='float32', choices=['float32', 'uint8'],
+                      help='type of preprocessed images in shared memory; uint8 defers scale/mean to the FPGA process')
+  parser.add_argument('--max_batch_wait_ms', type=float, default=0,
+                      help='submit a partial batch this long after its first image arrived; 0 waits for full batches')
+  parser.add_argument('--numpostproc', type=int, default=1,
+                      help='number of parallel post-processing processes')
+  parser.add_argument('--postproc_ordered', default=False, action='store_true',
+                      help='publish post-processing results in batch submission order')
+  parser.add_argument('--cpus_pre', default=None,
+                      help='CPUs for preprocessing processes, as a cpu list (0-3,8) or node:N')
+  parser.add_argument('--cpus_fpga', default=None,
+                      help='CPUs for the FPGA process, as a cpu list or node:N')
+  parser.add_argument('--cpus_post', default=None,
+                      help='CPUs for post-processing processes, as a cpu list or node:N')
+  parser.add_argument('--shm_node', type=int, default=-1,
+                      help='NUMA node to allocate shared-memory slots on; -1 leaves it to the kernel')
+  parser.add_argument('--source', default=None,
+                      help='stream images from dir:PATH, watch:PATH, stdin, zmq:ENDPOINT or video:PATH instead of --images')
+  parser.add_argument('--prefetch', type=int, default=64,
+                      help='source items queued ahead of the preprocessing workers')
+  parser.add_argument('--ingest', default=None, metavar='NAME',
+                      help='take preprocessed images from external producers through /dev/shm/NAME (see xfdnn/rt/xdnn_ingest.py) instead of --images')
+  return parser
+
+def make_rings(args, input_shapes, output_shapes, num_prep):
+  """
+  Creates the shared memory from preprocessing to fpga forward ("trans") and
+  from fpga forward to post-processing ("output").
+
+  :param num_prep: Maximum number of preprocessing processes.
+  :returns: (SharedMemoryRing, SharedMemoryRing) -- trans and output rings.
+  """
+  num_shared_slots = args['numstream']
+  # trans: image buffers plus [inum, H, W, C]
+  # (and for uint8 slots the [top, left, height, width] letterbox)
+  if args.get('slot_dtype', 'float32') == 'uint8':
+    trans_dtypes = [np.uint8] * len(input_shapes) + [np.float32]
+    meta_sz = 8
+  else:
+    trans_dtypes = None
+    meta_sz = 4
+  if args.get('ingest'):
+    # external producers attach by name and write the slots (xdnn_ingest);
+    # names of images possibly still in the pipeline must survive id reuse
+    num_slots = num_shared_slots*(num_prep*args['batch_sz'])
+    shared_trans_arrs = NamedSharedMemoryRing(args['ingest'], num_slots, input_shapes + [(meta_sz)], trans_dtypes,
+      config=g_preClass.ingestConfig(args, input_shapes[0]),
+      nameCapacity=2 * (num_slots + num_shared_slots * args['batch_sz']) + 1)
+  elif args.get('batchslots'):
+    batch_shapes = [[args['batch_sz']] + list(shape[1:]) for shape in input_shapes]
+    shared_trans_arrs = SharedMemoryBatchRing("trans", num_shared_slots*num_prep,
+      batch_shapes + [(args['batch_sz'], meta_sz)], args['batch_sz'], trans_dtypes)
+  else:
+    shared_trans_arrs = SharedMemoryRing("trans",num_shared_slots*(num_prep*args['batch_sz'])  , input_shapes +[(meta_sz)],
+      trans_dtypes)
+  # output: outputs plus [inum, H, W, C, batch sequence number], float64 so the sequence stays exact
+  # fpga_process closes it once per post-processing worker
+  shared_output_arrs = SharedMemoryRing("output",num_shared_slots, output_shapes + [(args['batch_sz'], 5)],
+    [np.float32] * len(output_shapes) + [np.float64], numReaders=args.get('numpostproc', 1))
+  return shared_trans_arrs, shared_output_arrs
+
+def run(args=None, placement=None):
+  """
+  Runs the pipeline.
+
+  :param args: Argument dictionary. Default parses the command line.
+  :param placement: xdnn_affinity.Placement for the 'pre', 'fpga' and 'post' stages and shared memory. Default is built from args.
+  """
   if not args:
-    parser = xdnn_io.default_parser_args()
-    parser.add_argument('--numprepproc', type=int, default=1,
-                        help='number of parallel processes used to decode and quantize images')
-    parser.add_argument('--numstream', type=int, default=16,
-                        help='number of FPGA streams')
-    parser.add_argument('--deviceID', type=int, default=0,
-                        help='FPGA no. -> FPGA ID to run in case multiple FPGAs')
-    parser.add_argument('--benchmarkmode', type=int, default=0,
-                        help='bypass pre/post processing for benchmarking')
+    parser = make_parser()
     args = parser.parse_args()
     args = xdnn_io.make_dict_args(args)
     
+  if placement is None:
+    placement = Placement.fromArgs(args)
+  # stages pin themselves from args['placement']
+  args['placement'] = placement
+
   if not xdnn.createManager():
     sys.exit(1)
   fpgaRT = None
@@ -428,27 +887,89 @@ def run(args=None):
    
   
   num_shared_slots = args['numstream'] 
-
-  # shared memory from preprocessing to fpga forward
-  shared_trans_arrs = SharedMemoryQueue("trans",num_shared_slots*(args['numprepproc']*args['batch_sz'])  , input_shapes +[(4)])
-  # shared memory from fpga forward to postprocessing
-  shared_output_arrs = SharedMemoryQueue("output",num_shared_slots, output_shapes + [(args['batch_sz'], 4)])
+  # autoscaled preprocessing may grow up to numprepproc_max workers
+  num_prep = max(args['numprepproc'], args.get('numprepproc_max', 0))
+  ingest = args.get('ingest')
+  if ingest and (args.get('batchslots') or args.get('source') or args.get('numprepproc_max')):
+    raise ValueError("--ingest does not support --batchslots, --source or --numprepproc_max")
+
+  # pages are first touched, and so placed, on the CPUs of --shm_node
+  with placement.shmScope():
+    shared_trans_arrs, shared_output_arrs = make_rings(args, input_shapes, output_shapes, num_prep)
+  if placement:
+    for line in placement.report({}, {'trans': shared_trans_arrs.baseAddress(),
+                                      'output': shared_output_arrs.baseAddress()}):
+      print "[placement] %s" % line
     
 
 
-  img_paths = xdnn_io.getFilePaths(args['images'])
+  source = None
+  itemQ = None
+  if ingest:
+    # producers write image names next to the slots
+    img_paths = shared_trans_arrs.names()
+    num_img = None
+    print "[ingest] accepting images at %s" % NamedSharedMemoryRing.path(ingest)
+  elif args.get('source'):
+    # streaming: names travel by id through shared memory; ids are reused once
+    # every image that could still be in the pipeline has a newer id
+    source = xdnn_source.openSource(args['source'])
+    itemQ = mp.Queue(maxsize=args['prefetch'])
+    in_flight = args['prefetch'] + num_prep + shared_trans_arrs.numSlots() * args['batch_sz'] \
+      + num_shared_slots * args['batch_sz']
+    img_paths = SharedNameTable(2 * in_flight + 1)
+    num_img = None
+  else:
+    img_paths = xdnn_io.getFilePaths(args['images'])
+    num_img = len(img_paths)
   
   
-  p = mp.Pool(initializer = init_pre_process, 
-    initargs = (args,  img_paths, input_shapes, shared_trans_arrs, ), processes = args['numprepproc'])
-
-  xdnnProc = mp.Process(target=fpga_process, args=(fpgaRT,  args, len(img_paths), compilerJSONObj,shared_trans_arrs,shared_output_arrs,))
-
-  postProc = mp.Process(target=post_process, args=(args, img_paths,  fpgaOutputs,output_shapes,shared_output_arrs,))
+  autoscale = args.get('numprepproc_max', 0) > 0
+  if autoscale or source is not None:
+    scaler = QueueDepthScaler(args['numprepproc_min'], args['numprepproc_max'],
+      start=args['numprepproc']) if autoscale else None
+    prepWorkers = PreProcessWorkers(num_prep, num_img, args['perpetual'],
+      (args, img_paths, input_shapes, shared_trans_arrs), itemQ)
+  elif not ingest:
+    p = mp.Pool(initializer = init_pre_process, 
+      initargs = (args,  img_paths, input_shapes, shared_trans_arrs, ), processes = args['numprepproc'])
+
+  xdnnProc = mp.Process(target=fpga_process, args=(fpgaRT,  args, num_img, compilerJSONObj,shared_trans_arrs,shared_output_arrs,))
+
+  numPostProc = args.get('numpostproc', 1)
+  emitQ = mp.Queue() if numPostProc > 1 else None
+  postProcs = [mp.Process(target=post_process, args=(args, img_paths,  fpgaOutputs,output_shapes,shared_output_arrs,emitQ,))
+    for i in range(numPostProc)]
   xdnnProc.start()
-  postProc.start()
-
-  if args['perpetual']:
+  for postProc in postProcs:
+    postProc.start()
+  collector = None
+  if emitQ is not None:
+    collector = threading.Thread(target=collect_post, args=(args, emitQ, numPostProc, args.get('postproc_ordered', False)))
+    collector.start()
+
+  if source is not None:
+    feeder = threading.Thread(target=feed_source, args=(source, itemQ, img_paths, num_prep))
+    feeder.daemon = True
+    feeder.start()
+    if autoscale:
+      prepWorkers.resize(scaler.numWorkers)
+      autoscale_pre_process(prepWorkers, scaler, shared_trans_arrs, feeder)
+    else:
+      prepWorkers.resize(args['numprepproc'])
+      feeder.join()
+    # source exhausted: let the workers drain, then push out the partial batch and end the run
+    prepWorkers.join()
+    if args.get('batchslots'):
+      shared_trans_arrs.flush()
+    shared_trans_arrs.close()
+  elif ingest:
+    # runs until a producer calls IngestClient.close()
+    pass
+  elif autoscale:
+    prepWorkers.resize(scaler.numWorkers)
+    autoscale_pre_process(prepWorkers, scaler, shared_trans_arrs, xdnnProc)
+  elif args['perpetual']:
     while True:
       res = [p.map_async(run_pre_process, range(len(img_paths)))]
       for j in res:
@@ -458,10 +979,18 @@ def run(args=None):
     p.map_async(run_pre_process, range(len(img_paths)))
 
   xdnnProc.join()
-  postProc.join()
-
-  p.close()
-  p.join()
+  if collector is not None:
+    collector.join()
+  for postProc in postProcs:
+    postProc.join()
+
+  if autoscale or source is not None:
+    prepWorkers.join()
+  elif ingest:
+    shared_trans_arrs.unlink()
+  else:
+    p.close()
+    p.join()
   
 if __name__ == '__main__':
   run()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+"""
+Multi-network pipeline: runs every network of a --jsoncfg file (see
+data/multinet_PE_DDR_PE.json) on the same images, decoding each image once.
+
+  preprocessing:   decode -> one tensor per distinct preprocessing spec,
+                   written to the trans ring of every net using it
+  fpga process:    one handle; an executor on its own streams and a
+                   batching thread (mp_classify.fpga_loop) per net
+  post-processing: --numpostproc processes per net; per-image results of
+                   all nets are joined into one line
+
+Each conf selects its pre/post-processing classes by its "transform" key
+("resize", the mp_classify classes, by default). Apps register their own
+with register_transform, e.g. apps/yolo/mp_detect.py registers "yolo".
+Confs need their own netcfg, weights, quantizecfg and PE; other keys fall
+back to the command line.
+"""
+
+import sys
+import threading
+import multiprocessing as mp
+import numpy as np
+
+from ext.PyTurboJPEG import imread
+from xfdnn.rt import xdnn, xdnn_io
+from xfdnn.rt.xdnn_affinity import Placement
+from xfdnn.rt.xdnn_async import XDNNAsyncExecutor
+
+import mp_classify
+
+g_transforms = {'resize': (mp_classify.UserPreProcess, mp_classify.UserPostProcess, None)}
+g_preInst = None
+
+def register_transform(name, preClass, postClass, configure=None):
+  """
+  :param name: Value of a conf's "transform" key.
+  :param preClass: mp_classify.UserPreProcess subclass.
+  :param postClass: mp_classify.UserPostProcess subclass.
+  :param configure: Optional function called with each conf dict using this transform, e.g. to derive args from its netcfg.
+  """
+  g_transforms[name] = (preClass, postClass, configure)
+
+def get_transform(conf):
+  """
+  :returns: tuple -- (preClass, postClass, configure) registered for conf.
+  """
+  name = conf.get('transform', 'resize')
+  if name not in g_transforms:
+    raise ValueError("Unknown transform %r for net %s, have %s" % (name, conf['name'], sorted(g_transforms)))
+  return g_transforms[name]
+
+###################################################
+# Pre-process
+###################################################
+
+class MultiNetPreProcess():
+  def __init__(self, confs, img_paths, input_shapes_list, shared_trans_arrs_list):
+    self._imgpaths = img_paths
+    self._benchmark = confs[0]['benchmarkmode']
+    self._pres = [get_transform(conf)[0](conf, img_paths, input_shapes, shared_trans_arrs)
+                  for conf, input_shapes, shared_trans_arrs in zip(confs, input_shapes_list, shared_trans_arrs_list)]
+    self._keys = [pre.specKey() for pre in self._pres]
+
+  def run(self, inum):
+    img = None
+    if not self._benchmark:
+      img = imread(self._imgpaths[inum])
+      if img is None:
+        raise IOError("Unable to decode %s" % self._imgpaths[inum])
+
+    tensors = {}    # spec key -> buffers of the first net with that spec
+    handles = []
+    try:
+      for pre, key in zip(self._pres, self._keys):
+        handle, write_arrs = pre.openWrite()
+        handles.append((pre, handle))
+        if key in tensors:
+          for dst, src in zip(write_arrs, tensors[key]):
+            np.copyto(dst, src)
+        else:
+          if not self._benchmark:
+            write_arrs[-1][1:4] = pre.load(img, write_arrs)
+          tensors[key] = write_arrs
+        write_arrs[-1][0] = inum
+    except:
+      for pre, handle in handles:
+        pre.abortWrite(handle)
+      raise
+
+    # publish once every net has its tensor, the copies read from the first slot
+    for pre, handle in handles:
+      pre.closeWrite(handle)
+
+def init_pre_process(confs, img_paths, input_shapes_list, shared_trans_arrs_list):
+  global g_preInst
+  mp_classify.place_stage(confs[0], 'pre')
+  g_preInst = MultiNetPreProcess(confs, img_paths, input_shapes_list, shared_trans_arrs_list)
+
+def run_pre_process(inum):
+  return g_preInst.run(inum)
+
+###################################################
+# FPGA
+###################################################
+
+def fpga_process(confs, num_img, compJsons, shared_trans_arrs_list, shared_output_arrs_list):
+  args = confs[0]
+  mp_classify.place_stage(args, 'fpga')
+  ret, handles = xdnn.createHandle(args['xclbin'], "kernelSxdnn_0", [args["deviceID"]])
+  if ret != 0:
+    sys.exit(1)
+
+  threads = []
+  firstStream = 0
+  for conf, compJson, shared_trans_arrs, shared_output_arrs \
+    in zip(confs, compJsons, shared_trans_arrs_list, shared_output_arrs_list):
+    fpgaRT = xdnn.XDNNFPGAOp(handles, conf)
+    # nets share the handle, so each gets its own stream ids
+    streamIds = range(firstStream, firstStream + conf['numstream'])
+    firstStream += conf['numstream']
+    executor = XDNNAsyncExecutor(fpgaRT, maxInFlight=conf['numstream'], streamIds=streamIds)
+    thread = threading.Thread(target=mp_classify.fpga_loop,
+      args=(executor, conf, num_img, compJson, shared_trans_arrs, shared_output_arrs, get_transform(conf)[0]))
+    thread.start()
+    threads.append(thread)
+  for thread in threads:
+    thread.join()
+
+  xdnn.closeHandle()
+
+###################################################
+# Post-process
+###################################################
+
+def post_process(conf, img_paths, output_shapes, shared_output_arrs, emitQ):
+  mp_classify.place_stage(conf, 'post')
+  postClass = get_transform(conf)[1]
+  postClass(conf, img_paths, [], output_shapes, shared_output_arrs, emitQ).loop()
+
+class ResultJoiner:
+  """
+  Publishes one line per image once every net reported its ('result',
+  (image id, text)) message. Other messages are passed to publisher.
+  """
+  def __init__(self, names, img_paths, publisher):
+    self._names = names
+    self._imgpaths = img_paths
+    self._publisher = publisher
+    self._pending = {}    # image id -> {net name: text}
+    self._lock = threading.Lock()
+
+  def add(self, name, image_id, text):
+    with self._lock:
+      results = self._pending.setdefault(image_id, {})
+      results[name] = text
+      if len(results) < len(self._names):
+        return
+      del self._pending[image_id]
+      self._publisher.publish('print', "image: %s  %s" % (self._imgpaths[image_id],
+        "  ".join("%s: %s" % (n, results[n]) for n in self._names)))
+
+  def publish(self, kind, msg):
+    with self._lock:
+      self._publisher.publish(kind, msg)
+
+class NetPublisher:
+  """
+  Publisher handed to mp_classify.collect_post for one net.
+  """
+  def __init__(self, name, joiner):
+    self._name = name
+    self._joiner = joiner
+
+  def publish(self, kind, msg):
+    if kind == 'result':
+      self._joiner.add(self._name, *msg)
+    else:
+      self._joiner.publish(kind, msg)
+
+###################################################
+# "Main"
+###################################################
+
+def run(args=None, placement=None):
+  """
+  Runs the multi-network pipeline.
+
+  :param args: Argument dictionary with 'jsoncfg' confs. Default parses the command line.
+  :param placement: xdnn_affinity.Placement for the 'pre', 'fpga' and 'post' stages and shared memory. Default is built from args.
+  """
+  if not args:
+    parser = mp_classify.make_parser()
+    args = parser.parse_args()
+    args = xdnn_io.make_dict_args(args)
+  if not args.get('jsoncfg'):
+    raise ValueError("mp_multinet needs --jsoncfg")
+  if args.get('source') or args.get('deviceIDs') or args.get('numprepproc_max'):
+    raise ValueError("--source, --deviceIDs and --numprepproc_max are not supported with --jsoncfg")
+
+  confs = args['jsoncfg']
+  if placement is None:
+    placement = Placement.fromArgs(args)
+
+  if not xdnn.createManager():
+    sys.exit(1)
+
+  img_paths = xdnn_io.getFilePaths(args['images'])
+  num_prep = args['numprepproc']
+  names = []
+  compJsons = []
+  input_shapes_list = []
+  output_shapes_list = []
+  shared_trans_arrs_list = []
+  shared_output_arrs_list = []
+  for conf in confs:
+    configure = get_transform(conf)[2]
+    if configure is not None:
+      configure(conf)
+    conf['placement'] = placement
+    conf['join_results'] = True
+    names.append(str(conf['name']))
+
+    compJson = xdnn.CompilerJsonParser(conf['netcfg'])
+    input_shapes = map(lambda x: (x), compJson.getInputs().itervalues())
+    output_shapes = map(lambda x: (x), compJson.getOutputs().itervalues())
+    for out_idx in range(len(output_shapes)):
+      output_shapes[out_idx][0] = conf['batch_sz']
+    with placement.shmScope():
+      shared_trans_arrs, shared_output_arrs = mp_classify.make_rings(conf, input_shapes, output_shapes, num_prep)
+
+    compJsons.append(compJson)
+    input_shapes_list.append(input_shapes)
+    output_shapes_list.append(output_shapes)
+    shared_trans_arrs_list.append(shared_trans_arrs)
+    shared_output_arrs_list.append(shared_output_arrs)
+
+  p = mp.Pool(initializer = init_pre_process,
+    initargs = (confs, img_paths, input_shapes_list, shared_trans_arrs_list, ), processes = num_prep)
+
+  xdnnProc = mp.Process(target=fpga_process, args=(confs, len(img_paths), compJsons,
+    shared_trans_arrs_list, shared_output_arrs_list,))
+
+  # one emit queue and collector per net, all feeding one joiner
+  joiner = ResultJoiner(names, img_paths, mp_classify.ResultPublisher(args))
+  postProcs = []
+  collectors = []
+  for name, conf, output_shapes, shared_output_arrs \
+    in zip(names, confs, output_shapes_list, shared_output_arrs_list):
+    numPostProc = conf.get('numpostproc', 1)
+    emitQ = mp.Queue()
+    postProcs += [mp.Process(target=post_process, args=(conf, img_paths, output_shapes, shared_output_arrs, emitQ,))
+      for i in range(numPostProc)]
+    collectors.append(threading.Thread(target=mp_classify.collect_post,
+      args=(conf, emitQ, numPostProc, conf.get('postproc_ordered', False),
+            get_transform(conf)[1], NetPublisher(name, joiner), name)))
+
+  xdnnProc.start()
+  for postProc in postProcs:
+    postProc.start()
+  for collector in collectors:
+    collector.start()
+
+  if args['perpetual']:
+    while True:
+      res = [p.map_async(run_pre_process, range(len(img_paths)))]
+      for j in res:
+        j.wait()
+        del j
+  else:
+    p.map_async(run_pre_process, range(len(img_paths)))
+
+  xdnnProc.join()
+  for collector in collectors:
+    collector.join()
+  for postProc in postProcs:
+    postProc.join()
+
+  p.close()
+  p.join()
+
+if __name__ == '__main__':
+  run()
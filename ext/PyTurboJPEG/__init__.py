@@ -5,19 +5,103 @@
 # (C) Copyright 2018, Xilinx, Inc.
 #
 import cv2
+import numpy as np
 import os 
 from . turbojpeg import TurboJPEG
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
-lib_jpeg_turbo = TurboJPEG( dir_path + "/lib/libturbojpeg.so")
+lib_jpeg_turbo = None
+_UNAVAILABLE = object()
+
+def _turbojpeg ():
+    # libturbojpeg is loaded on first decode, not at import; if that fails,
+    # warn once and leave every JPEG to OpenCV (returns None)
+    global lib_jpeg_turbo
+    if lib_jpeg_turbo is None:
+        try:
+            lib_jpeg_turbo = TurboJPEG( dir_path + "/lib/libturbojpeg.so")
+        except Exception as e:
+            print (e)
+            print ("Unable to load TurboJPEG, using OpenCV JPEG decode ...")
+            lib_jpeg_turbo = _UNAVAILABLE
+    if lib_jpeg_turbo is _UNAVAILABLE:
+        return None
+    return lib_jpeg_turbo
+
+def _is_jpeg ( buf ):
+    return buf[:2] == b'\xff\xd8'
 
 def imread ( f ):
     try:
         with open(f, 'rb') as in_file:
-            img = lib_jpeg_turbo.decode(in_file.read())            
+            buf = in_file.read()
+        turbo = _turbojpeg() if _is_jpeg(buf) else None
+        if turbo is None:
+            return cv2.imread(f)
+        img = turbo.decode(buf)
     except Exception as e:
         print (e)
         print ("Unable to decode %s with TurboJPEG, falling back to OpenCV JPEG decode ..." % f)
         img = cv2.imread  (f)    
 
     return img
+
+def imdecode ( buf ):
+    """
+    Decodes an encoded image held in memory (bytes or a uint8 array), e.g.
+    received over a socket. Returns None if it cannot be decoded.
+    """
+    buf = np.frombuffer(buf, dtype=np.uint8)
+    turbo = _turbojpeg() if _is_jpeg(buf[:2].tobytes()) else None
+    if turbo is not None:
+        try:
+            # decode reads the array in place through the buffer protocol, no copy
+            return turbo.decode(buf)
+        except Exception as e:
+            print (e)
+            print ("Unable to decode buffer with TurboJPEG, falling back to OpenCV JPEG decode ...")
+    return cv2.imdecode(buf, cv2.IMREAD_COLOR)
+
+def pick_scaling_factor ( scaling_factors, min_scale ):
+    # smallest DCT scaling factor (num, denom) with num/denom >= min_scale,
+    # or None when only a full resolution decode will do
+    best = None
+    for num, denom in scaling_factors:
+        if num >= denom or num < min_scale * denom:
+            continue
+        if best is None or num * best[1] < best[0] * denom:
+            best = (num, denom)
+    return best
+
+def imread_scaled ( f, min_scale ):
+    """
+    Decodes f at the smallest libjpeg-turbo DCT scale that keeps the image
+    at least min_scale of its full size. Scaling happens inside the IDCT, so
+    a 1/4 decode of a 4000x3000 photo costs a fraction of a full decode plus
+    resize. Non-JPEG inputs, and JPEGs TurboJPEG cannot handle, are decoded
+    at full resolution with OpenCV.
+
+    min_scale is either a float, or a callable (width, height) -> float that
+    receives the full resolution size from the JPEG header.
+
+    Returns (image, full resolution shape).
+    """
+    with open(f, 'rb') as in_file:
+        buf = in_file.read()
+
+    turbo = _turbojpeg() if _is_jpeg(buf) else None
+    if turbo is not None:
+        try:
+            width, height, _, _ = turbo.info(buf)
+            scale = min_scale(width, height) if callable(min_scale) else min_scale
+            factor = pick_scaling_factor(turbo.scaling_factors, scale)
+            img = turbo.decode(buf, scaling_factor=factor)
+            return img, (height, width, img.shape[2])
+        except Exception as e:
+            print (e)
+            print ("Unable to decode %s with TurboJPEG, falling back to OpenCV JPEG decode ..." % f)
+
+    img = cv2.imdecode(np.frombuffer(buf, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise IOError("Unable to decode %s" % f)
+    return img, img.shape
@@ -123,6 +123,11 @@ class TurboJPEG(object):
         for i in range(num_scaling_factors.value):
             self.__scaling_factors.append((scaling_factors[i].num, scaling_factors[i].denom))
 
+    @property
+    def scaling_factors(self):
+        """DCT scaling factors supported by decode, as (num, denom) pairs."""
+        return list(self.__scaling_factors)
+
     # --- Decoding
 
     @contextlib.contextmanager
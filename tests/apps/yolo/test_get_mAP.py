@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+import os, sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, "%s/../../../apps/yolo" % os.path.dirname(os.path.realpath(__file__)))
+import get_mAP_darknet
+
+CLASSES = 4
+
+def _iou(gt, det):
+  gt_x_start, gt_y_start = gt[0] - gt[2]/2, gt[1] - gt[3]/2
+  gt_x_end, gt_y_end = gt[0] + gt[2]/2, gt[1] + gt[3]/2
+  x_start, y_start = det[0] - det[2]/2, det[1] - det[3]/2
+  x_end, y_end = det[0] + det[2]/2, det[1] + det[3]/2
+  intersection_w = min(gt_x_end, x_end) - max(gt_x_start, x_start)
+  intersection_h = min(gt_y_end, y_end) - max(gt_y_start, y_start)
+  intersection_val = 0 if intersection_w < 0 or intersection_h < 0 else intersection_w * intersection_h
+  return intersection_val / ((gt[2] * gt[3]) + (det[2] * det[3]) - intersection_val)
+
+def _loop_map(images, num_classes, thresh_calc_avg_iou, iou_thresh):
+  # the original per-detection, per-rank calc_detector_mAP on (gt, detections) label rows
+  gt_class_hist = np.zeros(num_classes)
+  detections = []
+  unique_truth_count = 0
+  avg_iou = tp_for_thresh = fp_for_thresh = 0.0
+  for gts, dets in images:
+    for gt in gts:
+      gt_class_hist[int(gt[0])] += 1
+    for det in dets:
+      if det[1] <= 0:
+        continue
+      truth_index, max_iou = -1, 0.0
+      for label_num, gt in enumerate(gts):
+        current_iou = _iou(gt[1:], det[2:])
+        if current_iou > iou_thresh and int(gt[0]) == int(det[0]) and current_iou > max_iou:
+          max_iou, truth_index = current_iou, unique_truth_count + label_num
+      detections.append((int(det[0]), det[1], truth_index))
+      if det[1] > thresh_calc_avg_iou:
+        if truth_index > -1:
+          avg_iou += max_iou
+          tp_for_thresh += 1
+        else:
+          fp_for_thresh += 1
+    unique_truth_count += len(gts)
+
+  avg_iou = avg_iou / (tp_for_thresh + fp_for_thresh)
+  detections.sort(key=lambda x: x[1], reverse=True)
+  utc_array = np.zeros(unique_truth_count)
+  tp, fp = np.zeros(num_classes), np.zeros(num_classes)
+  pr = []
+  for class_id, prob, truth_index in detections:
+    if truth_index > -1:
+      if utc_array[truth_index] == 0:
+        utc_array[truth_index] = 1
+        tp[class_id] += 1
+    else:
+      fp[class_id] += 1
+    pr.append([(tp[c]/(tp[c]+fp[c]) if tp[c]+fp[c] > 0 else 0,
+                tp[c]/gt_class_hist[c] if gt_class_hist[c] > 0 else 0) for c in range(num_classes)])
+
+  ap = []
+  for c in range(num_classes):
+    avg_precision = 0
+    for point in range(11):
+      cur_precision = 0
+      for rank in range(len(detections)):
+        if pr[rank][c][1] >= point * 0.1 and pr[rank][c][0] > cur_precision:
+          cur_precision = pr[rank][c][0]
+      avg_precision += cur_precision
+    ap.append(avg_precision / 11)
+  mean_average_precision = 0.0
+  for avg_precision in ap:
+    mean_average_precision += avg_precision
+  return ap, mean_average_precision / num_classes, tp_for_thresh, fp_for_thresh, avg_iou
+
+def _images(rs, count):
+  images = []
+  for i in range(count):
+    gts = np.column_stack([rs.randint(0, CLASSES, 5), np.round(rs.uniform(0.2, 0.8, (5, 2)), 2),
+                           np.round(rs.uniform(0.05, 0.3, (5, 2)), 2)])
+    # jittered copies of the boxes, duplicates and misses, with tied scores
+    dets = np.repeat(gts, 2, axis=0)
+    dets[:, 1:] += np.round(rs.normal(0, 0.03, (len(dets), 4)), 2)
+    dets[::3, 0] = rs.randint(0, CLASSES, len(dets[::3]))
+    dets = np.column_stack([dets[:, :1], np.round(rs.uniform(-0.1, 1, len(dets)), 1), dets[:, 1:]])
+    images.append((gts if i != 2 else gts[:0], dets))
+  return images
+
+def _write(tmpdir, images):
+  for i, (gts, dets) in enumerate(images):
+    tmpdir.ensure_dir("gt").join("%d.txt" % i).write("".join("%d %f %f %f %f\n" % tuple(g) for g in gts))
+    tmpdir.ensure_dir("det").join("%d.txt" % i).write("".join("%d %f %f %f %f %f\n" % tuple(d) for d in dets))
+  # detections without ground truth are ignored
+  tmpdir.join("det", "99.txt").write("0 0.9 0.5 0.5 0.1 0.1\n")
+
+def test_calc_detector_mAP_matches_loop(tmpdir):
+  images = _images(np.random.RandomState(0), 8)
+  _write(tmpdir, images)
+  # the label files round the values like they are read back
+  read = lambda path, cols: np.array(tmpdir.join(*path).read().split(), dtype=np.float64).reshape(-1, cols)
+  images = [(read(("gt", "%d.txt" % i), 5), read(("det", "%d.txt" % i), 6)) for i in range(len(images))]
+  ap, expected_map, tp, fp, avg_iou = _loop_map(images, CLASSES, 0.24, 0.5)
+  assert expected_map > 0
+
+  with tmpdir.as_cwd():
+    got = get_mAP_darknet.calc_detector_mAP(str(tmpdir.join("det")), str(tmpdir.join("gt")), CLASSES,
+                                            ["c%d" % c for c in range(CLASSES)], 0.24, 0.5)
+  assert got == expected_map
+
+  evaluator = get_mAP_darknet.DetectionEvaluator(CLASSES, 0.5)
+  for i, (gts, dets) in enumerate(images):
+    evaluator.add_ground_truth(i, gts[:, 0], gts[:, 1:])
+    keep = dets[:, 1] > 0
+    evaluator.add_detections(i, dets[keep, 0], dets[keep, 1], dets[keep, 2:])
+  summary = evaluator.evaluate(metrics=('darknet',), prob_thresh=0.24)
+  assert summary['darknet'].tolist() == ap
+  assert (summary['tp'], summary['fp'], summary['avg_iou']) == (tp, fp, avg_iou)
+
+def test_incremental_evaluate():
+  images = [(gts, dets[dets[:, 1] > 0]) for gts, dets in _images(np.random.RandomState(1), 6)]
+  whole = get_mAP_darknet.DetectionEvaluator(CLASSES)
+  live = get_mAP_darknet.DetectionEvaluator(CLASSES)
+  for i, (gts, dets) in enumerate(images):
+    for evaluator in (whole, live):
+      # detections may arrive before the ground truth
+      evaluator.add_detections(i, dets[:, 0], dets[:, 1], dets[:, 2:])
+      evaluator.add_ground_truth(i, gts[:, 0], gts[:, 1:])
+    partial = live.evaluate()
+    assert partial['darknet_mAP'] == _loop_map(images[:i+1], CLASSES, 0.24, 0.5)[1]
+  expected, got = whole.evaluate(), live.evaluate()
+  for metric in ('darknet', 'voc', 'coco'):
+    assert np.array_equal(got[metric], expected[metric])
+    assert got[metric + '_mAP'] == expected[metric + '_mAP']
+
+def test_voc_and_coco_ap():
+  evaluator = get_mAP_darknet.DetectionEvaluator(3)
+  evaluator.add_ground_truth("a", [0, 0, 1], [[0.2, 0.2, 0.2, 0.2], [0.7, 0.7, 0.2, 0.2], [0.5, 0.5, 0.4, 0.4]])
+  evaluator.add_detections("a", [0, 0, 0, 1],
+                           [0.9, 0.8, 0.7, 0.6],
+                           [[0.2, 0.2, 0.2, 0.2],     # exact
+                            [0.21, 0.2, 0.2, 0.2],    # duplicate of the first box
+                            [0.71, 0.7, 0.2, 0.2],    # second box, IoU 0.905
+                            [0.5, 0.5, 0.4, 0.4]])
+  summary = evaluator.evaluate()
+  # recall 0.5 at precision 1, then 1 at precision 2/3
+  assert summary['voc'][0] == pytest.approx(0.5 + 0.5 * 2/3.)
+  assert summary['voc'][1] == 1.
+  assert np.isnan(summary['voc'][2]) and np.isnan(summary['coco'][2])
+  assert summary['voc_mAP'] == pytest.approx((0.5 + 0.5 * 2/3. + 1.) / 2)
+  # the exact boxes are found at every threshold, the others up to 0.9
+  assert summary['coco'][1] == 1.
+  assert 0.5 < summary['coco'][0] < summary['voc'][0]
+  # darknet counts the duplicate as neither TP nor FP
+  assert summary['darknet'][0] == 1.
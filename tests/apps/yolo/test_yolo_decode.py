@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+import os, sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, "%s/../../../apps/yolo" % os.path.dirname(os.path.realpath(__file__)))
+import yolo_utils
+
+CLASSES = 6
+ANCHORS = 3
+NET = 416
+
+def _loop_decode(yolo_layers, classes, anchorCnt, nw_in_width, nw_in_height):
+  # the original per-anchor, per-class implementation, flattened like det_postprocess
+  biases = yolo_utils.YOLOV3_BIASES
+  order = sorted(range(len(yolo_layers)), key=lambda i: yolo_layers[i].shape[3], reverse=True)
+  flat = []
+  for output_id, layer_id in enumerate(order):
+    layer = yolo_layers[layer_id]
+    width, height = layer.shape[3], layer.shape[2]
+    w_range = np.arange(float(width))
+    h_range = np.arange(float(height)).reshape(height, 1)
+    stride = 5 + classes
+    layer[:, 4::stride] = yolo_utils.sigmoid_ndarray(layer[:, 4::stride])
+    layer[:, 0::stride] = yolo_utils.sigmoid_ndarray(layer[:, 0::stride])
+    layer[:, 1::stride] = yolo_utils.sigmoid_ndarray(layer[:, 1::stride])
+    layer[:, 0::stride] = (layer[:, 0::stride] + w_range) / float(width)
+    layer[:, 1::stride] = (layer[:, 1::stride] + h_range) / float(height)
+    layer[:, 2::stride] = np.exp(layer[:, 2::stride])
+    layer[:, 3::stride] = np.exp(layer[:, 3::stride])
+    for a in range(anchorCnt):
+      layer[:, a*stride + 2] = layer[:, a*stride + 2] * (float(biases[2*a + 2*anchorCnt*output_id]) / float(nw_in_width))
+      layer[:, a*stride + 3] = layer[:, a*stride + 3] * (float(biases[2*a + 2*anchorCnt*output_id + 1]) / float(nw_in_height))
+      for c in range(classes):
+        ch = a*stride + 5 + c
+        layer[:, ch] = np.multiply(yolo_utils.sigmoid_ndarray(layer[:, ch]), layer[:, a*stride + 4])
+    b, _, h, w = layer.shape
+    flat.append(layer.reshape(b, anchorCnt, stride, h*w).transpose(0, 3, 1, 2).reshape(b, h*w*anchorCnt, stride))
+  return np.concatenate(flat, axis=1).astype(np.float64)
+
+def _layers(rs, batch):
+  # listed smallest grid first, like the FPGA outputs
+  return [(rs.randn(batch, ANCHORS*(5+CLASSES), s, s) * 3).astype(np.float32) for s in (3, 6, 12)]
+
+def test_process_all_yolo_layers_matches_loop():
+  layers = _layers(np.random.RandomState(0), 2)
+  expected = _loop_decode([l.copy() for l in layers], CLASSES, ANCHORS, NET, NET)
+  out = yolo_utils.process_all_yolo_layers(layers, CLASSES, ANCHORS, NET, NET)
+  assert [l.shape[3] for l in out] == [12, 6, 3]
+  # decoded in place
+  assert np.shares_memory(out[0], layers[2])
+  b = out[0].shape[0]
+  got = np.concatenate([l.reshape(b, ANCHORS, 5+CLASSES, -1).transpose(0, 3, 1, 2).reshape(b, -1, 5+CLASSES)
+                        for l in out], axis=1)
+  assert np.array_equal(got, expected)
+
+@pytest.mark.parametrize("scorethresh", [0.3, 0.9, 2.])
+def test_decode_yolo_layers_keeps_candidates(scorethresh):
+  layers = _layers(np.random.RandomState(1), 3)
+  expected = _loop_decode([l.copy() for l in layers], CLASSES, ANCHORS, NET, NET)
+  boxes, counts = yolo_utils.decode_yolo_layers(layers, CLASSES, ANCHORS, NET, NET, scorethresh)
+
+  assert boxes.shape[0] == 3 and boxes.shape[1] == counts.max()
+  for b in range(3):
+    rows = expected[b][(expected[b, :, 5:] >= scorethresh).any(axis=1)]
+    assert counts[b] == len(rows)
+    assert np.array_equal(boxes[b, :counts[b]], rows)
+    assert np.all(boxes[b, counts[b]:, 5:] == -np.inf)
+
+  # NMS sees the same candidates in the same order
+  assert yolo_utils.apply_nms_batch(boxes, CLASSES, scorethresh, 0.45) == \
+    yolo_utils.apply_nms_batch(expected, CLASSES, scorethresh, 0.45)
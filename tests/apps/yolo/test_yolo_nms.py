@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+import os, sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, "%s/../../../apps/yolo" % os.path.dirname(os.path.realpath(__file__)))
+import yolo_utils
+
+def _loop_nms(boxes, classes, scorethresh, overlap_threshold):
+  # the original per-box implementation
+  result_boxes = []
+  box_len = boxes.shape[0]
+  for k in range(classes):
+    key_box_class = sorted([(i, boxes[i, 5+k]) for i in range(box_len)], key=lambda v: v[1], reverse=True)
+    exist_box = np.ones(box_len)
+    for i in range(box_len):
+      box_id = key_box_class[i][0]
+      if exist_box[box_id] == 0:
+        continue
+      if boxes[box_id, 5+k] < scorethresh:
+        exist_box[box_id] = 0
+        continue
+      result_boxes.append([boxes[box_id, 0], boxes[box_id, 1], boxes[box_id, 2], boxes[box_id, 3], k, boxes[box_id, 5+k]])
+      for j in range(i+1, box_len):
+        box_id_compare = key_box_class[j][0]
+        if exist_box[box_id_compare] == 0:
+          continue
+        if yolo_utils.cal_iou(boxes[box_id_compare, :], boxes[box_id, :]) >= overlap_threshold:
+          exist_box[box_id_compare] = 0
+  return result_boxes
+
+def _fixture(rs, num_boxes, classes):
+  boxes = np.empty((num_boxes, 5 + classes))
+  boxes[:, :2] = rs.uniform(0, 1, (num_boxes, 2))
+  boxes[:, 2:4] = rs.uniform(0.01, 0.4, (num_boxes, 2))
+  boxes[:, 4] = rs.uniform(0, 1, num_boxes)
+  # quantized scores give plenty of ties
+  boxes[:, 5:] = np.round(rs.uniform(0, 1, (num_boxes, classes)), 1)
+  # exact duplicates and touching boxes
+  boxes[1] = boxes[0]
+  boxes[3, :4] = boxes[2, :4]
+  boxes[3, 0] += boxes[2, 2]
+  return boxes
+
+@pytest.mark.parametrize("scorethresh,overlap_threshold", [(0.3, 0.45), (0., 0.), (0.5, 0.9), (0.05, 0.3)])
+def test_apply_nms_matches_loop(scorethresh, overlap_threshold):
+  rs = np.random.RandomState(1)
+  for trial in range(5):
+    boxes = _fixture(rs, 60, 4)
+    expected = _loop_nms(boxes, 4, scorethresh, overlap_threshold)
+    got = yolo_utils.apply_nms(boxes, 4, scorethresh, overlap_threshold)
+    assert got == expected
+    assert all(type(det[4]) is int for det in got)
+
+def test_apply_nms_batch():
+  rs = np.random.RandomState(2)
+  batch = np.stack([_fixture(rs, 40, 3) for b in range(3)])
+  batch[1, :, 5:] = 0
+  got = yolo_utils.apply_nms_batch(batch, 3, 0.2, 0.45)
+  assert got == [_loop_nms(boxes, 3, 0.2, 0.45) for boxes in batch]
+  assert got[1] == []
+
+def test_batched_nms_modes():
+  boxes = np.array([[0.5, 0.5, 0.2, 0.2],
+                    [0.51, 0.5, 0.2, 0.2],
+                    [0.9, 0.9, 0.1, 0.1]])
+  scores = np.array([[0.9, 0.0],
+                     [0.0, 0.8],
+                     [0.7, 0.0]])
+  idx, cls = yolo_utils.batched_nms(boxes, scores, 0.5, scorethresh=0.1)
+  assert idx.tolist() == [0, 2, 1] and cls.tolist() == [0, 0, 1]
+
+  # box 1 overlaps box 0 across classes
+  idx, cls = yolo_utils.batched_nms(boxes, scores, 0.5, scorethresh=0.1, per_class=False)
+  assert idx.tolist() == [0, 2] and cls.tolist() == [0, 0]
+
+  # only the two best candidates are considered
+  idx, cls = yolo_utils.batched_nms(boxes, scores, 0.5, scorethresh=0.1, top_k=2)
+  assert idx.tolist() == [0, 1] and cls.tolist() == [0, 1]
+
+  idx, cls = yolo_utils.batched_nms(boxes, scores, 0.5, scorethresh=0.75)
+  assert idx.tolist() == [0, 1]
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+# Needs apps/yolo/nms built: make -C apps/yolo/nms
+import ctypes
+import os, sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, "%s/../../../apps/yolo/nms" % os.path.dirname(os.path.realpath(__file__)))
+try:
+  import nms
+except OSError:
+  pytestmark = pytest.mark.skip(reason="libnms.so not built")
+
+OUT = 13
+PLANES = 5
+CLASSES = 20
+NET = OUT * 32
+SHAPES = [(480, 640, 3), (375, 500, 3), (416, 416, 3)]
+
+def _marshalled_nms(conv_out, im_w, im_h):
+  # the per-element ctypes copy and heap result of the original binding
+  numbb = ctypes.c_int()
+  bboxes_p = ctypes.c_void_p()
+  nms.lib.do_nms.argtypes = [ctypes.c_float*len(conv_out)] + [ctypes.c_int]*9 + \
+    [ctypes.c_float, ctypes.c_float, ctypes.c_void_p, ctypes.c_void_p]
+  nms.lib.do_nms((ctypes.c_float * len(conv_out))(*conv_out), len(conv_out), im_w, im_h, NET, NET,
+                 OUT, OUT, PLANES, CLASSES, 0.24, 0.3, ctypes.byref(numbb), ctypes.byref(bboxes_p))
+  bboxes = ctypes.cast(bboxes_p, ctypes.POINTER(nms.BBOX * numbb.value))
+  result = [(b.classid, b.prob, b.xlo, b.xhi, b.ylo, b.yhi) for b in bboxes.contents]
+  nms.lib.free_bboxes(bboxes_p)
+  return result
+
+def _activated_outputs(seed):
+  # sigmoid/softmax activated, as the binding expects
+  rs = np.random.RandomState(seed)
+  out = rs.randn(len(SHAPES), PLANES, 5 + CLASSES, OUT, OUT).astype(np.float32)
+  out[:, :, 4] -= 2
+  out[:, :, [0, 1, 4]] = 1 / (1 + np.exp(-out[:, :, [0, 1, 4]]))
+  cls = np.exp(out[:, :, 5:] * 3)
+  out[:, :, 5:] = cls / cls.sum(axis=2, keepdims=True)
+  return out.reshape(len(SHAPES), -1)
+
+def test_batch_matches_marshalled_binding():
+  conv_out = _activated_outputs(0)
+  counts, boxes = nms.do_baseline_nms_batch(conv_out, SHAPES, NET, NET, OUT, OUT, PLANES, CLASSES, 0.24, 0.3)
+  assert counts.sum() > 0
+  for b, shape in enumerate(SHAPES):
+    expected = _marshalled_nms(conv_out[b].tolist(), shape[1], shape[0])
+    assert boxes[b, :counts[b]].tolist() == expected
+
+def test_preallocated_output_reused():
+  out = nms.alloc_nms_output(len(SHAPES), OUT, OUT, PLANES)
+  first = nms.do_baseline_nms_batch(_activated_outputs(1), SHAPES, NET, NET, OUT, OUT, PLANES, CLASSES, 0.24, 0.3, out=out)
+  assert first[0] is out[0] and first[1] is out[1]
+
+  conv_out = _activated_outputs(2)
+  counts, boxes = nms.do_baseline_nms_batch(conv_out, SHAPES, NET, NET, OUT, OUT, PLANES, CLASSES, 0.24, 0.3, out=out)
+  fresh_counts, fresh_boxes = nms.do_baseline_nms_batch(conv_out, SHAPES, NET, NET, OUT, OUT, PLANES, CLASSES, 0.24, 0.3)
+  assert counts.tolist() == fresh_counts.tolist()
+  for b in range(len(SHAPES)):
+    assert boxes[b, :counts[b]].tolist() == fresh_boxes[b, :counts[b]].tolist()
+
+def test_single_image_binding():
+  conv_out = _activated_outputs(3)
+  bboxes = nms.do_baseline_nms(conv_out[1], SHAPES[1][1], SHAPES[1][0], NET, NET, OUT, OUT, PLANES, CLASSES, 0.24, 0.3)
+  expected = _marshalled_nms(conv_out[1].tolist(), SHAPES[1][1], SHAPES[1][0])
+  assert [(b['classid'], b['prob'], b['ll']['x'], b['ur']['x'], b['ll']['y'], b['ur']['y']) for b in bboxes] == \
+    [(c, pytest.approx(p), xlo, xhi, ylo, yhi) for c, p, xlo, xhi, ylo, yhi in expected]
+
+  with pytest.raises(ValueError):
+    nms.do_baseline_nms(conv_out[1, :100], SHAPES[1][1], SHAPES[1][0], NET, NET, OUT, OUT, PLANES, CLASSES, 0.24, 0.3)
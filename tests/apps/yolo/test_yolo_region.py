@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+import os, sys
+
+import numpy as np
+import pytest
+
+yoloPath = "%s/../../../apps/yolo" % os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, yoloPath)
+sys.path.insert(0, yoloPath + "/nms")
+import yolo_utils
+
+try:
+  import nms
+except OSError:
+  nms = None
+
+ANCHORS = 5
+SHAPES = [(480, 640, 3), (500, 375, 3)]
+
+def _loop_region_nms(out, classes, net, scorethresh, iouthresh):
+  # the original per-element activations, then the C region NMS
+  batch, _, out_h, out_w = out.shape
+  groups = out_h * out_w
+  batchstride = groups * (classes + 5)
+  flat = out.flatten()
+  bboxlist_for_images = []
+  for i in range(batch):
+    softmaxout = flat[i*out[0].size:(i+1)*out[0].size]
+    for b in range(ANCHORS):
+      for r in range(batchstride*b, batchstride*b + 2*groups):
+        softmaxout[r] = yolo_utils.sigmoid(softmaxout[r])
+      for r in range(batchstride*b + 4*groups, batchstride*b + 5*groups):
+        softmaxout[r] = yolo_utils.sigmoid(softmaxout[r])
+    for b in range(ANCHORS):
+      for g in range(groups):
+        yolo_utils.softmax(5*groups + b*batchstride + g, softmaxout, softmaxout, classes, groups)
+    bboxlist_for_images.append(nms.do_baseline_nms(softmaxout, SHAPES[i][1], SHAPES[i][0], net, net,
+                                                   out_w, out_h, ANCHORS, classes, scorethresh, iouthresh))
+  return bboxlist_for_images
+
+@pytest.mark.skipif(nms is None, reason="libnms.so not built")
+@pytest.mark.parametrize("classes,size,seed", [(20, 13, 0), (80, 13, 1)])
+def test_region_detections_match_c_nms(classes, size, seed):
+  rs = np.random.RandomState(seed)
+  out = rs.randn(len(SHAPES), ANCHORS*(5+classes), size, size).astype(np.float32) * 2
+  out[:, 4::5+classes] -= 3
+  net = size * 32
+
+  expected = _loop_region_nms(out.copy(), classes, net, 0.24, 0.3)
+  boxes, num_boxes = yolo_utils.decode_region_layer(out, classes, ANCHORS, 0.24)
+  got = yolo_utils.region_detections(boxes, num_boxes, SHAPES, net, net, 0.24, 0.3)
+
+  assert [len(b) for b in got] == [len(b) for b in expected]
+  assert sum(len(b) for b in got) > 0
+  for bboxes, expected_bboxes in zip(got, expected):
+    for bbox, expected_bbox in zip(bboxes, expected_bboxes):
+      assert bbox['classid'] == expected_bbox['classid']
+      assert bbox['prob'] == pytest.approx(expected_bbox['prob'], abs=1e-5)
+      assert (bbox['ll'], bbox['ur']) == (expected_bbox['ll'], expected_bbox['ur'])
+
+def test_decode_region_layer():
+  classes = 3
+  out = np.full((1, ANCHORS*(5+classes), 2, 2), -10., dtype=np.float32)
+  view = out.reshape(1, ANCHORS, 5+classes, 2, 2)
+  # one confident box: anchor 1, cell row 1, column 0
+  view[0, 1, :, 1, 0] = [0., 0., 0., 0., 10., 0., 5., 0.]
+
+  boxes, num_boxes = yolo_utils.decode_region_layer(out, classes, ANCHORS, 0.5)
+  assert num_boxes.tolist() == [1]
+  x, y, w, h, obj = boxes[0, 0, :5]
+  assert (x, y) == pytest.approx((0.25, 0.75))
+  assert (w, h) == pytest.approx((yolo_utils.YOLOV2_BIASES[2] / 2, yolo_utils.YOLOV2_BIASES[3] / 2))
+  assert boxes[0, 0, 5:].argmax() == 1
+  assert boxes[0, 0, 5:].max() == pytest.approx(obj / (1 + 2*np.exp(-5.)))
+  # the layer is left as it was
+  assert view[0, 1, 4, 1, 0] == 10.
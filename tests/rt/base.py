@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+import json
+import os
+import subprocess
+
+_stubPath = "%s/stub" % os.path.dirname(os.path.realpath(__file__))
+
+def build_stub(monkeypatch=None):
+  """
+  Builds the stand-in libxfdnn from stub/ and points LIBXDNN_PATH at it.
+
+  :param monkeypatch: pytest fixture to set LIBXDNN_PATH for the test only; without it the setting is process-wide.
+  """
+  libFile = "%s/libxfdnn_stub.so" % _stubPath
+  if not os.path.isfile(libFile):
+    subprocess.check_call(["make", "-C", _stubPath])
+  if monkeypatch is None:
+    os.environ["LIBXDNN_PATH"] = libFile
+  else:
+    monkeypatch.setenv("LIBXDNN_PATH", libFile)
+  return libFile
+
+def write_netcfg(path, inputs, outputs):
+  """
+  Writes the subset of a compiler JSON that CompilerJsonParser reads.
+
+  :param inputs: dict of input name -> shape (batch first)
+  :param outputs: dict of output name -> shape (batch first)
+  """
+  obj = {"inputs": [], "outputs": [], "network": []}
+  for name, shape in inputs.items():
+    obj["inputs"].append({"input_name": name})
+    obj["network"].append({"name": name, "outputshapes": list(shape)})
+  for name, shape in outputs.items():
+    obj["outputs"].append({"output_name": name, "previous_tensors": [name]})
+    obj["network"].append({"name": name, "outputshapes": list(shape)})
+
+  with open(path, "w") as f:
+    json.dump(obj, f)
+  return path
+
+def make_args(netcfg, batch_sz):
+  return {
+    'weights': 'unused.h5',
+    'netcfg': netcfg,
+    'quantizecfg': netcfg,
+    'scaleB': 30,
+    'PE': -1,
+    'batch_sz': batch_sz,
+  }
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+# Micro-benchmark of host-side dispatch overhead for XDNNFPGAOp.execute
+# versus a prebound XDNNExecPlan, measured against the stub libxfdnn
+# (see stub/) so the numbers exclude any FPGA time.
+#
+#   python benchmark_exec_plan.py --batch_sz 16 --iters 20000
+#
+from __future__ import print_function
+
+import argparse
+import os
+import tempfile
+import timeit
+
+from base import build_stub, write_netcfg, make_args
+
+build_stub()
+from xfdnn.rt import xdnn
+
+def main():
+  parser = argparse.ArgumentParser(description='XDNNExecPlan micro-benchmark')
+  parser.add_argument('--batch_sz', type=int, default=16)
+  parser.add_argument('--num_inputs', type=int, default=1)
+  parser.add_argument('--iters', type=int, default=20000)
+  args = parser.parse_args()
+
+  tmpdir = tempfile.mkdtemp()
+  inputs = dict(("data%d" % i, (1, 3, 224, 224)) for i in range(args.num_inputs))
+  netcfg = write_netcfg(os.path.join(tmpdir, "net.json"), inputs, {"out": (1, 1024, 1, 1)})
+  fpgaRT = xdnn.XDNNFPGAOp([None], make_args(netcfg, args.batch_sz))
+  fpgaInput = fpgaRT.getInputs()
+  fpgaOutput = fpgaRT.getOutputs()
+  plan = fpgaRT.makeExecPlan(fpgaInput, fpgaOutput)
+
+  tExec = timeit.timeit(lambda: fpgaRT.execute(fpgaInput, fpgaOutput), number=args.iters)
+  tPlan = timeit.timeit(plan.execute, number=args.iters)
+
+  usExec = tExec / args.iters * 1e6
+  usPlan = tPlan / args.iters * 1e6
+  print("batch_sz=%d inputs=%d iters=%d" % (args.batch_sz, args.num_inputs, args.iters))
+  print("XDNNFPGAOp.execute   : %8.2f us/call" % usExec)
+  print("XDNNExecPlan.execute : %8.2f us/call" % usPlan)
+  print("speedup              : %8.1fx" % (usExec / usPlan))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+# Cold import time of the runtime modules, each measured in a fresh
+# interpreter. Exits non-zero when a module exceeds --max_ms or drags in a
+# framework/library it should only load on first use.
+#
+#   python benchmark_import.py --runs 5 --max_ms 500
+#
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+MODULES = [
+  "xfdnn.rt.xdnn",
+  "xfdnn.rt.xdnn_io",
+  "xfdnn.rt.xdnn_rt_tf",
+  "xfdnn.rt.xdnn_rt_caffe",
+]
+
+# must not be imported (or, for xdnn, the library loaded) at import time
+DEFERRED = ["tensorflow", "caffe", "h5py", "pydot"]
+
+_probe = """
+import json, sys, time
+t = time.time()
+import %s
+elapsed = time.time() - t
+from xfdnn.rt import xdnn
+print(json.dumps({
+  "ms": elapsed * 1000.,
+  "loaded": sorted(m for m in %r if m in sys.modules),
+  "manager": xdnn._xdnnManager is not None,
+}))
+"""
+
+_repoRoot = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+def probe(module):
+  env = dict(os.environ)
+  env["PYTHONPATH"] = os.pathsep.join(
+    [_repoRoot] + [p for p in [env.get("PYTHONPATH")] if p])
+  out = subprocess.check_output([sys.executable, "-c", _probe % (module, DEFERRED)], env=env)
+  return json.loads(out.decode("utf-8").strip().splitlines()[-1])
+
+def main():
+  parser = argparse.ArgumentParser(description='Runtime cold import benchmark')
+  parser.add_argument('--runs', type=int, default=5)
+  parser.add_argument('--max_ms', type=float, default=None,
+                      help='fail if the median import time of any module exceeds this')
+  args = parser.parse_args()
+
+  failed = False
+  for module in MODULES:
+    results = [probe(module) for i in range(args.runs)]
+    ms = sorted(r["ms"] for r in results)[len(results) // 2]
+    loaded = results[0]["loaded"]
+    manager = results[0]["manager"]
+    print("%-24s %8.1f ms  deferred modules loaded: %s  manager created: %s" \
+      % (module, ms, loaded or "none", manager))
+    if loaded or manager or (args.max_ms is not None and ms > args.max_ms):
+      failed = True
+
+  sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+  main()
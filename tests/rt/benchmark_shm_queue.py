@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+# Throughput of the shared-memory slot transports with N producer processes
+# feeding one consumer, as preprocessing workers feed fpga_process in
+# mp_classify. Producers only stamp their slot, so the numbers are the
+# per-image transport overhead.
+#
+#   python benchmark_shm_queue.py --items 20000 --producers 1 2 4 8 16
+#
+from __future__ import print_function
+
+import argparse
+import multiprocessing as mp
+import time
+
+from xfdnn.rt.xdnn_shm import SharedMemoryQueue, SharedMemoryRing
+
+def produce(q, count):
+  for i in range(count):
+    slot = q.openWriteId()
+    q.accessNumpyBuffer(slot)[0][0] = i
+    q.closeWriteId(slot)
+
+def consume(q, total):
+  for _ in range(total):
+    slot = q.openReadId()
+    q.accessNumpyBuffer(slot)[0][0]
+    q.closeReadId(slot)
+
+def measure(cls, numProducers, items, slots, shape):
+  q = cls("bench", slots, [shape])
+  perProducer = items // numProducers
+  procs = [mp.Process(target=produce, args=(q, perProducer)) for _ in range(numProducers)]
+  start = time.time()
+  for p in procs:
+    p.start()
+  consume(q, perProducer * numProducers)
+  elapsed = time.time() - start
+  for p in procs:
+    p.join()
+  return perProducer * numProducers / elapsed
+
+def main():
+  parser = argparse.ArgumentParser(description='SharedMemoryQueue vs SharedMemoryRing throughput')
+  parser.add_argument('--items', type=int, default=20000)
+  parser.add_argument('--slots', type=int, default=64)
+  parser.add_argument('--shape', type=int, nargs='+', default=[4])
+  parser.add_argument('--producers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+  args = parser.parse_args()
+
+  print("items=%d slots=%d shape=%s" % (args.items, args.slots, tuple(args.shape)))
+  print("%9s %14s %14s %8s" % ("producers", "queue img/s", "ring img/s", "speedup"))
+  for n in args.producers:
+    rateQueue = measure(SharedMemoryQueue, n, args.items, args.slots, tuple(args.shape))
+    rateRing = measure(SharedMemoryRing, n, args.items, args.slots, tuple(args.shape))
+    print("%9d %14.0f %14.0f %7.1fx" % (n, rateQueue, rateRing, rateRing / rateQueue))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,67 @@
+/*
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+*/
+
+/*
+ * Minimal stand-in for libxfdnn.so exposing the symbols XDNNFPGAOp binds.
+ * XDNNExecute_2D_float touches every bound input row and writes
+ * out[o][b*outSz[o]] = in[0][b][0] + o so callers can check pointer wiring,
+ * but otherwise does no work; it is meant for measuring host-side overhead.
+ */
+
+#include <stdbool.h>
+#include <stdlib.h>
+
+static int g_executor;
+
+int XDNNV3ComputeWeightsBiasQuantSize() { return 0; }
+int XDNNComputeWeightsBiasQuantSize() { return 0; }
+int XDNNMakeWeightsBiasQuantBlob() { return 0; }
+
+void *XDNNMakeScriptExecutor() { return &g_executor; }
+void *XDNNMakeScriptExecutorAndLoadWeights() { return &g_executor; }
+void *XDNNMakeScriptExecutorAndLoadWeightsFromMem() { return &g_executor; }
+
+void XDNNExecute_2D_float(void *executor,
+                          float ***in, char **inNames, unsigned numIn,
+                          float **out, unsigned *outSz, char **outNames,
+                          unsigned numOut, unsigned bsz,
+                          int streamId, bool blocking) {
+  unsigned i, o, b;
+  float acc = 0.f;
+  for (i = 0; i < numIn; ++i)
+    for (b = 0; b < bsz; ++b)
+      acc += in[i][b][0];
+  (void)acc;
+
+  for (o = 0; o < numOut; ++o)
+    for (b = 0; b < bsz; ++b)
+      out[o][b * outSz[o]] = in[0][b][0] + (float)o;
+}
+
+int XDNNWaitForResults(void *executor, int streamId) { return 0; }
+
+float XDNNReadHardwareCounter(void *executor, int devIdx, int cuIdx) { return 0.f; }
+
+void XDNNQuantizeAvgPool() {}
+void XDNNQuantizeTensor() {}
+void XDNNUnQuantizeTensor() {}
+void XDNNV3QuantizeInterLayer() {}
+void XDNNQuantizeInterLayer() {}
+int XDNNQuantizeBias() { return 0; }
+int XDNNV3QuantizeBias() { return 0; }
+void XDNNQuantizeWeights() {}
+void computeFC() {}
+void computeSoftmax() {}
+char *XDNNGetHostDeviceName(char *name) { return "stub"; }
+
+int xblasCreate(void **handle, char *xclbin, char *kernel, int deviceIdx) {
+  *handle = &g_executor;
+  return 0;
+}
+
+void xblasDestroy(void *handle) {}
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+import numpy as np
+import pytest
+
+from xfdnn.rt import xdnn, xdnn_io
+
+BSZ, K, N = 8, 64, 100
+
+@pytest.fixture
+def fc():
+  rng = np.random.RandomState(0)
+  weight = rng.randn(N * K).astype(np.float32)
+  bias = rng.randn(N).astype(np.float32)
+  data = (rng.randn(BSZ, K, 1, 1) * 4).astype(np.float32)
+  return weight, bias, data
+
+def _reference(weight, bias, data):
+  fc = data.reshape(BSZ, K).astype(np.float64).dot(weight.reshape(N, K).T) + bias
+  e = np.exp(fc - fc.max(axis=1, keepdims=True))
+  return e / e.sum(axis=1, keepdims=True)
+
+def test_forward_matches_reference(fc):
+  weight, bias, data = fc
+  head = xdnn_io.ClassificationHead(weight, bias)
+  probs = head.forward(data)
+  np.testing.assert_allclose(probs, _reference(*fc), rtol=1e-4, atol=1e-6)
+
+  # partial batch reuses the grown buffer
+  assert head.forward(data, num=3).shape == (3, N)
+
+def test_softmax_is_stable():
+  head = xdnn_io.ClassificationHead(np.eye(4, dtype=np.float32).flatten(),
+    np.zeros(4, dtype=np.float32))
+  probs = head.forward(np.array([[1000., 0., -1000., 999.]], dtype=np.float32))
+  assert np.isfinite(probs).all()
+  np.testing.assert_allclose(probs.sum(axis=1), 1., rtol=1e-6)
+
+def test_topk_matches_argsort(fc):
+  probs = _reference(*fc)
+  topKIdx, topKVals = xdnn_io.getTopKBatch(probs, 5)
+  for i in range(BSZ):
+    expected = xdnn_io.getTopK(probs[i], range(N), 5)
+    assert [label for _, label in expected] == list(topKIdx[i])
+    np.testing.assert_allclose([v for v, _ in expected], topKVals[i])
+
+  head = xdnn_io.ClassificationHead(*fc[:2])
+  idx, vals = head.run(fc[2], topK=5)
+  np.testing.assert_array_equal(idx, topKIdx)
+
+def test_get_classification_format(fc):
+  probs = _reference(*fc).astype(np.float32)
+  labels = ["class%d" % i for i in range(N)]
+  paths = ["img%d.jpg" % i for i in range(BSZ)]
+  text = xdnn_io.getClassification(probs, paths, labels, 2)
+  lines = text.splitlines()
+  assert lines[0] == "---------- Prediction 1/%d for img0.jpg ----------" % BSZ
+  best = probs[0].argmax()
+  assert lines[1] == "%.4f \"%s\"" % (probs[0, best], labels[best])
+  assert len(lines) == BSZ * 3
+
+def test_manager_softmax_single_call(monkeypatch):
+  monkeypatch.setenv("LIBXDNN_PATH", "sim")
+  xdnn.createManager("sim")
+  data = np.random.rand(4, 10).astype(np.float32)
+  expected = np.exp(data) / np.exp(data).sum(axis=1, keepdims=True)
+  np.testing.assert_allclose(xdnn.computeSoftmax(data.copy()), expected, rtol=1e-5)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+import json
+import os
+import time
+
+import pytest
+
+from base import write_netcfg
+
+from xfdnn.rt import xdnn
+
+@pytest.fixture
+def netcfg(tmpdir):
+  return write_netcfg(str(tmpdir.join("net.json")),
+    {"data": (1, 3, 224, 224)}, {"prob": (1, 1000, 1, 1), "box": (1, 4, 7, 7)})
+
+@pytest.fixture
+def jsonLoads(monkeypatch):
+  calls = []
+  load = json.load
+  def _counting(f, *args, **kwargs):
+    calls.append(f.name)
+    return load(f, *args, **kwargs)
+  monkeypatch.setattr(xdnn.json, "load", _counting)
+  xdnn._compilerJsonCache.clear()
+  return calls
+
+def test_digest_matches_json(netcfg, jsonLoads):
+  parser = xdnn.CompilerJsonParser(netcfg)
+  assert parser.getInputs() == {"data": [1, 3, 224, 224]}
+  assert parser.getOutputs() == {"prob": [1, 1000, 1, 1], "box": [1, 4, 7, 7]}
+  assert sorted(parser.getLayerNames()) == ["box", "data", "prob"]
+  assert os.path.isfile(netcfg + ".digest")
+  assert parser.getJson()["network"][0]["name"] == "data"
+
+def test_warm_start_skips_json(netcfg, jsonLoads):
+  xdnn.CompilerJsonParser(netcfg)
+  assert len(jsonLoads) == 1
+
+  # in-process hit
+  xdnn.CompilerJsonParser(netcfg)
+  assert len(jsonLoads) == 1
+
+  # sidecar hit, as in a freshly started process
+  xdnn._compilerJsonCache.clear()
+  parser = xdnn.CompilerJsonParser(netcfg)
+  assert len(jsonLoads) == 1
+  assert parser.getOutputs()["prob"] == [1, 1000, 1, 1]
+
+def test_stale_cache_reparses(netcfg, jsonLoads):
+  xdnn.CompilerJsonParser(netcfg)
+  write_netcfg(netcfg, {"data": (1, 3, 416, 416)}, {"prob": (1, 10, 1, 1)})
+  st = os.stat(netcfg)
+  os.utime(netcfg, (st.st_atime, st.st_mtime + 10))
+
+  parser = xdnn.CompilerJsonParser(netcfg)
+  assert len(jsonLoads) == 2
+  assert parser.getInputs() == {"data": [1, 3, 416, 416]}
+
+def test_callers_edits_stay_local(netcfg, jsonLoads):
+  parser = xdnn.CompilerJsonParser(netcfg)
+  parser.getInputs()["data"][0] = 8
+  assert xdnn.CompilerJsonParser(netcfg).getInputs()["data"][0] == 1
+
+def test_sidecar_is_plain_json(netcfg, jsonLoads):
+  xdnn.CompilerJsonParser(netcfg)
+  with open(netcfg + ".digest") as f:
+    sidecar = json.load(f)
+  assert sidecar["digest"]["inputs"] == [["data", [1, 3, 224, 224]]]
+
+  # anything else in its place is ignored, never loaded as code
+  with open(netcfg + ".digest", "wb") as f:
+    f.write(b"cos\nsystem\n(S'false'\ntR.")
+  xdnn._compilerJsonCache.clear()
+  del jsonLoads[:]
+  assert xdnn.CompilerJsonParser(netcfg).getOutputs()["prob"] == [1, 1000, 1, 1]
+  assert jsonLoads == [netcfg]
+
+def test_user_cache_dir_must_be_private(tmpdir):
+  private = str(tmpdir.join("private"))
+  assert xdnn._privateCacheDir(private) == private
+  assert os.stat(private).st_mode & 0o777 == 0o700
+
+  shared = tmpdir.mkdir("shared")
+  shared.chmod(0o777)
+  assert xdnn._privateCacheDir(str(shared)) is None
+
+  link = tmpdir.join("link")
+  link.mksymlinkto(private)
+  assert xdnn._privateCacheDir(str(link)) is None
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+import os
+
+import pytest
+
+from benchmark_import import MODULES, probe
+
+from xfdnn.rt import xdnn
+
+@pytest.mark.parametrize("module", MODULES)
+def test_import_is_side_effect_free(module, monkeypatch):
+  # a bogus library path would have printed an error at import before
+  monkeypatch.setenv("LIBXDNN_PATH", "/nonexistent/libxfdnn.so")
+  res = probe(module)
+  assert res["loaded"] == []
+  assert not res["manager"]
+
+def test_manager_created_on_first_use(monkeypatch):
+  monkeypatch.setenv("LIBXDNN_PATH", "sim")
+  monkeypatch.setattr(xdnn, "_xdnnManager", None)
+  for name in xdnn._managerFunctionNames:
+    monkeypatch.setattr(xdnn, name, xdnn._lazyManagerFunction(name))
+
+  ret, handles = xdnn.createHandle("unused.xclbin")
+  assert ret == 0 and len(handles) == 1
+  assert xdnn._xdnnManager is not None
+  # later calls go straight to the manager
+  assert xdnn.createHandle.__self__ is xdnn._xdnnManager
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, "%s/../../examples/deployment_modes" % os.path.dirname(os.path.realpath(__file__)))
+import mp_classify
+
+from xfdnn.rt.xdnn_shm import SharedMemoryRing
+
+BATCH = 4
+
+class _Publisher:
+  def __init__(self):
+    self.published = []
+
+  def publish(self, kind, msg):
+    self.published.append((kind, msg))
+
+class _Summary:
+  stats_list = None
+
+  @classmethod
+  def summarize(cls, args, stats_list):
+    cls.stats_list = stats_list
+
+@pytest.mark.parametrize("ordered", [False, True])
+def test_collect_post_order(ordered):
+  # batches dealt to two workers; the second one's arrive first
+  emitQ = mp.Queue()
+  for seq in [1, 3, 5]:
+    emitQ.put((seq, [('print', "batch %d" % seq)]))
+  emitQ.put((None, {'numProcessed': 3}))
+  for seq in [0, 2, 4]:
+    emitQ.put((seq, [('print', "batch %d" % seq), ('zmq', seq)]))
+  emitQ.put((None, {'numProcessed': 4}))
+
+  publisher = _Publisher()
+  mp_classify.collect_post({}, emitQ, 2, ordered, postClass=_Summary, publisher=publisher)
+
+  texts = [msg for kind, msg in publisher.published if kind == 'print']
+  if ordered:
+    assert texts == ["batch %d" % seq for seq in range(6)]
+  else:
+    assert texts == ["batch %d" % seq for seq in [1, 3, 5, 0, 2, 4]]
+  # messages of one batch stay together and in order
+  i = publisher.published.index(('print', "batch 2"))
+  assert publisher.published[i + 1] == ('zmq', 2)
+  assert sorted(s['numProcessed'] for s in _Summary.stats_list) == [3, 4]
+
+def test_collect_post_flushes_gaps():
+  # a batch that never reports (e.g. its worker died) does not hold back the rest
+  emitQ = mp.Queue()
+  for seq in [0, 2, 3]:
+    emitQ.put((seq, [('print', seq)]))
+  emitQ.put((None, {}))
+
+  publisher = _Publisher()
+  mp_classify.collect_post({}, emitQ, 1, True, postClass=_Summary, publisher=publisher)
+  assert [msg for kind, msg in publisher.published] == [0, 2, 3]
+
+def test_summarize_merges_stats(capsys):
+  args = {'golden': 'golden.txt'}
+  mp_classify.UserPostProcess.summarize(args, [
+    {'numProcessed': 30, 'startTime': 1., 'endTime': 3., 'top1Count': 15, 'top5Count': 27},
+    {'numProcessed': 10, 'startTime': 2., 'endTime': 5., 'top1Count': 5, 'top5Count': 9}])
+  out = capsys.readouterr()[0]
+  # 40 images over the 4s all workers together took
+  assert "10 images/s" in out
+  assert "Average accuracy (n=40) Top-1: 50.0%, Top-5: 90.0%" in out
+
+class _CheckingPost(mp_classify.UserPostProcess):
+  def run(self, imgList, fpgaOutput_list, fpgaOutputShape_list, shape_list):
+    # the slot is back in the ring before the batch is post-processed
+    self.batchesRun = getattr(self, 'batchesRun', 0) + 1
+    assert self._shared_output_arrs.numFree() == self.batchesRun
+    self.emit('print', (list(imgList), fpgaOutput_list[0][:len(imgList), 0].tolist()))
+
+def test_read_batch_releases_slot(monkeypatch):
+  monkeypatch.setattr(mp_classify.xdnn_io, "loadFCWeightsBias", lambda args: (None, None))
+  ring = SharedMemoryRing("output", 2, [(BATCH, 3), (BATCH, 5)], [np.float32, np.float64])
+  # a sequence number float32 could not hold
+  seqs = [2**40 + 1, 2**40 + 2]
+  for b, seq in enumerate(seqs):
+    slot = ring.openWriteId()
+    out, meta = ring.accessNumpyBuffer(slot)
+    out[:, 0] = np.arange(BATCH) + 10 * b
+    meta[:] = -1
+    rows = BATCH - b
+    meta[:rows, 0] = np.arange(rows) + b
+    meta[:, 4] = seq
+    ring.closeWriteId(slot)
+  ring.close()
+
+  emitQ = mp.Queue()
+  args = {'batch_sz': BATCH, 'benchmarkmode': False}
+  post = _CheckingPost(args, ["img%d" % i for i in range(8)], None, [(BATCH, 3)], ring, emitQ)
+  post.loop()
+
+  assert emitQ.get() == (seqs[0], [('print', (["img0", "img1", "img2", "img3"], [0., 1., 2., 3.]))])
+  assert emitQ.get() == (seqs[1], [('print', (["img1", "img2", "img3"], [10., 11., 12.]))])
+  seq, stats = emitQ.get()
+  assert seq is None and stats['numProcessed'] == 0
+
+class _SlowPre:
+  done = None
+
+  def __init__(self, args, img_paths, input_shapes, shared_trans_arrs):
+    self._imgpaths = img_paths
+
+  def run(self, inum, data=None):
+    time.sleep(data)
+    self.done.put((inum, os.getpid()))
+
+def test_resize_replaces_exiting_worker(monkeypatch):
+  monkeypatch.setattr(mp_classify, "g_preClass", _SlowPre)
+  monkeypatch.setattr(_SlowPre, "done", mp.Queue())
+  itemQ = mp.Queue()
+  workers = mp_classify.PreProcessWorkers(2, None, True, ({}, ["a", "b", "c", "d"], None, None), itemQ)
+  workers.resize(2)
+  itemQ.put((0, 0.5))
+  itemQ.put((1, 0.5))
+  time.sleep(0.2)
+
+  # shrink and grow back while worker 1 is still busy with its image
+  exiting = workers._procs[1]
+  workers.resize(1)
+  workers.resize(2)
+  assert exiting.is_alive()
+  assert workers._procs[1] is not exiting and workers._procs[1].is_alive()
+
+  exiting.join(5)
+  assert not exiting.is_alive()
+  pids = set(_SlowPre.done.get(timeout=5)[1] for i in range(2))
+  assert exiting.pid in pids
+
+  # two workers again, both taking images
+  itemQ.put((2, 0.5))
+  itemQ.put((3, 0.5))
+  done = [_SlowPre.done.get(timeout=5) for i in range(2)]
+  assert sorted(inum for inum, pid in done) == [2, 3]
+  assert set(pid for inum, pid in done) == set(proc.pid for proc in workers._procs)
+
+  itemQ.put(None)
+  itemQ.put(None)
+  workers.join()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+import multiprocessing as mp
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, "%s/../../examples/deployment_modes" % os.path.dirname(os.path.realpath(__file__)))
+import mp_classify
+import mp_multinet
+
+from xfdnn.rt.xdnn_shm import SharedMemoryRing
+
+class _RingPre(mp_classify.UserPreProcess):
+  """
+  UserPreProcess writing to a real ring, with a load that needs no image files.
+  """
+  loads = []
+
+  def __init__(self, args, img_paths, input_shapes, shared_trans_arrs):
+    self._args = args
+    self._firstInputShape = input_shapes[0]
+    self._shared_trans_arrs = shared_trans_arrs
+    self._imgpaths = img_paths
+
+  def load(self, img, write_arrs):
+    if self._args.get('fail'):
+      raise IOError("bad image")
+    self.loads.append(self._args['name'])
+    write_arrs[0][...] = np.random.rand(*write_arrs[0].shape)
+    return img.shape
+
+@pytest.fixture
+def nets(monkeypatch):
+  monkeypatch.setitem(mp_multinet.g_transforms, 'ring', (_RingPre, mp_classify.UserPostProcess, None))
+  monkeypatch.setattr(mp_multinet, "imread", lambda path: np.zeros((20, 30, 3), dtype=np.uint8))
+  del _RingPre.loads[:]
+
+  def _make(shapes, fail=()):
+    confs = []
+    rings = []
+    for i, shape in enumerate(shapes):
+      confs.append({'name': "net%d" % i, 'transform': 'ring', 'benchmarkmode': False, 'fail': i in fail,
+                    'img_raw_scale': 255., 'img_mean': [104., 117., 123.], 'img_input_scale': 1.})
+      rings.append(SharedMemoryRing("trans", 2, [shape, (4,)]))
+    pre = mp_multinet.MultiNetPreProcess(confs, ["a.jpg", "b.jpg"], [[s] for s in shapes], rings)
+    return pre, rings
+  return _make
+
+def _read(ring):
+  slot = ring.openReadId()
+  bufs = [arr.copy() for arr in ring.accessNumpyBuffer(slot)]
+  ring.closeReadId(slot)
+  return bufs
+
+def test_shared_spec_copies_tensor(nets):
+  pre, rings = nets([(1, 3, 4, 4), (1, 3, 4, 4), (1, 3, 8, 8)])
+  pre.run(1)
+
+  # one load per distinct spec
+  assert _RingPre.loads == ["net0", "net2"]
+  first, second, other = [_read(ring) for ring in rings]
+  for a, b in zip(first, second):
+    assert a.tobytes() == b.tobytes()
+  assert first[1].tolist() == [1, 20, 30, 3]
+  assert other[1].tolist() == [1, 20, 30, 3]
+  assert other[0].shape == (1, 3, 8, 8)
+
+def test_load_failure_aborts_every_slot(nets):
+  pre, rings = nets([(1, 3, 4, 4), (1, 3, 4, 4), (1, 3, 8, 8)], fail=(2,))
+  with pytest.raises(IOError):
+    pre.run(0)
+
+  # nothing published, every reserved slot is free again
+  for ring in rings:
+    assert ring.numReady() == 0
+    assert ring.numFree() == ring.numSlots()
+
+class _Publisher:
+  def __init__(self):
+    self.published = []
+
+  def publish(self, kind, msg):
+    self.published.append((kind, msg))
+
+def test_result_joiner_waits_for_every_net():
+  publisher = _Publisher()
+  joiner = mp_multinet.ResultJoiner(["cls", "det"], ["a.jpg", "b.jpg"], publisher)
+  cls = mp_multinet.NetPublisher("cls", joiner)
+  det = mp_multinet.NetPublisher("det", joiner)
+
+  cls.publish('result', (0, "cat"))
+  cls.publish('result', (1, "dog"))
+  det.publish('result', (1, "2 boxes"))
+  assert publisher.published == [('print', "image: b.jpg  cls: dog  det: 2 boxes")]
+
+  det.publish('zmq', "raw")
+  det.publish('result', (0, "no boxes"))
+  assert publisher.published[1:] == [('zmq', "raw"), ('print', "image: a.jpg  cls: cat  det: no boxes")]
+
+class _Summary:
+  @classmethod
+  def summarize(cls, args, stats_list):
+    print ( "%d workers" % len(stats_list) )
+
+def test_collect_post_header(capsys):
+  emitQ = mp.Queue()
+  emitQ.put((None, {}))
+  emitQ.put((None, {}))
+  mp_classify.collect_post({}, emitQ, 2, False, _Summary, _Publisher(), "det")
+  assert capsys.readouterr()[0] == "\n[det]\n2 workers\n"
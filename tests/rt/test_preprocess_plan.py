@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+import cv2
+import numpy as np
+import pytest
+
+from xfdnn.rt import xdnn_io
+
+_mean = np.zeros((224, 224, 3), dtype=np.float32) + [104., 117., 123.]
+
+_seqs = {
+  'classify': [('resize', (224, 224)), ('pxlscale', 1.), ('meansub', _mean),
+               ('pxlscale', 1.), ('chtranspose', (2, 0, 1))],
+  'mean_list': [('resize', (224, 224)), ('pxlscale', 1. / 255), ('meansub', [0.4, 0.5, 0.6]),
+                ('pxlscale', 2.), ('chtranspose', (2, 0, 1)), ('chswap', (2, 1, 0))],
+  'yolo': [('resize2maxdim', (416, 416)), ('pxlscale', 1. / 255), ('crop_letterbox', 0.5),
+           ('chtranspose', (2, 0, 1)), ('chswap', (2, 1, 0))],
+  'centercrop': [('resize2mindim', (256, 256)), ('crop_center', (224, 224)), ('pxlscale', 1.),
+                 ('meansub', [1., 2., 3.]), ('chtranspose', (2, 0, 1))],
+  'hwc': [('resize', (100, 80)), ('chswap', (2, 1, 0)), ('pxlscale', 0.5)],
+}
+
+@pytest.fixture
+def img():
+  return np.random.RandomState(0).randint(0, 256, (375, 500, 3)).astype(np.uint8)
+
+@pytest.mark.parametrize("name", sorted(_seqs.keys()))
+def test_plan_matches_script(img, name):
+  seq = _seqs[name]
+  ref, refShape = xdnn_io.loadImageBlobFromFileScriptBase(img.copy(), seq)
+  plan = xdnn_io.compilePreprocessPlan(seq)
+  assert plan.isFused()
+
+  got, shape = plan.run(img.copy())
+  assert shape == refShape
+  assert got.shape == ref.shape
+  assert np.allclose(got, ref, atol=1e-5)
+
+def test_plan_fallback(img):
+  # pixel ops before a resize cannot be folded
+  seq = [('pxlscale', 0.5), ('resize', (100, 80))]
+  plan = xdnn_io.compilePreprocessPlan(seq)
+  assert not plan.isFused()
+
+  ref, _ = xdnn_io.loadImageBlobFromFileScriptBase(img.copy(), seq)
+  got, _ = plan.run(img.copy())
+  assert np.allclose(got, ref)
+
+def test_plan_writes_into_out(img):
+  plan = xdnn_io.compilePreprocessPlan(_seqs['classify'])
+  out = np.zeros((1, 3, 224, 224), dtype=np.float32)
+  got, _ = plan.run(img, out)
+  assert np.shares_memory(got, out)
+
+  ref, _ = xdnn_io.loadImageBlobFromFileScriptBase(img.copy(), _seqs['classify'])
+  assert np.allclose(out[0], ref)
+
+  with pytest.raises(ValueError):
+    plan.run(img, np.zeros((3, 224, 224), dtype=np.float64))
+  with pytest.raises(ValueError):
+    plan.run(img, np.zeros((3, 224, 200), dtype=np.float32))
+
+def test_decode_scale():
+  plan = xdnn_io.compilePreprocessPlan(_seqs['classify'])
+  assert plan.decodeScale(4000, 3000) == pytest.approx(224. / 3000)
+  plan = xdnn_io.compilePreprocessPlan(_seqs['yolo'])
+  assert plan.decodeScale(4000, 3000) == pytest.approx(416. / 4000)
+  plan = xdnn_io.compilePreprocessPlan([('crop_center', (224, 224))])
+  assert plan.decodeScale(4000, 3000) == 1.
+
+def test_pick_scaling_factor():
+  from ext.PyTurboJPEG import pick_scaling_factor
+  factors = [(2, 1), (1, 1), (3, 4), (1, 2), (3, 8), (1, 4), (1, 8)]
+  assert pick_scaling_factor(factors, 0.05) == (1, 8)
+  assert pick_scaling_factor(factors, 0.3) == (3, 8)
+  assert pick_scaling_factor(factors, 0.5) == (1, 2)
+  assert pick_scaling_factor(factors, 0.9) is None
+
+def test_scaled_decode(tmpdir):
+  rng = np.random.RandomState(0)
+  big = cv2.resize(rng.randint(0, 256, (30, 40, 3)).astype(np.uint8), (1600, 1200))
+  jpg = str(tmpdir.join("big.jpg"))
+  png = str(tmpdir.join("big.png"))
+  cv2.imwrite(jpg, big)
+  cv2.imwrite(png, big)
+
+  for path in (jpg, png):
+    ref, _ = xdnn_io.loadYoloImageBlobFromFile(path, 416, 416)
+    got, shape = xdnn_io.loadYoloImageBlobFromFile(path, 416, 416, scaledDecode=True)
+    # boxes are mapped back using the full resolution shape
+    assert tuple(shape) == (1200, 1600, 3)
+    assert got.shape == ref.shape
+    assert np.abs(got - ref).mean() < 0.02
+
+@pytest.mark.parametrize("name", ['classify', 'yolo'])
+def test_run_raw_finish(img, name):
+  # uint8 slots: runRaw in the worker, finish in the FPGA process
+  plan = xdnn_io.compilePreprocessPlan(_seqs[name])
+  ref, refShape = plan.run(img.copy())
+
+  raw, shape, box = plan.runRaw(img.copy())
+  assert raw.dtype == np.uint8
+  assert shape == refShape
+  assert (box is not None) == (name == 'yolo')
+
+  out = np.full(ref.shape, np.nan, dtype=np.float32)
+  got = plan.finish(raw, out=out, box=box)
+  assert np.shares_memory(got, out)
+  assert np.array_equal(out, ref)
+
+def test_turbojpeg_load_failure_is_cached(tmpdir, monkeypatch, capsys):
+  import ext.PyTurboJPEG as turbojpeg
+  attempts = []
+  def _missing(path):
+    attempts.append(path)
+    raise OSError("libturbojpeg.so: cannot open shared object file")
+  monkeypatch.setattr(turbojpeg, "TurboJPEG", _missing)
+  monkeypatch.setattr(turbojpeg, "lib_jpeg_turbo", None)
+
+  jpg = str(tmpdir.join("img.jpg"))
+  cv2.imwrite(jpg, np.random.RandomState(0).randint(0, 256, (32, 48, 3)).astype(np.uint8))
+  ref = cv2.imread(jpg)
+  with open(jpg, 'rb') as f:
+    buf = f.read()
+  for i in range(3):
+    assert np.array_equal(turbojpeg.imread(jpg), ref)
+    assert np.array_equal(turbojpeg.imread_scaled(jpg, 0.5)[0], ref)
+    assert np.array_equal(turbojpeg.imdecode(buf), ref)
+
+  # one attempt and one warning, not one per image
+  assert len(attempts) == 1
+  assert capsys.readouterr()[0].count("TurboJPEG") == 1
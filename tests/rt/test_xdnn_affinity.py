@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+import ctypes
+import multiprocessing as mp
+import os
+import sys
+
+import pytest
+
+from xfdnn.rt import xdnn_affinity
+from xfdnn.rt.xdnn_affinity import Placement
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Linux only")
+
+def test_cpu_lists():
+  assert xdnn_affinity.parseCpuList("0-3,8,10-11\n") == [0, 1, 2, 3, 8, 10, 11]
+  assert xdnn_affinity.formatCpuList([8, 0, 1, 2, 11, 10]) == "0-2,8,10-11"
+  # xdnn_io.make_dict_args literal_evals "0" and "0,8"
+  assert xdnn_affinity.resolveCpus(0) == [0]
+  assert xdnn_affinity.resolveCpus((8, 0)) == [0, 8]
+
+def test_nodes_cover_allowed_cpus():
+  nodes = xdnn_affinity.numaNodes()
+  allowed = set(xdnn_affinity.getAffinity())
+  assert allowed <= set(c for cpus in nodes.values() for c in cpus)
+  assert xdnn_affinity.resolveCpus("node:%d" % min(nodes)) == nodes[min(nodes)]
+  with pytest.raises(ValueError):
+    xdnn_affinity.resolveCpus("node:%d" % (max(nodes) + 1))
+
+def _pinned(placement, q):
+  placement.apply('pre')
+  q.put(xdnn_affinity.procCpus(os.getpid()))
+
+def test_apply_in_child():
+  cpu = xdnn_affinity.getAffinity()[-1]
+  placement = Placement({'pre': str(cpu), 'post': None})
+  assert placement.cpus('post') is None
+  q = mp.Queue()
+  p = mp.Process(target=_pinned, args=(placement, q))
+  p.start()
+  assert q.get(timeout=10) == str(cpu)
+  p.join()
+
+def test_shm_scope_restores_affinity():
+  before = xdnn_affinity.getAffinity()
+  node = min(xdnn_affinity.numaNodes())
+  placement = Placement(shmNode=node)
+  with placement.shmScope():
+    assert set(xdnn_affinity.getAffinity()) <= set(xdnn_affinity.numaNodes()[node])
+    seg = mp.RawArray(ctypes.c_ubyte, 1 << 20)
+  assert xdnn_affinity.getAffinity() == before
+
+  nodes = xdnn_affinity.memoryNodes(ctypes.addressof(seg))
+  if nodes is not None:
+    assert set(nodes) == set([node])
+  lines = placement.report({'pre': [os.getpid()]}, {'trans': ctypes.addressof(seg)})
+  assert len(lines) == 2 and "requested node %d" % node in lines[1]
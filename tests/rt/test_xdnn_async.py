@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+import os
+import threading
+
+import pytest
+
+from base import write_netcfg, make_args
+
+from xfdnn.rt import xdnn
+from xfdnn.rt.xdnn_async import XDNNAsyncExecutor
+
+BSZ = 2
+
+@pytest.fixture
+def fpgaRT(tmpdir, monkeypatch):
+  monkeypatch.setenv("LIBXDNN_PATH", "sim:latency_ms=5")
+  xdnn.createManager(os.environ["LIBXDNN_PATH"])
+  netcfg = write_netcfg(str(tmpdir.join("net.json")),
+    {"data": (1, 3, 8, 8)}, {"out": (1, 10, 1, 1)})
+  ret, handles = xdnn.createHandle("unused.xclbin")
+  return xdnn.XDNNFPGAOp(handles, make_args(netcfg, BSZ))
+
+class _Recorder(object):
+  """
+  Wraps an XDNNFPGAOp to record stream usage.
+  """
+  def __init__(self, fpgaRT):
+    self._fpgaRT = fpgaRT
+    self.inFlight = set()
+    self.maxInFlight = 0
+    self.completed = []
+    self._lock = threading.Lock()
+
+  def exec_async(self, inputs, outputs, streamId):
+    with self._lock:
+      assert streamId not in self.inFlight
+      self.inFlight.add(streamId)
+      self.maxInFlight = max(self.maxInFlight, len(self.inFlight))
+    return self._fpgaRT.exec_async(inputs, outputs, streamId)
+
+  def get_result(self, streamId):
+    ret = self._fpgaRT.get_result(streamId)
+    with self._lock:
+      self.inFlight.remove(streamId)
+      self.completed.append(streamId)
+    return ret
+
+def test_submit_bounds_in_flight(fpgaRT):
+  rec = _Recorder(fpgaRT)
+  done = []
+  with XDNNAsyncExecutor(rec, maxInFlight=3) as executor:
+    futs = []
+    for i in range(10):
+      outputs = fpgaRT.getOutputs()
+      fut = executor.submit(fpgaRT.getInputs(), outputs)
+      fut.add_done_callback(lambda f, i=i: done.append(i))
+      futs.append((fut, outputs))
+    for fut, outputs in futs:
+      assert fut.result(timeout=5) is outputs
+
+  assert rec.maxInFlight == 3
+  assert done == list(range(10))
+  assert set(rec.completed) == set([0, 1, 2])
+
+class _Gated(_Recorder):
+  """
+  Holds completions until release is set, so saturation does not depend on timing.
+  """
+  def __init__(self, fpgaRT):
+    super(_Gated, self).__init__(fpgaRT)
+    self.release = threading.Event()
+
+  def get_result(self, streamId):
+    self.release.wait(5)
+    return super(_Gated, self).get_result(streamId)
+
+def test_try_submit_when_saturated(fpgaRT):
+  gated = _Gated(fpgaRT)
+  with XDNNAsyncExecutor(gated, maxInFlight=1) as executor:
+    fut = executor.trySubmit(fpgaRT.getInputs(), fpgaRT.getOutputs())
+    assert fut is not None
+    assert executor.trySubmit(fpgaRT.getInputs(), fpgaRT.getOutputs()) is None
+    assert executor.submit(fpgaRT.getInputs(), fpgaRT.getOutputs(), timeout=0.001) is None
+    gated.release.set()
+    fut.result(timeout=5)
+    assert executor.trySubmit(fpgaRT.getInputs(), fpgaRT.getOutputs()) is not None
+
+  with pytest.raises(RuntimeError):
+    executor.submit(fpgaRT.getInputs(), fpgaRT.getOutputs())
+
+def test_aio_submit(fpgaRT):
+  asyncio = pytest.importorskip("asyncio")
+  loop = asyncio.new_event_loop()
+  with XDNNAsyncExecutor(fpgaRT, maxInFlight=2) as executor:
+    outs = [fpgaRT.getOutputs() for i in range(6)]
+    futs = [executor.aioSubmit(fpgaRT.getInputs(), o, loop=loop) for o in outs]
+    assert executor.numInFlight() == 2
+    results = loop.run_until_complete(asyncio.gather(*futs))
+  loop.close()
+  assert all(r is o for r, o in zip(results, outs))
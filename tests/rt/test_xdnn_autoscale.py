@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+import pytest
+
+from xfdnn.rt.xdnn_autoscale import QueueDepthScaler
+
+def test_grows_when_consumer_starves():
+  scaler = QueueDepthScaler(1, 3, start=1, cooldown=0)
+  assert [scaler.update(0.) for i in range(4)] == [2, 3, 3, 3]
+
+def test_shrinks_when_consumer_is_bottleneck():
+  scaler = QueueDepthScaler(2, 4, start=4, cooldown=1)
+  # every change is followed by one sample of cooldown
+  assert [scaler.update(1.) for i in range(6)] == [4, 3, 3, 2, 2, 2]
+
+def test_holds_inside_band():
+  scaler = QueueDepthScaler(1, 4, start=2, cooldown=0)
+  for occupancy in (0.3, 0.5, 0.7, 0.4):
+    assert scaler.update(occupancy) == 2
+
+def test_smooths_spikes():
+  scaler = QueueDepthScaler(1, 4, start=2, alpha=0.2, cooldown=0)
+  scaler.update(0.5)
+  # a single full sample does not cross high
+  assert scaler.update(1.) == 2
+
+def test_bounds():
+  assert QueueDepthScaler(2, 4, start=8).numWorkers == 4
+  with pytest.raises(ValueError):
+    QueueDepthScaler(3, 2)
+  with pytest.raises(ValueError):
+    QueueDepthScaler(1, 2, low=0.8, high=0.5)
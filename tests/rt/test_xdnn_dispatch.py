@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+import os
+
+import pytest
+
+from base import write_netcfg, make_args
+
+from xfdnn.rt import xdnn
+from xfdnn.rt.xdnn_dispatch import XDNNDispatcher
+
+BSZ = 2
+
+def _makeOp(monkeypatch, netcfg, latencyMs):
+  # each XDNNFPGAOp loads the library named by LIBXDNN_PATH at construction
+  monkeypatch.setenv("LIBXDNN_PATH", "sim:latency_ms=%g" % latencyMs)
+  xdnn.createManager(os.environ["LIBXDNN_PATH"])
+  ret, handles = xdnn.createHandle("unused.xclbin")
+  return xdnn.XDNNFPGAOp(handles, make_args(netcfg, BSZ))
+
+@pytest.fixture
+def netcfg(tmpdir):
+  return write_netcfg(str(tmpdir.join("net.json")),
+    {"data": (1, 3, 8, 8)}, {"out": (1, 10, 1, 1)})
+
+def test_least_outstanding_work(netcfg, monkeypatch):
+  fast, slow = _makeOp(monkeypatch, netcfg, 2), _makeOp(monkeypatch, netcfg, 10)
+  with XDNNDispatcher([fast, slow], maxInFlight=2) as dispatcher:
+    futs = [dispatcher.submit(fast.getInputs(), fast.getOutputs()) for i in range(60)]
+    for fut in futs:
+      fut.result(timeout=5)
+    stats = dispatcher.getStats()
+
+  assert sum(s['completed'] for s in stats) == 60
+  assert stats[0]['completed'] > 2 * stats[1]['completed'] > 0
+  assert stats[0]['latency'] < stats[1]['latency']
+
+def test_ordered_results(netcfg, monkeypatch):
+  fast, slow = _makeOp(monkeypatch, netcfg, 1), _makeOp(monkeypatch, netcfg, 8)
+  done = []
+  with XDNNDispatcher([slow, fast], maxInFlight=2, ordered=True) as dispatcher:
+    outs = [fast.getOutputs() for i in range(12)]
+    futs = []
+    for i, out in enumerate(outs):
+      fut = dispatcher.submit(fast.getInputs(), out)
+      fut.add_done_callback(lambda f, i=i: done.append(i))
+      futs.append(fut)
+    results = [fut.result(timeout=5) for fut in futs]
+
+  assert done == list(range(12))
+  assert all(r is o for r, o in zip(results, outs))
+
+def test_from_devices(netcfg, monkeypatch):
+  monkeypatch.setenv("LIBXDNN_PATH", "sim")
+  xdnn.createManager("sim")
+  args = make_args(netcfg, BSZ)
+  with XDNNDispatcher.fromDevices("unused.xclbin", args, [0, 1], pes=[0, 1]) as dispatcher:
+    targets = dispatcher.getTargets()
+    assert len(targets) == 4
+    dispatcher.submit(targets[0].getInputs(), targets[0].getOutputs()).result(timeout=5)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+import os
+
+import numpy as np
+import pytest
+
+from xfdnn.rt import xdnn_ingest
+from xfdnn.rt.xdnn_shm import NamedSharedMemoryRing
+
+_configs = {
+  'float32': {'transform': 'resize', 'height': 32, 'width': 48, 'slot_dtype': 'float32',
+              'img_raw_scale': 255., 'img_mean': [104., 117., 123.], 'img_input_scale': 1.},
+  'uint8': {'transform': 'yolo', 'height': 32, 'width': 32, 'slot_dtype': 'uint8'},
+}
+
+@pytest.mark.parametrize("kind", sorted(_configs))
+def test_write_image(kind):
+  config = _configs[kind]
+  name = "xdnn_test_ingest_%d" % os.getpid()
+  shape = (1, 3, config['height'], config['width'])
+  ring = NamedSharedMemoryRing(name, 2, [shape, (8,)], [np.dtype(kind), np.float32],
+                               config=config, nameCapacity=4)
+  try:
+    client = xdnn_ingest.IngestClient(name)
+    img = np.random.RandomState(0).randint(0, 256, (40, 60, 3)).astype(np.uint8)
+    assert client.writeImage(img, "frame0")
+    # both slots taken, nothing reads them
+    assert client.writeImage(img, "frame1")
+    assert not client.writeImage(img, "frame2", timeout=0.01)
+
+    slot = ring.tryOpenReadId()
+    tensor, meta = ring.accessNumpyBuffer(slot)
+    assert ring.names()[int(meta[0])] == "frame0"
+    assert tuple(meta[1:4]) == img.shape
+
+    plan = xdnn_ingest.makePlan(config)
+    if kind == 'uint8':
+      ref, _, box = plan.runRaw(img)
+      assert tuple(meta[4:8]) == box
+    else:
+      ref, _ = plan.run(img)
+    assert np.array_equal(tensor.reshape(ref.shape), ref)
+  finally:
+    ring.unlink()
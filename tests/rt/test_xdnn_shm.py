@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+
+from xfdnn.rt.xdnn_shm import CLOSED, NamedSharedMemoryRing, SharedMemoryBatchRing, SharedMemoryQueue, SharedMemoryRing
+
+def _produce(q, base, count):
+  for i in range(count):
+    slot = q.openWriteId()
+    bufs = q.accessNumpyBuffer(slot)
+    bufs[0][...] = base + i
+    bufs[1][0] = slot
+    q.closeWriteId(slot)
+
+@pytest.mark.parametrize("cls", [SharedMemoryQueue, SharedMemoryRing])
+def test_multi_producer(cls):
+  q = cls("test", 8, [(2, 3), (1,)])
+  procs = [mp.Process(target=_produce, args=(q, 1000 * p, 50)) for p in range(4)]
+  for p in procs:
+    p.start()
+
+  seen = []
+  for _ in range(200):
+    slot = q.openReadId()
+    bufs = q.accessNumpyBuffer(slot)
+    assert bufs[0].shape == (2, 3)
+    assert (bufs[0] == bufs[0][0, 0]).all()
+    assert bufs[1][0] == slot
+    seen.append(int(bufs[0][0, 0]))
+    q.closeReadId(slot)
+  for p in procs:
+    p.join()
+
+  assert sorted(seen) == sorted(1000 * p + i for p in range(4) for i in range(50))
+  # each producer's slots arrive in the order it wrote them
+  for p in range(4):
+    mine = [v for v in seen if v // 1000 == p]
+    assert mine == sorted(mine)
+
+  q.close()
+  assert q.openReadId() is None
+
+def test_ring_slots_are_one_segment():
+  q = SharedMemoryRing("test", 4, [(3,), (2, 2)])
+  mem = np.frombuffer(q._mem, dtype=np.uint8)
+  for i in range(4):
+    for buf in q.accessNumpyBuffer(i):
+      assert np.shares_memory(buf, mem)
+      assert buf.ctypes.data % 64 == 0
+      buf[...] = i
+  assert [int(q.accessNumpyBuffer(i)[1][1, 1]) for i in range(4)] == [0, 1, 2, 3]
+
+@pytest.mark.parametrize("cls", [SharedMemoryQueue, SharedMemoryRing])
+def test_typed_slots(cls):
+  q = cls("test", 2, [(3, 4, 4), (4,), (5,)], dtypes=[np.uint8, np.float32, np.int16])
+  slot = [q.openWriteId(), q.openWriteId()][1]
+  pix, meta, acc = q.accessNumpyBuffer(slot)
+  assert (pix.dtype, meta.dtype, acc.dtype) == (np.uint8, np.float32, np.int16)
+  assert (pix.shape, meta.shape, acc.shape) == ((3, 4, 4), (4,), (5,))
+  pix[...] = 255
+  acc[...] = -300
+  pix, meta, acc = q.accessNumpyBuffer(slot)
+  assert (pix == 255).all() and (acc == -300).all()
+  with pytest.raises(ValueError):
+    cls("test", 2, [(3,), (4,)], dtypes=[np.uint8])
+
+def test_typed_ring_footprint():
+  shapes = [(3, 224, 224)]
+  f32 = SharedMemoryRing("test", 8, shapes)
+  u8 = SharedMemoryRing("test", 8, shapes, dtypes=[np.uint8])
+  assert u8.nbytes() * 4 <= f32.nbytes() + 4 * 64
+
+def test_ring_try_open():
+  q = SharedMemoryRing("test", 2, [(1,)])
+  a = q.tryOpenWriteId()
+  b = q.tryOpenWriteId()
+  assert sorted([a, b]) == [0, 1]
+  assert q.tryOpenWriteId(0.01) is None
+  q.closeWriteId(a)
+  assert q.numReady() == 1
+  assert q.openReadId() == a
+  q.closeReadId(a)
+  assert q.tryOpenWriteId() == a
+
+def _produceRows(q, base, count):
+  for i in range(count):
+    slot, row = q.openWriteRow()
+    q.accessNumpyBuffer(slot)[0][row] = base + i
+    q.closeWriteRow(slot, row)
+
+def test_batch_ring_rows():
+  q = SharedMemoryBatchRing("test", 4, [(4, 2, 3), (4, 1)], 4)
+  procs = [mp.Process(target=_produceRows, args=(q, 1000 * p, 25)) for p in range(3)]
+  for p in procs:
+    p.start()
+
+  seen = []
+  while len(seen) < 75:
+    slot = q.tryOpenReadId(0.01)
+    if slot is None:
+      # 75 is not a multiple of 4: the tail needs a flush
+      q.flush()
+      continue
+    n = q.numRows(slot)
+    block = q.accessNumpyBuffer(slot)[0][:n]
+    assert block.flags['C_CONTIGUOUS']
+    assert (block == block[:, :1, :1]).all()
+    seen.extend(int(v) for v in block[:, 0, 0])
+    q.closeReadId(slot)
+  for p in procs:
+    p.join()
+
+  assert sorted(seen) == sorted(1000 * p + i for p in range(3) for i in range(25))
+  q.close()
+  assert q.tryOpenReadId() == CLOSED
+
+def test_batch_ring_flush_waits_for_claimed_rows():
+  q = SharedMemoryBatchRing("test", 2, [(3, 1)], 3)
+  a = q.openWriteRow()
+  b = q.openWriteRow()
+  assert a[0] == b[0] and (a[1], b[1]) == (0, 1)
+  q.closeWriteRow(*a)
+  assert q.flush() == 2
+  # row b is claimed but unwritten, so the batch is not readable yet
+  assert q.tryOpenReadId() is None
+  q.closeWriteRow(*b)
+  slot = q.tryOpenReadId()
+  assert slot == a[0] and q.numRows(slot) == 2
+  # the next row starts a new batch
+  assert q.openWriteRow()[0] != slot
+  assert q.flush() == 1
+
+def test_batch_ring_flush_deadline():
+  q = SharedMemoryBatchRing("test", 2, [(4, 1)], 4)
+  assert q.pendingAge() is None
+  q.closeWriteRow(*q.openWriteRow())
+  assert 0 <= q.pendingAge() < 1
+  # too young to flush
+  assert q.flush(minAge=60.) == 0
+  assert q.tryOpenReadId() is None
+  time.sleep(0.02)
+  assert q.flush(minAge=0.01) == 1
+  assert q.numRows(q.tryOpenReadId()) == 1
+  assert q.pendingAge() is None
+
+def test_batch_ring_shapes():
+  with pytest.raises(ValueError):
+    SharedMemoryBatchRing("test", 2, [(1, 3)], 4)
+
+_ATTACH = """
+from xfdnn.rt.xdnn_shm import NamedSharedMemoryRing
+ring = NamedSharedMemoryRing.attach(%r)
+assert ring.config() == {'kind': 'test'}
+for i in range(20):
+  slot = ring.openWriteId()
+  bufs = ring.accessNumpyBuffer(slot)
+  bufs[0][...] = i
+  inum = ring.newId() %% len(ring.names())
+  ring.names()[inum] = 'img%%d' %% i
+  bufs[1][0] = inum
+  ring.closeWriteId(slot)
+ring.close()
+"""
+
+def test_named_ring_unrelated_process():
+  name = "xdnn_test_%d" % os.getpid()
+  ring = NamedSharedMemoryRing(name, 4, [(2, 3), (1,)], [np.uint8, np.float32],
+                               config={'kind': 'test'}, nameCapacity=8)
+  try:
+    # a fresh interpreter, not a forked child, attaches by name
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    proc = subprocess.Popen([sys.executable, "-c", _ATTACH % name], env=env)
+    got = []
+    while True:
+      slot = ring.tryOpenReadId(10)
+      assert slot is not None
+      if slot == CLOSED:
+        break
+      bufs = ring.accessNumpyBuffer(slot)
+      assert bufs[0].dtype == np.uint8 and bufs[0].shape == (2, 3)
+      got.append((int(bufs[0][1, 2]), ring.names()[int(bufs[1][0])]))
+      ring.closeReadId(slot)
+    assert proc.wait() == 0
+    assert got == [(i, 'img%d' % i) for i in range(20)]
+    assert ring.numFree() == 4
+  finally:
+    ring.unlink()
+  assert not os.path.exists(NamedSharedMemoryRing.path(name))
+
+def test_named_ring_attach_timeout():
+  with pytest.raises(IOError):
+    NamedSharedMemoryRing.attach("xdnn_test_missing_%d" % os.getpid(), timeout=0.1)
+
+def _read_until_closed(q, seen):
+  while True:
+    slot = q.openReadId()
+    if slot is None:
+      return
+    seen.put(int(q.accessNumpyBuffer(slot)[0][0]))
+    q.closeReadId(slot)
+
+def test_close_markers_for_every_reader():
+  # more readers than slots: every reader gets its own end marker after the data
+  q = SharedMemoryRing("test", 2, [(1,)], numReaders=5)
+  seen = mp.Queue()
+  readers = [mp.Process(target=_read_until_closed, args=(q, seen)) for r in range(5)]
+  for p in readers:
+    p.start()
+  for i in range(30):
+    slot = q.openWriteId()
+    q.accessNumpyBuffer(slot)[0][0] = i
+    q.closeWriteId(slot)
+  for r in range(5):
+    q.close()
+  for p in readers:
+    p.join(10)
+    assert p.exitcode == 0
+  assert sorted(seen.get(timeout=5) for i in range(30)) == list(range(30))
+
+def test_ready_overflow_raises():
+  q = SharedMemoryRing("test", 2, [(1,)])
+  for i in range(2):
+    q.closeWriteId(q.openWriteId())
+  # two ready slots plus three markers fill the ready ring
+  for i in range(3):
+    q.close()
+  with pytest.raises(OverflowError):
+    q.close()
+  assert [q.openReadId() for i in range(3)] == [0, 1, None]
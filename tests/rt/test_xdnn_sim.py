@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+import json
+import time
+
+import numpy as np
+import pytest
+
+from base import write_netcfg, make_args
+
+from xfdnn.rt import xdnn, xdnn_sim
+
+BSZ = 4
+
+@pytest.fixture
+def make(tmpdir, monkeypatch):
+  def _make(spec, ops=None):
+    monkeypatch.setenv("LIBXDNN_PATH", spec)
+    netcfg = write_netcfg(str(tmpdir.join("net.json")),
+      {"data": (1, 3, 8, 8)}, {"out": (1, 10, 1, 1)})
+    if ops is not None:
+      with open(netcfg) as f:
+        obj = json.load(f)
+      obj["ops"] = ops
+      with open(netcfg, "w") as f:
+        json.dump(obj, f)
+    xdnn.createManager(spec)
+    ret, handles = xdnn.createHandle("unused.xclbin")
+    assert ret == 0
+    return xdnn.XDNNFPGAOp(handles, make_args(netcfg, BSZ))
+  return _make
+
+def test_parse_spec():
+  opts = xdnn_sim.parseSpec("sim:latency_ms=2.5,num_pe=2,output=random,seed=3")
+  assert opts['latency_ms'] == 2.5 and opts['num_pe'] == 2
+  assert opts['output'] == 'random' and opts['seed'] == 3
+  assert xdnn_sim.parseSpec("sim.v3")['output'] == 'zeros'
+  assert xdnn_sim.isSimSpec("sim:gops=10")
+  assert not xdnn_sim.isSimSpec("/opt/xfdnn/libxfdnn.so")
+  with pytest.raises(ValueError):
+    xdnn_sim.parseSpec("sim:bogus=1")
+  with pytest.raises(ValueError):
+    xdnn_sim.parseSpec("sim:output=golden")
+
+def test_outputs_shapes_and_modes(make):
+  fpgaRT = make("sim")
+  fpgaInput, fpgaOutput = fpgaRT.getInputs(), fpgaRT.getOutputs()
+  fpgaOutput["out"][...] = 1
+  fpgaRT.execute(fpgaInput, fpgaOutput)
+  assert fpgaOutput["out"].shape == (BSZ, 10, 1, 1)
+  assert not fpgaOutput["out"].any()
+
+  fpgaRT = make("sim:output=random,seed=1")
+  fpgaRT.execute(fpgaRT.getInputs(), fpgaRT.getOutputs())
+  assert fpgaRT.getOutputs()["out"].std() > 0
+
+def test_golden_replay(tmpdir, make):
+  gold = np.arange(6 * 10, dtype=np.float32).reshape(6, 10, 1, 1)
+  goldFile = str(tmpdir.join("gold.npz"))
+  np.savez(goldFile, out=gold)
+  fpgaRT = make("sim:output=golden,golden=%s" % goldFile)
+  fpgaInput, fpgaOutput = fpgaRT.getInputs(), fpgaRT.getOutputs()
+  fpgaRT.execute(fpgaInput, fpgaOutput)
+  np.testing.assert_array_equal(fpgaOutput["out"], gold[:4])
+  fpgaRT.execute(fpgaInput, fpgaOutput)
+  np.testing.assert_array_equal(fpgaOutput["out"], gold[[4, 5, 0, 1]])
+
+def test_latency_model(make):
+  fpgaRT = make("sim:latency_ms=20")
+  fpgaInput, fpgaOutput = fpgaRT.getInputs(), fpgaRT.getOutputs()
+
+  start = time.time()
+  fpgaRT.exec_async(fpgaInput, fpgaOutput, 0)
+  fpgaRT.exec_async(fpgaInput, fpgaOutput, 1)
+  assert time.time() - start < 0.015
+  fpgaRT.get_result(0)
+  fpgaRT.get_result(1)
+  # one PE: the second batch queues behind the first
+  assert time.time() - start >= 0.039
+  assert abs(fpgaRT.get_exec_time() - 40.) < 1e-3
+
+  # latency derived from compiler ops: 5e6 ops * 4 images / 1 GOPS = 20 ms
+  fpgaRT = make("sim:gops=1", ops=5e6)
+  start = time.time()
+  fpgaRT.execute(fpgaRT.getInputs(), fpgaRT.getOutputs())
+  assert time.time() - start >= 0.019
+
+def test_gops_needs_ops(make, capsys):
+  with pytest.raises(ValueError) as e:
+    make("sim:gops=1")
+  assert "latency_ms" in str(e.value)
+
+  # without gops, a net lacking ops runs without latency, with a warning
+  fpgaRT = make("sim")
+  assert "no \"ops\" count" in capsys.readouterr()[1]
+  start = time.time()
+  fpgaRT.execute(fpgaRT.getInputs(), fpgaRT.getOutputs())
+  assert time.time() - start < 0.01
+
+  # the default throughput applies when the JSON has ops: 5e9 ops * 4 images / 1000 GOPS
+  fpgaRT = make("sim", ops=5e9)
+  start = time.time()
+  fpgaRT.execute(fpgaRT.getInputs(), fpgaRT.getOutputs())
+  assert time.time() - start >= 0.019
+
+def test_manager_math():
+  xdnn.createManager("sim")
+  data = np.random.rand(2, 6).astype(np.float32)
+  weight = np.random.rand(3 * 6).astype(np.float32)
+  bias = np.random.rand(3).astype(np.float32)
+  out = np.empty((2, 3), dtype=np.float32)
+  xdnn.computeFC(weight, bias, data, out)
+  np.testing.assert_allclose(out, data.dot(weight.reshape(3, 6).T) + bias, rtol=1e-5)
+  smax = xdnn.computeSoftmax(out)
+  np.testing.assert_allclose(smax.sum(axis=1), 1., rtol=1e-5)
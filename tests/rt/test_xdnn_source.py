@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+import io
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from xfdnn.rt import xdnn_source
+from xfdnn.rt.xdnn_shm import SharedNameTable
+
+def _touch(path, data=b"x"):
+  with open(path, "wb") as f:
+    f.write(data)
+
+def test_directory_source(tmpdir):
+  tmpdir.mkdir("sub")
+  for name in ["b.jpg", "a.PNG", "notes.txt", ".hidden.jpg", "sub/c.jpg"]:
+    _touch(str(tmpdir.join(name)))
+
+  source = xdnn_source.openSource("dir:%s" % tmpdir)
+  names = [path[len(str(tmpdir)) + 1:] for path, data in source]
+  assert names == ["a.PNG", "b.jpg", "sub/c.jpg"]
+
+  flat = xdnn_source.DirectorySource(str(tmpdir), recursive=False)
+  assert len(list(flat)) == 2
+
+def test_line_source():
+  stream = io.StringIO(u"/a.jpg\n\n  /b.jpg \n")
+  assert list(xdnn_source.LineSource(stream)) == [(u"/a.jpg", u"/a.jpg"), (u"/b.jpg", u"/b.jpg")]
+
+def test_watched_directory_source(tmpdir):
+  _touch(str(tmpdir.join("old.jpg")))
+  source = xdnn_source.WatchedDirectorySource(str(tmpdir), pollInterval=0.01)
+  got = []
+  def consume():
+    for path, data in source:
+      got.append(path)
+  thread = threading.Thread(target=consume)
+  thread.daemon = True
+  thread.start()
+
+  time.sleep(0.1)
+  _touch(str(tmpdir.join("new.jpg")))
+  deadline = time.time() + 5
+  while len(got) < 2 and time.time() < deadline:
+    time.sleep(0.01)
+  source.close()
+  thread.join(5)
+  assert [p[len(str(tmpdir)) + 1:] for p in got] == ["old.jpg", "new.jpg"]
+
+def test_decode_item():
+  img = np.random.RandomState(0).randint(0, 256, (20, 30, 3)).astype(np.uint8)
+  ok, png = cv2.imencode(".png", img)
+  assert ok
+  assert np.array_equal(xdnn_source.decodeItem(png.ravel()), img)
+  assert xdnn_source.decodeItem("/a.jpg") == "/a.jpg"
+  assert xdnn_source.decodeItem(img) is img
+  with pytest.raises(ValueError):
+    xdnn_source.decodeItem(np.zeros(10, dtype=np.uint8))
+
+def test_open_source_unknown():
+  with pytest.raises(ValueError):
+    xdnn_source.openSource("/no/such/thing")
+
+def test_shared_name_table():
+  names = SharedNameTable(4, width=8)
+  names[1] = "short"
+  names[6] = "much too long"
+  assert names[1] == "short"
+  # ids wrap around, long names are truncated
+  assert names[2] == "much too"
+  names[5] = "x"
+  assert names[1] == "x"
+  assert len(names) == 4
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from xfdnn.rt import xdnn_io
+from xfdnn.rt.xdnn_tensor_cache import TensorCache
+
+@pytest.fixture
+def img():
+  return np.random.RandomState(0).randint(0, 256, (375, 500, 3)).astype(np.uint8)
+
+def test_tensor_cache(tmpdir, img):
+  for i in range(3):
+    cv2.imwrite(str(tmpdir.join("img%d.png" % i)), img[:, i*50:])
+  paths = [str(tmpdir.join("img%d.png" % i)) for i in range(3)]
+  root = str(tmpdir.join("cache"))
+
+  cache = TensorCache(root)
+  ref = [xdnn_io.loadYoloImageBlobFromFile(p, 416, 416) for p in paths]
+  for p in paths:
+    xdnn_io.loadYoloImageBlobFromFile(p, 416, 416, cache=cache)
+  assert (cache.hits, cache.misses) == (0, 3)
+
+  # a fresh instance, as after a restart, serves everything from disk
+  cache = TensorCache(root)
+  out = np.zeros((1, 3, 416, 416), dtype=np.float32)
+  for p, (refBlob, refShape) in zip(paths, ref):
+    blob, shape = xdnn_io.loadYoloImageBlobFromFile(p, 416, 416, out=out, cache=cache)
+    assert tuple(shape) == tuple(refShape)
+    assert np.array_equal(out, refBlob)
+  assert (cache.hits, cache.misses) == (3, 0)
+
+  # a different cmdSeq must not hit the yolo tensors
+  xdnn_io.loadImageBlobFromFile(paths[0], 255., [104., 117., 123.], 1., 224, 224, cache=cache)
+  assert cache.misses == 1
+
+def test_tensor_cache_evicts_lru(tmpdir, img):
+  paths = []
+  for i in range(4):
+    paths.append(str(tmpdir.join("img%d.png" % i)))
+    cv2.imwrite(paths[-1], img[:, i*10:])
+
+  shard = 3 * 416 * 416 * 4
+  cache = TensorCache(str(tmpdir.join("cache")), maxBytes=int(shard * 3.5))
+  for p in paths[:3]:
+    xdnn_io.loadYoloImageBlobFromFile(p, 416, 416, cache=cache)
+  time.sleep(0.05)
+  # touch the oldest entry so the second becomes least recently used
+  xdnn_io.loadYoloImageBlobFromFile(paths[0], 416, 416, cache=cache)
+  xdnn_io.loadYoloImageBlobFromFile(paths[3], 416, 416, cache=cache)
+  assert len(cache) == 3
+  assert cache.numBytes() <= cache._maxBytes
+
+  misses = cache.misses
+  xdnn_io.loadYoloImageBlobFromFile(paths[1], 416, 416, cache=cache)
+  assert cache.misses == misses + 1
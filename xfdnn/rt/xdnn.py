@@ -13,40 +13,149 @@ import timeit
 import numpy as np
 from multiprocessing.managers import BaseManager
 
+from xfdnn.rt import xdnn_sim
+
+
+def _libPath(libFile):
+  if xdnn_sim.isSimSpec(libFile):
+    return libFile
+  return os.path.abspath(libFile)
+
+def _loadLibrary(libFile):
+  """
+  Loads libxfdnn from a .so path, or the software stand-in from a
+  "sim[:options]" spec (see xdnn_sim). Returns (path, lib).
+  """
+  if xdnn_sim.isSimSpec(libFile):
+    return libFile, xdnn_sim.loadLibrary(libFile)
+
+  if not libFile or not os.path.isfile(libFile):
+    raise AssertionError("XDNN library .so file %s not found" % libFile)
+
+  libFile = os.path.abspath(libFile)
+  return libFile, cdll.LoadLibrary(libFile)
+
+
+_COMPILER_JSON_DIGEST_VERSION = 2
+_compilerJsonCache = {}
+
+def _digestCompilerJson(jsonObj):
+  """
+  Reduces a compiler JSON to what the runtime needs: input/output names and
+  shapes (in JSON order) and the layer names of the network.
+  """
+  inName = {}
+  outName = {}
+  for i in jsonObj["inputs"]:
+    inName[i["input_name"]] = i["input_name"]
+
+  for i in jsonObj["outputs"]:
+    outName[ i["output_name"] ] = i["previous_tensors"][0]
+
+  inputs = []
+  outputs = []
+  layers = []
+  for i in jsonObj["network"]:
+    layers.append(i["name"])
+    if i["name"] in inName:
+      inputs.append((inName[ i["name"] ], i["outputshapes"]))
+    elif i["name"] in outName:
+      outputs.append((outName[ i["name"] ], i["outputshapes"]))
+
+  return {"inputs": inputs, "outputs": outputs, "layers": layers}
+
+def _privateCacheDir(path):
+  """
+  Returns path if it is a directory only the current user can write,
+  creating it (mode 0700) when missing, else None.
+  """
+  try:
+    os.mkdir(path, 0o700)
+  except OSError:
+    pass
+  try:
+    st = os.lstat(path)
+  except OSError:
+    return None
+  import stat
+  if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() \
+      or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+    return None
+  return path
+
+def _compilerJsonSidecars(path):
+  yield path + ".digest"
+  # fall back to a per-user cache when the model directory is read-only
+  import hashlib, tempfile
+  cacheDir = _privateCacheDir(os.path.join(tempfile.gettempdir(),
+    "xdnn_json_cache_%s" % os.getuid()))
+  if cacheDir is not None:
+    tag = hashlib.sha1(path.encode('utf-8')).hexdigest()
+    yield os.path.join(cacheDir, tag + ".digest")
+
+def _loadCompilerJsonDigest(compilerJSONFile):
+  """
+  Returns the digest of a compiler JSON, keyed by path, mtime and size.
+  Lookups hit the in-process cache first, then a JSON sidecar file, and
+  only parse the compiler JSON when both are missing or stale. Sidecars
+  hold plain data only, as they may sit in directories shared with others.
+  """
+  path = os.path.abspath(compilerJSONFile)
+  st = os.stat(path)
+  key = [path, st.st_mtime, st.st_size]
+
+  digest = _compilerJsonCache.get(path)
+  if digest is not None and digest[0] == key:
+    return digest[1]
+
+  for sidecar in _compilerJsonSidecars(path):
+    try:
+      with open(sidecar) as f:
+        sidecarObj = json.loads(f.read())
+      value = sidecarObj["digest"]
+      if sidecarObj["version"] == _COMPILER_JSON_DIGEST_VERSION \
+          and sidecarObj["key"] == key \
+          and all(k in value for k in ("inputs", "outputs", "layers")):
+        _compilerJsonCache[path] = (key, value)
+        return value
+    except Exception:
+      pass
+
+  with open(path) as f:
+    value = _digestCompilerJson(json.load(f))
+  _compilerJsonCache[path] = (key, value)
+
+  for sidecar in _compilerJsonSidecars(path):
+    try:
+      tmp = "%s.%d.tmp" % (sidecar, os.getpid())
+      with open(tmp, "w") as f:
+        json.dump({"version": _COMPILER_JSON_DIGEST_VERSION,
+                   "key": key, "digest": value}, f)
+      os.rename(tmp, sidecar)
+      break
+    except (IOError, OSError):
+      continue
+
+  return value
 
 #Parsing JSON directly is easier than passing all the necessary params from C++ to python
 #Pybind11 will make passing data between C++/python easier and will remove the need for this class
 class CompilerJsonParser:
   def __init__(self, compilerJSONFile):
+    self._compilerJSONFile = compilerJSONFile
     self._jsonObj = None
-    inName = {}
-    outName = {}
 
+    digest = _loadCompilerJsonDigest(compilerJSONFile)
+
+    # shapes are copied so callers may edit them (e.g. set the batch size)
+    # without touching the shared cache
     self._inputs = {}
     self._outputs = {}
-    with open(compilerJSONFile) as f:
-      self._jsonObj = json.load(f)
-
-      for i in self._jsonObj["inputs"]:
-        inName[i["input_name"]] = i["input_name"]
-
-      for i in self._jsonObj["outputs"]:
-        outName[ i["output_name"] ] = i["previous_tensors"][0]
-        #print ( i["previous_tensors"][0] , " -> ", i["output_name"] )
-
-      for i in self._jsonObj["network"]:
-        if i["name"] in inName.keys():
-          self._inputs[ inName[ i["name"] ] ] = i["outputshapes"]
-
-        elif i["name"] in outName.keys():
-          self._outputs[ outName[ i["name"] ] ] = i["outputshapes"]
-          #self._outputs[ i["name"] ] = i["outputshapes"]
-        # mergedItem
-     #   if "merged" in i:
-     #     for mergedItem in i["merged"]:
-            #print ( "mergeditem ", mergedItem , " -> ", i["name"] )
-            #self._hwoutname[mergedItem] = i["name"]
-
+    for name, shape in digest["inputs"]:
+      self._inputs[name] = list(shape)
+    for name, shape in digest["outputs"]:
+      self._outputs[name] = list(shape)
+    self._layers = digest["layers"]
 
   def getInputs(self):
     return self._inputs
@@ -54,14 +163,21 @@ class CompilerJsonParser:
   def getOutputs(self):
     return self._outputs
 
+  def getLayerNames(self):
+    return self._layers
+
+  def getJson(self):
+    """
+    Full compiler JSON, parsed on first use.
+    """
+    if self._jsonObj is None:
+      with open(self._compilerJSONFile) as f:
+        self._jsonObj = json.load(f)
+    return self._jsonObj
+
 class XDNNFPGAOp:
   def __init__ (self, handles, args):
-    libFile = os.environ["LIBXDNN_PATH"]
-    if not libFile or not os.path.isfile(libFile):
-      raise AssertionError("XDNN library .so file %s not found" % libFile)
-
-    self._libFile = os.path.abspath(libFile)
-    self._lib = cdll.LoadLibrary(self._libFile)
+    self._libFile, self._lib = _loadLibrary(os.environ["LIBXDNN_PATH"])
     self._handles = handles
 
     self._prev_time = 0.0
@@ -215,70 +331,66 @@ class XDNNFPGAOp:
     :param streamId: Argument not required.
     :type streamId: int.
     """
-    inKeys = inputs.keys()
-    outKeys = outputs.keys()
-
-#      for key,val in inputs.iteritems():
-#        inKeys.append(key)
-#        #if val.flags['C_CONTIGUOUS'] == False:
-#        #  raise ValueError( "Input for ", key, " must be C Contiguous" )
-#        if isinstance(val,np.ndarray):
-#          inSz.append( np.product(val.shape) )
-#        elif isinstance( val, list ):
-#          inSz.append(np.product(val[0].shape))
-#        else:
-#          raise ValueError( "Unsupported input format", type(val))
-#
-#      for key,val in output.iteritems():
-#        #if val.flags['C_CONTIGUOUS'] == False:
-#        #  raise ValueError( "Output for ", key, " must be C Contiguous" )
-#        outKeys.append(key)
-#
-#        if isinstance(val,np.ndarray):
-#          outSz.append( np.product(val.shape) )
-#        elif isinstance( val, list ):
-#          outSz.append(np.product(val[0].shape))
-#        else:
-#          raise ValueError( "Unsupported input format", type(val))
+    execArgs = self._makeExecArgs(inputs, outputs)
+    self._lib.XDNNExecute_2D_float(self._executor, *(execArgs + (streamId, blocking)))
+
+  def _makeExecArgs(self, inputs, outputs):
+    """
+    Builds the ctypes name/pointer/size arrays XDNNExecute_2D_float expects
+    for a set of input and output buffers. Returns the tuple of arguments
+    that follow the executor handle, up to (not including) streamId.
+    """
+    inKeys = list(inputs.keys())
+    outKeys = list(outputs.keys())
 
     in_name_arr = (c_char_p * len(inKeys) )(*inKeys)
-    #in_bufsz_arr = ( c_uint * len(inSz))(*inSz)
     out_name_arr = (c_char_p * len(outKeys) )()
-    #out_bufsz_arr = ( c_uint * len(outSz))(*outSz)
     in_ptr = {}
-    firstInput = next(iter(inputs.itervalues()))
+    firstInput = inputs[inKeys[0]]
     if isinstance(firstInput,np.ndarray):
       bsz = firstInput.shape[0]
-      for key, array in inputs.iteritems():
+      for key in inKeys:
+        array = inputs[key]
         in_ptr[key] = []
         for b in range(bsz):
           in_ptr[key].append ( array[b,...] )
     else:
       in_ptr = inputs
 
-    in_batch = next(iter(in_ptr.itervalues()))
-
-    bsz = len(in_batch)
+    bsz = len(in_ptr[inKeys[0]])
     ptr_inarr_2d = (POINTER( np.ctypeslib.ndpointer(c_float, flags="C_CONTIGUOUS") ) * len(inputs) )()
-    i = 0
-    for v in in_ptr.itervalues():
+    for i, key in enumerate(inKeys):
+      v = in_ptr[key]
       ptr_inarr_2d[i] = ( np.ctypeslib.ndpointer(c_float, flags="C_CONTIGUOUS")  * len(v) )()
       for p, p_val in enumerate(v):
         ptr_inarr_2d[i][p] = p_val.ctypes.data_as( np.ctypeslib.ndpointer(c_float, flags="C_CONTIGUOUS") )
-      i += 1
 
     ptr_outarr_2d = ( np.ctypeslib.ndpointer(c_float, flags="C_CONTIGUOUS") * len(outputs) )()
     out_bufsz_arr = ( c_uint * len(outputs))()
 
-    i = 0
-    for k,v in outputs.iteritems():
+    for i, k in enumerate(outKeys):
+      v = outputs[k]
       ptr_outarr_2d[i] = v.ctypes.data_as( np.ctypeslib.ndpointer(c_float, flags="C_CONTIGUOUS") )
       out_bufsz_arr[i] = np.prod(v.shape[1:])
       out_name_arr[i] = k
-      i += 1
 
-    self._lib.XDNNExecute_2D_float ( self._executor, ptr_inarr_2d, in_name_arr,
-                                     len(inputs), ptr_outarr_2d, out_bufsz_arr, out_name_arr, len(outputs), bsz, streamId, blocking)
+    return (ptr_inarr_2d, in_name_arr, len(inputs),
+            ptr_outarr_2d, out_bufsz_arr, out_name_arr, len(outputs), bsz)
+
+  def makeExecPlan(self, inputs, outputs, streamId=0):
+    """
+    Binds a fixed set of input/output buffers to a stream so that repeated
+    inference on those buffers skips per-call pointer construction.
+
+    :param inputs: Input buffers keyed by input name, as accepted by execute.
+    :type inputs: dict.
+    :param outputs: Output buffers keyed by output name, as accepted by execute.
+    :type outputs: dict.
+    :param streamId: Stream ID every dispatch of this plan is issued on.
+    :type streamId: int.
+    :returns: XDNNExecPlan -- Plan bound to this executor.
+    """
+    return XDNNExecPlan(self, inputs, outputs, streamId)
 
   def exec_async(self, inputs, output, streamId=0):
     """
@@ -309,19 +421,124 @@ class XDNNFPGAOp:
     self._prev_time = curr_time
     return elapsed
 
+class XDNNExecPlan:
+  """
+  Prebound execution plan for an XDNNFPGAOp.
+
+  Shapes, dtypes and contiguity of the bound buffers are validated once and
+  the ctypes argument list for XDNNExecute_2D_float is built once, so each
+  dispatch is a single library call. Callers refill the bound input buffers
+  in place between dispatches; rebinding requires a new plan.
+  """
+  def __init__(self, fpgaOp, inputs, outputs, streamId=0):
+    self._fpgaOp = fpgaOp
+    self._streamId = streamId
+
+    inDescs = fpgaOp.getInputDescriptors()
+    outDescs = fpgaOp.getOutputDescriptors()
+
+    self._inputs = {}
+    bsz = None
+    for name, val in inputs.items():
+      if name not in inDescs:
+        raise ValueError("Unknown input %s, expected one of %s" % (name, list(inDescs.keys())))
+      rows = self._checkRows(name, val, tuple(inDescs[name][1:]))
+      if bsz is None:
+        bsz = len(rows)
+      elif len(rows) != bsz:
+        raise ValueError("Input %s has batch %d, expected %d" % (name, len(rows), bsz))
+      self._inputs[name] = rows
+    if not bsz:
+      raise ValueError("Execution plan needs at least one non-empty input")
+
+    self._outputs = {}
+    for name, val in outputs.items():
+      if name not in outDescs:
+        raise ValueError("Unknown output %s, expected one of %s" % (name, list(outDescs.keys())))
+      self._checkArray(name, val)
+      if val.shape[0] < bsz:
+        raise ValueError("Output %s has batch %d, expected at least %d" % (name, val.shape[0], bsz))
+      if np.prod(val.shape[1:]) != np.prod(outDescs[name][1:]):
+        raise ValueError("Output %s holds %d elements per image, expected %d" \
+          % (name, np.prod(val.shape[1:]), np.prod(outDescs[name][1:])))
+      self._outputs[name] = val
+
+    self._batchSize = bsz
+    self._inputArrays = inputs
+    self._outputArrays = outputs
+
+    # prebuilt argument tuples keep every ctypes array (and the buffers they
+    # point to) alive for the lifetime of the plan
+    execArgs = fpgaOp._makeExecArgs(self._inputs, self._outputs)
+    self._syncArgs = (fpgaOp._executor,) + execArgs + (c_int(streamId), c_bool(True))
+    self._asyncArgs = (fpgaOp._executor,) + execArgs + (c_int(streamId), c_bool(False))
+    self._dispatch = fpgaOp._lib.XDNNExecute_2D_float
+    self._wait = fpgaOp._lib.XDNNWaitForResults
+
+  @staticmethod
+  def _checkArray(name, arr):
+    if not isinstance(arr, np.ndarray):
+      raise TypeError("Buffer %s must be a numpy array, got %s" % (name, type(arr)))
+    if arr.dtype != np.float32:
+      raise TypeError("Buffer %s must be float32, got %s" % (name, arr.dtype))
+    if not arr.flags['C_CONTIGUOUS']:
+      raise ValueError("Buffer %s must be C contiguous" % name)
+
+  @classmethod
+  def _checkRows(cls, name, val, imgShape):
+    if isinstance(val, np.ndarray):
+      cls._checkArray(name, val)
+      rows = [val[b,...] for b in range(val.shape[0])]
+    else:
+      rows = list(val)
+      for row in rows:
+        cls._checkArray(name, row)
+
+    for row in rows:
+      if row.size != np.prod(imgShape):
+        raise ValueError("Input %s has shape %s per image, expected %s" % (name, row.shape, imgShape))
+    return rows
+
+  def getInputs(self):
+    return self._inputArrays
+
+  def getOutputs(self):
+    return self._outputArrays
+
+  def getBatchSize(self):
+    return self._batchSize
+
+  def getStreamId(self):
+    return self._streamId
+
+  def execute(self):
+    """
+    Runs inference on the bound buffers and waits for completion.
+    """
+    self._dispatch(*self._syncArgs)
+
+  def exec_async(self):
+    """
+    Starts inference on the bound buffers. Fetch completion with get_result.
+    """
+    self._dispatch(*self._asyncArgs)
+
+  def get_result(self):
+    """
+    Waits for the plan's stream to complete.
+
+    :returns: int -- Return Code. Expect 0 for success.
+    """
+    return self._wait(self._fpgaOp._executor, self._streamId)
+
 class XDNNManager:
   def __init__(self, libFile=None):
     if not libFile and "LIBXDNN_PATH" in os.environ:
       libFile = os.environ["LIBXDNN_PATH"]
-    if not libFile or not os.path.isfile(libFile):
-      raise AssertionError("XDNN library .so file %s not found" % libFile)
-
-    self._libFile = os.path.abspath(libFile)
+    self._libFile, self._lib = _loadLibrary(libFile)
     self._handles = None
     self._execData = {}
 
-    self._lib = cdll.LoadLibrary(self._libFile)
-
     self._lib.XDNNQuantizeAvgPool.argtypes = [c_float, c_float, c_int, c_int]
     self._lib.XDNNQuantizeTensor.argtypes = [c_float, c_int,
       np.ctypeslib.ndpointer(c_float, flags="C_CONTIGUOUS"), c_int]
@@ -424,8 +641,13 @@ class XDNNManager:
     :param num: Number of images processed.
     :returns: numpy.ndarray -- Softmax Activation.
     """
+    size = int(np.prod(data.shape[1:]))
+    if data.flags['C_CONTIGUOUS']:
+      # one call for the whole batch instead of one per row
+      self._lib.computeSoftmax(data.reshape(-1), data.shape[0], size)
+      return data
     for i in range(data.shape[0]):
-      self._lib.computeSoftmax(data[i,:], 1, np.prod(data.shape[1:]))
+      self._lib.computeSoftmax(data[i,:], 1, size)
     return data
 
   def computeFC(self, weight, bias, data,out):
@@ -463,7 +685,7 @@ _xdnnManager = None
 def createManager ( libFile=None ):
   global _xdnnManager
   if not _xdnnManager \
-    or (libFile != None and os.path.abspath(libFile) != _xdnnManager._libFile):
+    or (libFile != None and _libPath(libFile) != _xdnnManager._libFile):
     _xdnnManager = XDNNManager(libFile)
     _exposeXdnnFunctions(_xdnnManager)
   return True
@@ -476,9 +698,28 @@ def _exposeXdnnFunctions(xdnnObj):
     if not n.startswith("_"):
       globals()[n] = getattr(xdnnObj, n)
 
-try:
-  # try to load XDNNManager with defaults
-  # (picks up libxfdnn.so path from ENV)
-  createManager()
-except Exception as e:
-  print(e)
+# XDNNManager API exposed at module level by _exposeXdnnFunctions
+_managerFunctionNames = [
+  "createHandle", "closeHandle",
+  "computeFC", "computeSoftmax",
+  "quantizeAvgPool", "quantizeBias", "quantizev3Bias",
+  "quantizeInterLayer", "quantizev3InterLayer",
+  "quantizeTensor", "unquantizeTensor", "quantizeWeights",
+  "getHostDeviceName",
+]
+
+def _lazyManagerFunction(name):
+  def _call(*args, **kwargs):
+    # the first call loads libxfdnn (path from LIBXDNN_PATH), after which
+    # createManager rebinds the module-level names to the manager directly
+    createManager()
+    return getattr(_xdnnManager, name)(*args, **kwargs)
+  _call.__name__ = name
+  _call.__doc__ = getattr(getattr(XDNNManager, name, None), '__doc__', None)
+  return _call
+
+# Importing this module does not load libxfdnn or create a manager; that
+# happens on the first call to createManager or any of the functions below.
+for _name in _managerFunctionNames:
+  globals()[_name] = _lazyManagerFunction(_name)
+del _name
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+"""
+CPU affinity and NUMA placement of pipeline stages (Linux only).
+
+A Placement maps stage names to CPU sets and optionally names the NUMA node
+that shared-memory segments should live on:
+
+  placement = Placement({'pre': '0-5', 'fpga': '6', 'post': 'node:1'}, shmNode=0)
+  with placement.shmScope():
+    ring = SharedMemoryRing(...)   # pages first touched on node 0
+  ...
+  placement.apply('pre')           # in the preprocessing process
+
+CPU sets are Linux cpu lists ("0-3,8") or "node:N" for every CPU of NUMA
+node N. Segments are placed by first touch: multiprocessing zero-fills
+shared arrays when it creates them, so creating them while pinned to a
+node's CPUs allocates their pages on that node.
+
+Affinity uses os.sched_setaffinity where available and libc otherwise;
+the effective placement is read back from /proc.
+"""
+from __future__ import print_function
+
+import contextlib
+import ctypes
+import ctypes.util
+import glob
+import numbers
+import os
+import re
+
+_NODE_ROOT = "/sys/devices/system/node"
+_STRING_TYPES = (str, type(u""))
+
+
+def parseCpuList(text):
+  """
+  :param text: Linux cpu list, e.g. "0-3,8,10-11".
+  :returns: list -- sorted CPU ids.
+  """
+  cpus = set()
+  for part in text.strip().split(","):
+    if not part:
+      continue
+    if "-" in part:
+      lo, hi = part.split("-")
+      cpus.update(range(int(lo), int(hi) + 1))
+    else:
+      cpus.add(int(part))
+  return sorted(cpus)
+
+
+def formatCpuList(cpus):
+  """
+  :returns: str -- Linux cpu list for cpus, e.g. [0, 1, 2, 8] -> "0-2,8".
+  """
+  ranges = []
+  for cpu in sorted(set(cpus)):
+    if ranges and cpu == ranges[-1][1] + 1:
+      ranges[-1][1] = cpu
+    else:
+      ranges.append([cpu, cpu])
+  return ",".join(str(lo) if lo == hi else "%d-%d" % (lo, hi) for lo, hi in ranges)
+
+
+def numaNodes():
+  """
+  :returns: dict -- NUMA node id -> list of CPU ids. A host without NUMA information is one node 0.
+  """
+  nodes = {}
+  for path in glob.glob(os.path.join(_NODE_ROOT, "node[0-9]*")):
+    try:
+      with open(os.path.join(path, "cpulist")) as f:
+        nodes[int(os.path.basename(path)[4:])] = parseCpuList(f.read())
+    except (IOError, OSError, ValueError):
+      continue
+  if not nodes:
+    nodes[0] = getAffinity()
+  return nodes
+
+
+def resolveCpus(spec):
+  """
+  :param spec: cpu list string, "node:N", a CPU id or a list of CPU ids.
+  :returns: list -- CPU ids.
+  """
+  if isinstance(spec, numbers.Integral):
+    return [int(spec)]
+  if not isinstance(spec, _STRING_TYPES):
+    return sorted(set(int(c) for c in spec))
+  if spec.startswith("node:"):
+    node = int(spec[5:])
+    nodes = numaNodes()
+    if node not in nodes:
+      raise ValueError("No NUMA node %d, have %s" % (node, sorted(nodes)))
+    return nodes[node]
+  return parseCpuList(spec)
+
+
+class _CpuSet(ctypes.Structure):
+  # glibc cpu_set_t: 1024 bits
+  _fields_ = [("bits", ctypes.c_ulong * (1024 // (8 * ctypes.sizeof(ctypes.c_ulong))))]
+
+_libc = None
+
+def _getLibc():
+  global _libc
+  if _libc is None:
+    _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+  return _libc
+
+
+def getAffinity(pid=0):
+  """
+  :returns: list -- CPU ids pid (default: this process) may run on.
+  """
+  if hasattr(os, "sched_getaffinity"):
+    return sorted(os.sched_getaffinity(pid))
+  mask = _CpuSet()
+  if _getLibc().sched_getaffinity(pid, ctypes.sizeof(mask), ctypes.byref(mask)) != 0:
+    raise OSError(ctypes.get_errno(), "sched_getaffinity failed")
+  width = 8 * ctypes.sizeof(ctypes.c_ulong)
+  return [i for i in range(1024) if mask.bits[i // width] >> (i % width) & 1]
+
+
+def setAffinity(cpus, pid=0):
+  """
+  Restricts pid (default: this process) to cpus.
+  """
+  cpus = sorted(set(cpus))
+  if not cpus:
+    raise ValueError("Empty CPU set")
+  if hasattr(os, "sched_setaffinity"):
+    os.sched_setaffinity(pid, cpus)
+    return
+  mask = _CpuSet()
+  width = 8 * ctypes.sizeof(ctypes.c_ulong)
+  for cpu in cpus:
+    mask.bits[cpu // width] |= 1 << (cpu % width)
+  if _getLibc().sched_setaffinity(pid, ctypes.sizeof(mask), ctypes.byref(mask)) != 0:
+    raise OSError(ctypes.get_errno(), "sched_setaffinity(%s) failed" % formatCpuList(cpus))
+
+
+def procCpus(pid):
+  """
+  :returns: str -- Cpus_allowed_list of pid as reported by /proc, or None.
+  """
+  try:
+    with open("/proc/%d/status" % pid) as f:
+      for line in f:
+        if line.startswith("Cpus_allowed_list:"):
+          return line.split(":", 1)[1].strip()
+  except (IOError, OSError):
+    pass
+  return None
+
+
+def memoryNodes(address, pid=None):
+  """
+  :param address: Any address inside a mapping, e.g. ctypes.addressof of a shared array.
+  :returns: dict -- NUMA node -> resident pages of that mapping, from /proc/<pid>/numa_maps, or None if unavailable.
+  """
+  proc = "/proc/%s" % ("self" if pid is None else pid)
+  try:
+    start = None
+    with open(proc + "/maps") as f:
+      for line in f:
+        lo, hi = [int(x, 16) for x in line.split(None, 1)[0].split("-")]
+        if lo <= address < hi:
+          start = lo
+          break
+    if start is None:
+      return None
+    with open(proc + "/numa_maps") as f:
+      for line in f:
+        fields = line.split()
+        if int(fields[0], 16) == start:
+          return dict((int(m.group(1)), int(m.group(2)))
+                      for m in (re.match(r"N(\d+)=(\d+)$", t) for t in fields[1:]) if m)
+  except (IOError, OSError, ValueError):
+    pass
+  return None
+
+
+class Placement(object):
+  def __init__(self, stageCpus=None, shmNode=None):
+    """
+    :param stageCpus: Stage name -> CPU spec (cpu list, "node:N" or list of ids). Stages not listed are not pinned.
+    :type stageCpus: dict.
+    :param shmNode: NUMA node for shared-memory segments created inside shmScope(), or None.
+    :type shmNode: int.
+    """
+    self._stages = dict((stage, resolveCpus(spec)) for stage, spec in (stageCpus or {}).items()
+                        if spec is not None)
+    self._shmNode = shmNode
+
+  @classmethod
+  def fromArgs(cls, args, stages=("pre", "fpga", "post")):
+    """
+    Builds a Placement from args['cpus_<stage>'] and args['shm_node'] (negative for none).
+    xdnn_io.make_dict_args may have turned cpu lists such as "0" or "0,8" into numbers or tuples.
+    """
+    shmNode = args.get('shm_node')
+    if shmNode is not None and shmNode < 0:
+      shmNode = None
+    return cls(dict((stage, args.get('cpus_%s' % stage)) for stage in stages), shmNode)
+
+  def __nonzero__(self):
+    return bool(self._stages) or self._shmNode is not None
+  __bool__ = __nonzero__
+
+  def cpus(self, stage):
+    """
+    :returns: list -- CPUs of stage, or None if it is not pinned.
+    """
+    return self._stages.get(stage)
+
+  def apply(self, stage, pid=0):
+    """
+    Pins pid (default: the calling process) to the CPUs of stage, if any.
+    """
+    cpus = self._stages.get(stage)
+    if cpus is not None:
+      setAffinity(cpus, pid)
+
+  @contextlib.contextmanager
+  def shmScope(self):
+    """
+    Runs the block pinned to the CPUs of the shared-memory node, then restores the affinity.
+    """
+    if self._shmNode is None:
+      yield
+      return
+    saved = getAffinity()
+    setAffinity(resolveCpus("node:%d" % self._shmNode))
+    try:
+      yield
+    finally:
+      setAffinity(saved)
+
+  def report(self, pids, segments=None):
+    """
+    :param pids: Stage name -> list of pids.
+    :type pids: dict.
+    :param segments: Segment name -> address inside it.
+    :type segments: dict.
+    :returns: list -- lines describing the effective placement read from /proc.
+    """
+    lines = []
+    for stage in sorted(pids):
+      want = self._stages.get(stage)
+      for pid in pids[stage]:
+        lines.append("%s pid %d: cpus %s (requested %s)" % (stage, pid, procCpus(pid),
+                     "any" if want is None else formatCpuList(want)))
+    for name in sorted(segments or {}):
+      nodes = memoryNodes(segments[name])
+      where = "unknown" if nodes is None else \
+        ", ".join("node %d: %d pages" % (n, p) for n, p in sorted(nodes.items())) or "not resident"
+      lines.append("%s shm: %s (requested node %s)" % (name, where,
+                   "any" if self._shmNode is None else self._shmNode))
+    return lines
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+"""
+Future-based completion API for XDNNFPGAOp.
+
+XDNNAsyncExecutor owns a pool of stream IDs and one completion thread. Each
+submit() starts inference with exec_async on a free stream and returns a
+Future that resolves to the outputs dict once get_result returns for that
+stream. At most maxInFlight submissions are outstanding; submit() blocks,
+trySubmit() returns None and aioSubmit() waits on the event loop until a
+stream frees up.
+
+  executor = XDNNAsyncExecutor(fpgaRT, maxInFlight=8)
+  fut = executor.submit(inputs, outputs)
+  fut.add_done_callback(postProcess)
+  ...
+  executor.close()
+
+Streams are waited on in submission order, so a Future never completes
+before one submitted earlier.
+"""
+from __future__ import print_function
+
+from collections import deque
+import threading
+import time
+
+try:
+  from concurrent.futures import Future
+except ImportError:
+  Future = None
+
+try:
+  import queue
+except ImportError:
+  import Queue as queue
+
+
+class _Future(object):
+  """
+  Minimal stand-in for concurrent.futures.Future when the futures backport
+  is not installed (Python 2).
+  """
+  def __init__(self):
+    self._cond = threading.Condition()
+    self._done = False
+    self._result = None
+    self._exception = None
+    self._callbacks = []
+
+  def done(self):
+    return self._done
+
+  def cancel(self):
+    return False
+
+  def cancelled(self):
+    return False
+
+  def running(self):
+    return not self._done
+
+  def result(self, timeout=None):
+    with self._cond:
+      if not self._done:
+        self._cond.wait(timeout)
+      if not self._done:
+        raise RuntimeError("Timed out waiting for result")
+      if self._exception is not None:
+        raise self._exception
+      return self._result
+
+  def exception(self, timeout=None):
+    with self._cond:
+      if not self._done:
+        self._cond.wait(timeout)
+      if not self._done:
+        raise RuntimeError("Timed out waiting for result")
+      return self._exception
+
+  def add_done_callback(self, fn):
+    with self._cond:
+      if not self._done:
+        self._callbacks.append(fn)
+        return
+    fn(self)
+
+  def _finish(self):
+    with self._cond:
+      self._done = True
+      callbacks, self._callbacks = self._callbacks, []
+      self._cond.notify_all()
+    for fn in callbacks:
+      try:
+        fn(self)
+      except Exception as e:
+        print("Exception in Future callback: %s" % e)
+
+  def set_result(self, result):
+    self._result = result
+    self._finish()
+
+  def set_exception(self, exception):
+    self._exception = exception
+    self._finish()
+
+if Future is None:
+  Future = _Future
+
+
+class XDNNAsyncExecutor(object):
+  def __init__(self, fpgaRT, maxInFlight=8, streamIds=None):
+    """
+    :param fpgaRT: XDNNFPGAOp (or anything with exec_async/get_result).
+    :param maxInFlight: Maximum number of outstanding submissions.
+    :type maxInFlight: int.
+    :param streamIds: Stream IDs to allocate from. Defaults to range(maxInFlight).
+    :type streamIds: list.
+    """
+    if streamIds is None:
+      streamIds = range(maxInFlight)
+    streamIds = list(streamIds)
+    if maxInFlight < 1 or len(streamIds) < maxInFlight:
+      raise ValueError("Need at least maxInFlight=%d stream IDs, got %d" \
+        % (maxInFlight, len(streamIds)))
+
+    self._fpgaRT = fpgaRT
+    self._maxInFlight = maxInFlight
+    self._freeStreams = deque(streamIds[:maxInFlight])
+    self._cond = threading.Condition()
+    self._aioWaiters = deque()
+    self._closed = False
+
+    self._pending = queue.Queue()
+    self._thread = threading.Thread(target=self._complete)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+  def numInFlight(self):
+    with self._cond:
+      return self._maxInFlight - len(self._freeStreams)
+
+  def _acquire(self, block, timeout=None):
+    with self._cond:
+      if not self._freeStreams and block:
+        deadline = None if timeout is None else time.time() + timeout
+        while not self._freeStreams and not self._closed:
+          remaining = None if deadline is None else deadline - time.time()
+          if remaining is not None and remaining <= 0:
+            break
+          self._cond.wait(remaining)
+      if self._closed:
+        raise RuntimeError("Executor is closed")
+      if not self._freeStreams:
+        return None
+      return self._freeStreams.popleft()
+
+  def _release(self, streamId):
+    with self._cond:
+      self._freeStreams.append(streamId)
+      self._cond.notify()
+      waiters, self._aioWaiters = self._aioWaiters, deque()
+    for loop, retry in waiters:
+      loop.call_soon_threadsafe(retry)
+
+  def _start(self, streamId, inputs, outputs):
+    fut = Future()
+    try:
+      self._fpgaRT.exec_async(inputs, outputs, streamId)
+    except Exception:
+      self._release(streamId)
+      raise
+    self._pending.put((streamId, outputs, fut))
+    return fut
+
+  def submit(self, inputs, outputs, timeout=None):
+    """
+    Starts inference, blocking while maxInFlight submissions are outstanding.
+
+    :param inputs: Input buffers, as for XDNNFPGAOp.exec_async.
+    :param outputs: Output buffers, as for XDNNFPGAOp.exec_async.
+    :param timeout: Seconds to wait for a free stream. None waits forever.
+    :returns: Future -- resolves to outputs when the stream completes, or None on timeout.
+    """
+    streamId = self._acquire(True, timeout)
+    if streamId is None:
+      return None
+    return self._start(streamId, inputs, outputs)
+
+  def trySubmit(self, inputs, outputs):
+    """
+    Like submit, but returns None instead of blocking when saturated.
+    """
+    streamId = self._acquire(False)
+    if streamId is None:
+      return None
+    return self._start(streamId, inputs, outputs)
+
+  def aioSubmit(self, inputs, outputs, loop=None):
+    """
+    asyncio flavour of submit. Never blocks the event loop; waits for a free
+    stream on the loop instead.
+
+    :returns: asyncio.Future -- resolves to outputs when the stream completes.
+    """
+    import asyncio
+    if loop is None:
+      loop = asyncio.get_event_loop()
+    aioFut = loop.create_future()
+
+    def _copy(fut):
+      if aioFut.cancelled():
+        return
+      if fut.exception() is not None:
+        aioFut.set_exception(fut.exception())
+      else:
+        aioFut.set_result(fut.result())
+
+    def _try():
+      if aioFut.cancelled():
+        return
+      try:
+        with self._cond:
+          streamId = self._acquire(False)
+          if streamId is None:
+            self._aioWaiters.append((loop, _try))
+            return
+        fut = self._start(streamId, inputs, outputs)
+      except Exception as e:
+        aioFut.set_exception(e)
+        return
+      fut.add_done_callback(lambda f: loop.call_soon_threadsafe(_copy, f))
+
+    _try()
+    return aioFut
+
+  def _complete(self):
+    while True:
+      item = self._pending.get()
+      if item is None:
+        break
+      streamId, outputs, fut = item
+      try:
+        self._fpgaRT.get_result(streamId)
+      except Exception as e:
+        self._release(streamId)
+        fut.set_exception(e)
+        continue
+      self._release(streamId)
+      fut.set_result(outputs)
+
+  def close(self):
+    """
+    Waits for outstanding submissions and stops the completion thread.
+    """
+    with self._cond:
+      if self._closed:
+        return
+      self._closed = True
+      self._cond.notify_all()
+    self._pending.put(None)
+    self._thread.join()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+"""
+Queue-depth driven sizing of a worker set.
+
+Producers (e.g. preprocessing workers) fill slots that a consumer (the
+FPGA process) drains. Among the slots the consumer is not holding, the
+fraction that is ready rather than free tells which side is the bottleneck:
+
+  - mostly ready: the consumer cannot keep up, extra producers only burn
+    cores, so one is removed;
+  - mostly empty: the consumer is starved, so one is added.
+
+QueueDepthScaler only decides; the caller samples occupancy and starts or
+stops workers:
+
+  scaler = QueueDepthScaler(1, 8, start=2)
+  while running:
+    time.sleep(0.5)
+    ready, free = ring.numReady(), ring.numFree()
+    n = scaler.update(float(ready) / max(1, ready + free))
+    if n != len(workers):
+      resize(workers, n)
+"""
+from __future__ import print_function
+
+
+class QueueDepthScaler(object):
+  def __init__(self, minWorkers, maxWorkers, start=None, low=0.25, high=0.75,
+               alpha=0.3, cooldown=3):
+    """
+    :param minWorkers: Lower bound on the worker count.
+    :type minWorkers: int.
+    :param maxWorkers: Upper bound on the worker count.
+    :type maxWorkers: int.
+    :param start: Initial worker count. Default is minWorkers.
+    :type start: int.
+    :param low: Smoothed occupancy below which a worker is added.
+    :type low: float.
+    :param high: Smoothed occupancy above which a worker is removed.
+    :type high: float.
+    :param alpha: Weight of the newest sample in the occupancy moving average.
+    :type alpha: float.
+    :param cooldown: Samples to wait after a change before the next one, so the queue can settle.
+    :type cooldown: int.
+    """
+    if minWorkers < 1 or maxWorkers < minWorkers:
+      raise ValueError("Need 1 <= minWorkers <= maxWorkers, got %d, %d" % (minWorkers, maxWorkers))
+    if not 0. <= low < high <= 1.:
+      raise ValueError("Need 0 <= low < high <= 1, got %g, %g" % (low, high))
+    self._min = minWorkers
+    self._max = maxWorkers
+    self._low = low
+    self._high = high
+    self._alpha = alpha
+    self._cooldown = cooldown
+
+    if start is None:
+      start = minWorkers
+    self.numWorkers = max(minWorkers, min(maxWorkers, start))
+    self.occupancy = None
+    self._wait = cooldown
+
+  def update(self, occupancy):
+    """
+    Adds an occupancy sample.
+
+    :param occupancy: Ready share of the slots not held by the consumer, in [0, 1].
+    :type occupancy: float.
+    :returns: int -- worker count to run from now on.
+    """
+    if self.occupancy is None:
+      self.occupancy = occupancy
+    else:
+      self.occupancy += self._alpha * (occupancy - self.occupancy)
+
+    if self._wait > 0:
+      self._wait -= 1
+      return self.numWorkers
+
+    if self.occupancy > self._high and self.numWorkers > self._min:
+      self.numWorkers -= 1
+      self._wait = self._cooldown
+    elif self.occupancy < self._low and self.numWorkers < self._max:
+      self.numWorkers += 1
+      self._wait = self._cooldown
+    return self.numWorkers
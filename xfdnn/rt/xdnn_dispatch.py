@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+"""
+Load-balancing dispatcher over several XDNNFPGAOps (devices and/or PEs).
+
+Each target gets its own XDNNAsyncExecutor. A batch goes to the target with
+the least outstanding work, estimated as (queue depth + 1) * moving average
+of that target's per-batch service time, so a slower or busier card receives
+proportionally fewer batches. With ordered=True, Futures resolve in
+submission order even when a later batch finishes first on another target.
+
+  dispatcher = XDNNDispatcher.fromDevices(args['xclbin'], args, [0, 1])
+  fut = dispatcher.submit(inputs, outputs)
+  ...
+  dispatcher.close()
+"""
+from __future__ import print_function
+
+import threading
+import time
+
+from xfdnn.rt import xdnn
+from xfdnn.rt.xdnn_async import Future, XDNNAsyncExecutor
+
+
+class _Target(object):
+  def __init__(self, idx, fpgaRT, maxInFlight):
+    self.idx = idx
+    self.fpgaRT = fpgaRT
+    self.executor = XDNNAsyncExecutor(fpgaRT, maxInFlight)
+    self.maxInFlight = maxInFlight
+    self.depth = 0
+    self.latency = None
+    self.lastDone = 0.
+    self.numCompleted = 0
+
+  def score(self):
+    # unseen targets are probed before any latency estimate is trusted
+    if self.latency is None:
+      return (self.depth + 1) * 1e-9
+    return (self.depth + 1) * self.latency
+
+
+class XDNNDispatcher(object):
+  def __init__(self, fpgaRTs, maxInFlight=4, ordered=False, alpha=0.2):
+    """
+    :param fpgaRTs: One XDNNFPGAOp per device or PE.
+    :type fpgaRTs: list.
+    :param maxInFlight: Maximum outstanding batches per target.
+    :type maxInFlight: int.
+    :param ordered: Resolve Futures in submission order.
+    :type ordered: bool.
+    :param alpha: Weight of the newest sample in the latency moving average.
+    :type alpha: float.
+    """
+    if not fpgaRTs:
+      raise ValueError("Dispatcher needs at least one XDNNFPGAOp")
+    self._targets = [_Target(i, rt, maxInFlight) for i, rt in enumerate(fpgaRTs)]
+    self._ordered = ordered
+    self._alpha = alpha
+    self._cond = threading.Condition()
+    self._closed = False
+
+    # reorder buffer for ordered mode: seq -> (future, result, exception)
+    self._nextSubmit = 0
+    self._nextRelease = 0
+    self._finished = {}
+
+  @classmethod
+  def fromDevices(cls, xclbin, args, deviceIDs, pes=None, **kwargs):
+    """
+    Creates handles for deviceIDs and one XDNNFPGAOp per device and PE.
+
+    :param xclbin: Path to binary image to be loaded.
+    :type xclbin: str.
+    :param args: Argument dictionary, as for XDNNFPGAOp.
+    :type args: dict.
+    :param deviceIDs: Device IDs to create handles for.
+    :type deviceIDs: list.
+    :param pes: PEs to use on every device. Default is args['PE'].
+    :type pes: list.
+    """
+    ret, handles = xdnn.createHandle(xclbin, "kernelSxdnn_0", list(deviceIDs))
+    if ret != 0:
+      raise RuntimeError("Failed to create handles for devices %s" % list(deviceIDs))
+    if pes is None:
+      pes = [args.get('PE', -1)]
+
+    fpgaRTs = []
+    for h in handles:
+      for pe in pes:
+        peArgs = dict(args)
+        peArgs['PE'] = pe
+        fpgaRTs.append(xdnn.XDNNFPGAOp([h], peArgs))
+    return cls(fpgaRTs, **kwargs)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+  def getTargets(self):
+    return [t.fpgaRT for t in self._targets]
+
+  def getStats(self):
+    """
+    :returns: list -- per target dict of depth, service latency (s) and completed batches.
+    """
+    with self._cond:
+      return [{'depth': t.depth, 'latency': t.latency, 'completed': t.numCompleted}
+              for t in self._targets]
+
+  def _pick(self, timeout):
+    deadline = None if timeout is None else time.time() + timeout
+    with self._cond:
+      while True:
+        if self._closed:
+          raise RuntimeError("Dispatcher is closed")
+        free = [t for t in self._targets if t.depth < t.maxInFlight]
+        if free:
+          target = min(free, key=lambda t: (t.score(), t.depth, t.idx))
+          target.depth += 1
+          seq = self._nextSubmit
+          self._nextSubmit += 1
+          return target, seq
+        remaining = None if deadline is None else deadline - time.time()
+        if remaining is not None and remaining <= 0:
+          return None, None
+        self._cond.wait(remaining)
+
+  def submit(self, inputs, outputs, timeout=None):
+    """
+    Starts inference on the least loaded target.
+
+    :param inputs: Input buffers, as for XDNNFPGAOp.exec_async.
+    :param outputs: Output buffers, as for XDNNFPGAOp.exec_async.
+    :param timeout: Seconds to wait for a free target. None waits forever.
+    :returns: Future -- resolves to outputs, or None on timeout.
+    """
+    target, seq = self._pick(timeout)
+    if target is None:
+      return None
+
+    fut = Future()
+    start = time.time()
+    try:
+      devFut = target.executor.submit(inputs, outputs)
+    except Exception as e:
+      with self._cond:
+        target.depth -= 1
+        release = self._release(seq, fut, None, e)
+        self._cond.notify_all()
+      self._resolve(release)
+      raise
+    devFut.add_done_callback(
+      lambda f: self._done(target, seq, start, fut, f))
+    return fut
+
+  def _done(self, target, seq, start, fut, devFut):
+    now = time.time()
+    exception = devFut.exception()
+    result = None if exception is not None else devFut.result()
+
+    with self._cond:
+      target.depth -= 1
+      target.numCompleted += 1
+      # service time excludes time spent queued behind earlier batches
+      elapsed = now - max(start, target.lastDone)
+      target.lastDone = now
+      if target.latency is None:
+        target.latency = elapsed
+      else:
+        target.latency += self._alpha * (elapsed - target.latency)
+
+      release = self._release(seq, fut, result, exception)
+      self._cond.notify_all()
+    self._resolve(release)
+
+  def _release(self, seq, fut, result, exception):
+    # caller holds self._cond
+    if not self._ordered:
+      return [(fut, result, exception)]
+    self._finished[seq] = (fut, result, exception)
+    release = []
+    while self._nextRelease in self._finished:
+      release.append(self._finished.pop(self._nextRelease))
+      self._nextRelease += 1
+    return release
+
+  @staticmethod
+  def _resolve(release):
+    for fut, result, exception in release:
+      if exception is not None:
+        fut.set_exception(exception)
+      else:
+        fut.set_result(result)
+
+  def close(self):
+    """
+    Waits for outstanding batches and stops every target's completion thread.
+    """
+    with self._cond:
+      if self._closed:
+        return
+      self._closed = True
+      self._cond.notify_all()
+    for t in self._targets:
+      t.executor.close()
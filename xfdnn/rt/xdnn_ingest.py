@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+"""
+Producer client for a pipeline's named shared-memory ingestion endpoint.
+
+mp_classify.py --ingest NAME replaces its preprocessing workers with a
+NamedSharedMemoryRing at /dev/shm/NAME, whose slots are read directly by
+the FPGA process. Any process on the host, e.g. a camera capture daemon,
+attaches by name and writes into the slots; nothing is sent over sockets
+or pipes:
+
+  client = IngestClient("camera0")
+  client.writeImage(frame, "cam0/%d" % n)   # preprocesses straight into a slot
+
+or fills a slot itself, e.g. with a tensor preprocessed elsewhere:
+
+  slot, bufs = client.openSlot()
+  bufs[0][...] = tensor                     # [1, C, H, W], dtype of client.config()['slot_dtype']
+  client.commitSlot(slot, name, frame.shape)
+
+client.close() ends the pipeline run once the images written so far are
+done. The ring config describes the slot format (see
+mp_classify.UserPreProcess.ingestConfig):
+
+  transform       "resize" or "yolo"
+  height, width   network input size
+  slot_dtype      "float32" (preprocessed) or "uint8" (resized pixels, see PreprocessPlan.runRaw)
+  img_raw_scale, img_mean, img_input_scale   for "resize"
+"""
+from __future__ import print_function
+
+import numpy as np
+
+from xfdnn.rt import xdnn_io
+from xfdnn.rt.xdnn_shm import NamedSharedMemoryRing
+
+
+def makePlan(config):
+  """
+  :param config: Ring config, see the module docstring.
+  :returns: PreprocessPlan -- the preprocessing the pipeline expects in its slots.
+  """
+  if config['transform'] == 'yolo':
+    return xdnn_io.getYoloImageBlobPlan(config['height'], config['width'])
+  if config['transform'] == 'resize':
+    return xdnn_io.getImageBlobPlan(config['img_raw_scale'], np.array(config['img_mean'], dtype=np.float32),
+                                    config['img_input_scale'], config['height'], config['width'])
+  raise ValueError("Unknown transform %r" % config['transform'])
+
+
+class IngestClient(object):
+  def __init__(self, name, timeout=10.):
+    """
+    :param name: Endpoint name given to the pipeline with --ingest.
+    :type name: str.
+    :param timeout: Seconds to wait for the pipeline to create the endpoint.
+    :type timeout: float.
+    """
+    self._ring = NamedSharedMemoryRing.attach(name, timeout)
+    self._config = self._ring.config()
+    self._names = self._ring.names()
+    self._raw = self._config.get('slot_dtype', 'float32') == 'uint8'
+    self._plan = None
+
+  def config(self):
+    """
+    :returns: dict -- slot format, see the module docstring.
+    """
+    return dict(self._config)
+
+  def openSlot(self, timeout=None):
+    """
+    Claims a free slot, waiting while the pipeline is behind.
+
+    :param timeout: Seconds to wait. Default waits forever.
+    :type timeout: float.
+    :returns: (int, list) -- slot and its buffers (input, then [inum, H, W, C, ...] meta), or (None, None) on timeout.
+    """
+    slot = self._ring.tryOpenWriteId(timeout) if timeout is not None else self._ring.openWriteId()
+    if slot is None:
+      return None, None
+    return slot, self._ring.accessNumpyBuffer(slot)
+
+  def commitSlot(self, slot, name, shape, box=None):
+    """
+    Publishes a slot filled after openSlot.
+
+    :param name: Image name reported by post-processing.
+    :type name: str.
+    :param shape: (H, W, C) of the original image, used e.g. to map boxes back.
+    :type shape: tuple.
+    :param box: For uint8 slots, the (top, left, height, width) letterbox content box from PreprocessPlan.runRaw, if any.
+    :type box: tuple.
+    """
+    meta = self._ring.accessNumpyBuffer(slot)[-1]
+    inum = self._ring.newId() % len(self._names)
+    self._names[inum] = name
+    meta[0] = inum
+    meta[1:4] = shape[:3]
+    if self._raw:
+      meta[4:8] = box if box is not None else -1
+    self._ring.closeWriteId(slot)
+
+  def abortSlot(self, slot):
+    """
+    Returns a slot from openSlot unpublished.
+    """
+    self._ring.abortWriteId(slot)
+
+  def writeImage(self, img, name, timeout=None):
+    """
+    Preprocesses one image into a slot and publishes it.
+
+    :param img: Decoded HWC BGR uint8 image, or a path.
+    :param name: Image name reported by post-processing.
+    :type name: str.
+    :param timeout: Seconds to wait for a free slot. Default waits forever.
+    :type timeout: float.
+    :returns: bool -- False if no slot freed up within timeout.
+    """
+    if self._plan is None:
+      self._plan = makePlan(self._config)
+    slot, bufs = self.openSlot(timeout)
+    if slot is None:
+      return False
+    try:
+      box = None
+      if self._raw:
+        _, shape, box = self._plan.runRaw(img, out=bufs[0])
+      else:
+        _, shape = self._plan.run(img, out=bufs[0])
+    except:
+      self.abortSlot(slot)
+      raise
+    self.commitSlot(slot, name, shape, box)
+    return True
+
+  def close(self):
+    """
+    Ends the pipeline run after the images already written.
+    """
+    self._ring.close()
+
+
+def main(argv=None):
+  import argparse
+  parser = argparse.ArgumentParser(description="Write images to a pipeline started with --ingest NAME")
+  parser.add_argument('name', help='endpoint name')
+  parser.add_argument('images', nargs='+', help='image files or directories')
+  parser.add_argument('--close', default=False, action='store_true',
+                      help='end the pipeline run after these images')
+  args = parser.parse_args(argv)
+
+  client = IngestClient(args.name)
+  for path in xdnn_io.getFilePaths(args.images):
+    client.writeImage(path, path)
+  if args.close:
+    client.close()
+
+if __name__ == '__main__':
+  main()
@@ -8,14 +8,14 @@
 import os
 import json
 import argparse
+import hashlib
 from collections import OrderedDict
-import h5py
 import ntpath
 import cv2
 import numpy as np
 
 from xfdnn.rt.xdnn_util import literal_eval
-from ext.PyTurboJPEG import imread as _imread
+from ext.PyTurboJPEG import imread as _imread, imread_scaled as _imreadScaled
 
 
 
@@ -91,6 +91,12 @@ def default_parser_args():
         help='image mean values ')
     parser.add_argument('--img_input_scale', type=float, default=1.0,
         help='image input scale value ')
+    parser.add_argument('--scaled_decode', default=False, action='store_true',
+        help='decode JPEGs at the smallest DCT scale that covers the network input')
+    parser.add_argument('--preprocess_cache', default=None,
+        help='directory to cache preprocessed input tensors in across passes and runs')
+    parser.add_argument('--preprocess_cache_mb', type=int, default=4096,
+        help='size cap of --preprocess_cache in MB, least recently used tensors are evicted')
     parser.add_argument('--zmqpub', default=False, action='store_true',
         help='publish predictions to zmq port 5555')
     parser.add_argument('--perpetual', default=False, action='store_true',
@@ -398,8 +404,331 @@ def loadImageBlobFromFileScriptBase(imgFile, cmdSeq):
     return img, orig_shape
 
 
-# This runs image manipulation script
-def loadImageBlobFromFile(imgFile, raw_scale, mean, input_scale, img_h, img_w):
+_GEOMETRIC_CMDS = ('resize', 'resize2mindim', 'resize2maxdim', 'crop_center')
+_PIXEL_CMDS = ('pxlscale', 'meansub')
+_LAYOUT_CMDS = ('chtranspose', 'chswap')
+_PLAN_DIGEST_VERSION = 1
+
+class PreprocessPlan(object):
+    """
+    A cmdSeq for loadImageBlobFromFileScriptBase compiled into one fused pass.
+
+    Geometric steps (resize*, crop_center) run on the decoded uint8 image.
+    pxlscale and meansub are folded into a single per-channel affine
+    (out = scale * pixel + offset), and chtranspose/chswap into the strides
+    of the output view, so the only float pass writes straight into a
+    float32 output (preallocated, or caller-provided such as a shared memory
+    slot). crop_letterbox fills the border with its value mapped through the
+    steps that follow it. Sequences that cannot be folded (e.g. 'plot', a
+    resize after pixel ops, meansub after a transpose) run through
+    loadImageBlobFromFileScriptBase unchanged.
+
+    With scaledDecode=True, JPEG paths are decoded by libjpeg-turbo at the
+    smallest DCT scale (1/2, 3/8, 1/4, 1/8, ...) that still covers the first
+    resize, so that resize only has a small residual to do. The values differ
+    slightly from a full resolution decode; the returned shape is still the
+    full resolution one.
+    """
+    def __init__(self, cmdSeq, scaledDecode=False):
+        self._cmdSeq = list(cmdSeq)
+        self._scaledDecode = scaledDecode
+        self._geometric = []
+        self._letterbox = None
+        self._scale = np.ones(3, dtype=np.float32)
+        self._offset = np.zeros(3, dtype=np.float32)
+        self._offsetMap = None    # per-pixel HWC offset, when meansub is not per-channel
+        self._axes = (0, 1, 2)    # output axis i is HWC axis self._axes[i]
+        self._chans = [0, 1, 2]   # HWC-view channel k reads source channel self._chans[k]
+        self._fused = self._compile()
+        self._resizeBuf = None
+        self._digest = None
+
+    def isFused(self):
+        return self._fused
+
+    def digest(self):
+        """
+        Stable hash of the cmdSeq and decode mode, e.g. to key cached outputs.
+        """
+        if self._digest is None:
+            h = hashlib.sha1(("v%d|%d" % (_PLAN_DIGEST_VERSION, self._scaledDecode)).encode('utf-8'))
+            for (cmd, param) in self._cmdSeq:
+                h.update(cmd.encode('utf-8'))
+                if isinstance(param, np.ndarray):
+                    h.update(("%s%s" % (param.dtype, param.shape)).encode('utf-8'))
+                    h.update(np.ascontiguousarray(param).tobytes())
+                else:
+                    h.update(repr(param).encode('utf-8'))
+            self._digest = h.hexdigest()[:16]
+        return self._digest
+
+    def decodeScale(self, width, height):
+        """
+        Smallest fraction of a width x height image that the first step of the
+        cmdSeq can start from without upsampling more than it would at full size.
+        """
+        if not self._cmdSeq:
+            return 1.
+        cmd, param = self._cmdSeq[0]
+        if cmd == 'resize':
+            return max(float(param[0]) / width, float(param[1]) / height)
+        if cmd == 'resize2mindim':
+            return float(min(param[0], param[1])) / min(width, height)
+        if cmd == 'resize2maxdim':
+            return float(max(param)) / max(width, height)
+        return 1.
+
+    def _compile(self):
+        seenPixel = False
+        seenLayout = False
+        for (cmd, param) in self._cmdSeq:
+            if cmd in _GEOMETRIC_CMDS:
+                if seenPixel or seenLayout or self._letterbox is not None:
+                    return False
+                self._geometric.append((cmd, param))
+            elif cmd == 'crop_letterbox':
+                if seenLayout or self._letterbox is not None:
+                    return False
+                fill = np.zeros(3, dtype=np.float32)
+                fill[:] = param
+                self._letterbox = fill
+            elif cmd == 'pxlscale':
+                seenPixel = True
+                self._scale *= np.float32(param)
+                self._offset *= np.float32(param)
+                if self._offsetMap is not None:
+                    self._offsetMap *= np.float32(param)
+                if self._letterbox is not None:
+                    self._letterbox *= np.float32(param)
+            elif cmd == 'meansub':
+                seenPixel = True
+                if seenLayout:
+                    return False
+                mean = np.asarray(param, dtype=np.float32)
+                if mean.ndim == 3 and mean.shape[2] == 3 \
+                  and (mean == mean[:1, :1, :]).all():
+                    # e.g. a full HxWxC array filled with the per-channel mean
+                    mean = mean[0, 0, :]
+                if mean.size in (1, 3):
+                    self._offset -= mean.reshape(-1)
+                    if self._letterbox is not None:
+                        self._letterbox -= mean.reshape(-1)
+                elif mean.ndim == 3 and self._letterbox is None:
+                    if self._offsetMap is None:
+                        self._offsetMap = np.zeros(mean.shape, dtype=np.float32)
+                    self._offsetMap -= mean
+                else:
+                    return False
+            elif cmd == 'chtranspose':
+                seenLayout = True
+                self._axes = tuple(self._axes[p] for p in param)
+            elif cmd == 'chswap':
+                seenLayout = True
+                # loadImageBlobFromFileScriptBase swaps along axis 0 when it
+                # has 3 entries, else along axis 2; only the C axis is supported
+                chAxis = 0 if self._axes[0] == 2 else 2
+                if self._axes[chAxis] != 2:
+                    return False
+                self._chans = [self._chans[p] for p in param]
+            else:
+                return False
+        return True
+
+    def _resize(self, img, size):
+        size = (int(size[0]), int(size[1]))
+        if self._resizeBuf is None or self._resizeBuf.shape[:2] != (size[1], size[0]) \
+          or self._resizeBuf.shape[2:] != img.shape[2:] or self._resizeBuf.dtype != img.dtype:
+            self._resizeBuf = np.empty((size[1], size[0]) + img.shape[2:], dtype=img.dtype)
+        cv2.resize(img, size, dst=self._resizeBuf)
+        return self._resizeBuf
+
+    def _applyGeometric(self, img):
+        for (cmd, param) in self._geometric:
+            if cmd == 'resize':
+                img = self._resize(img, (param[0], param[1]))
+            elif cmd == 'resize2mindim':
+                height, width = img.shape[:2]
+                newdim = min(height, width)
+                mindim = min(param[0], param[1])
+                img = self._resize(img, (int(mindim * (float(width) / newdim)),
+                                         int(mindim * (float(height) / newdim))))
+            elif cmd == 'resize2maxdim':
+                height, width = img.shape[:2]
+                newdim = max(height, width)
+                maxdim = max(param)
+                img = self._resize(img, (int(maxdim * (float(width) / newdim)),
+                                         int(maxdim * (float(height) / newdim))))
+            elif cmd == 'crop_center':
+                ll_x = img.shape[0]//2 - param[0]//2
+                ll_y = img.shape[1]//2 - param[1]//2
+                img = img[ll_x:ll_x+param[0], ll_y:ll_y+param[1]]
+        return img
+
+    def run(self, imgFile, out=None):
+        """
+        Decodes (if given a path) and preprocesses one image.
+
+        :param imgFile: Image path, or a decoded HWC uint8 array.
+        :param out: Optional float32 C-contiguous buffer with as many elements as the output, e.g. a shared memory slot. A new array is allocated when omitted.
+        :returns: (numpy.ndarray, tuple) -- output in the layout of the cmdSeq, and the decoded image shape.
+        """
+        img, orig_shape = self._decode(imgFile)
+
+        if not self._fused:
+            res, _ = loadImageBlobFromFileScriptBase(img, self._cmdSeq)
+            if out is None:
+                return res, orig_shape
+            dst = out.reshape(res.shape)
+            dst[...] = res
+            return dst, orig_shape
+
+        img = self._applyGeometric(img)
+        outShape, box = self._layout(img)
+        dst = self._outBuffer(out, outShape, np.float32)
+
+        # HWC view of the output; channel k of the view holds source channel self._chans[k]
+        hwc = dst.transpose(np.argsort(self._axes))
+        if box is not None:
+            top, left, height, width = box
+            for k, c in enumerate(self._chans):
+                hwc[..., k] = self._letterbox[c]
+            hwc = hwc[top:top+height, left:left+width]
+
+        # deinterleave once so every float pass below reads contiguous planes
+        planes = cv2.split(np.ascontiguousarray(img))
+        for k, c in enumerate(self._chans):
+            self._affine(planes[c], c, hwc[..., k])
+        return dst, orig_shape
+
+    def runRaw(self, imgFile, out=None):
+        """
+        Runs only the geometric and layout steps, leaving pixels as uint8, so
+        the image can cross process boundaries at a quarter of the float32
+        size. finish() applies the remaining pixel steps.
+
+        :param imgFile: Image path, or a decoded HWC uint8 array.
+        :param out: Optional uint8 C-contiguous buffer with as many elements as the output.
+        :returns: (numpy.ndarray, tuple, tuple) -- uint8 output in the layout of the cmdSeq, the decoded image shape, and the (top, left, height, width) letterbox content box or None.
+        """
+        if not self._fused:
+            raise ValueError("cmdSeq cannot be split into uint8 and float steps: %s" % (self._cmdSeq,))
+        img, orig_shape = self._decode(imgFile)
+        img = self._applyGeometric(img)
+        outShape, box = self._layout(img)
+        dst = self._outBuffer(out, outShape, np.uint8)
+
+        hwc = dst.transpose(np.argsort(self._axes))
+        if box is not None:
+            top, left, height, width = box
+            hwc[...] = 0
+            hwc = hwc[top:top+height, left:left+width]
+        hwc[...] = img[..., self._chans]
+        return dst, orig_shape, box
+
+    def finish(self, raw, out=None, box=None):
+        """
+        Applies the pixel steps to the output of runRaw.
+
+        :param raw: uint8 image from runRaw.
+        :param out: Optional float32 C-contiguous buffer with as many elements as raw.
+        :param box: Letterbox content box returned by runRaw.
+        :returns: numpy.ndarray -- float32 output, identical to run().
+        """
+        dst = self._outBuffer(out, raw.shape, np.float32)
+        inv = np.argsort(self._axes)
+        hwcRaw = raw.transpose(inv)
+        hwc = dst.transpose(inv)
+        for k, c in enumerate(self._chans):
+            self._affine(hwcRaw[..., k], c, hwc[..., k])
+
+        if box is not None and self._letterbox is not None:
+            top, left, height, width = [int(v) for v in box]
+            for k, c in enumerate(self._chans):
+                plane = hwc[..., k]
+                fill = self._letterbox[c]
+                plane[:top] = fill
+                plane[top+height:] = fill
+                plane[top:top+height, :left] = fill
+                plane[top:top+height, left+width:] = fill
+        return dst
+
+    def _decode(self, imgFile):
+        if isinstance(imgFile, np.ndarray):
+            return imgFile, imgFile.shape
+        if self._scaledDecode:
+            return _imreadScaled(imgFile, self.decodeScale)
+        img = _imread(imgFile)
+        return img, img.shape
+
+    def _layout(self, img):
+        height, width, channels = img.shape
+        if channels != 3:
+            raise ValueError("PreprocessPlan expects 3 channel images, got %s" % (img.shape,))
+        canvas = (height, width, channels)
+        box = None
+        if self._letterbox is not None:
+            canvas = (max(height, width),) * 2 + (channels,)
+            box = ((canvas[0] - height) // 2, (canvas[1] - width) // 2, height, width)
+        return tuple(canvas[a] for a in self._axes), box
+
+    @staticmethod
+    def _outBuffer(out, outShape, dtype):
+        if out is None:
+            return np.empty(outShape, dtype=dtype)
+        if out.dtype != dtype or not out.flags['C_CONTIGUOUS'] \
+          or out.size != np.prod(outShape):
+            raise ValueError("out must be a C contiguous %s buffer of %d elements" \
+              % (np.dtype(dtype).name, np.prod(outShape)))
+        return out.reshape(outShape)
+
+    def _affine(self, src, c, plane):
+        if self._scale[c] != 1:
+            np.multiply(src, self._scale[c], out=plane)
+            if self._offset[c] != 0:
+                plane += self._offset[c]
+        else:
+            np.add(src, self._offset[c], out=plane)
+        if self._offsetMap is not None:
+            plane += self._offsetMap[:, :, c]
+
+def compilePreprocessPlan(cmdSeq, scaledDecode=False):
+    """
+    Compiles a cmdSeq (see loadImageBlobFromFileScriptBase) into a reusable
+    PreprocessPlan.
+    """
+    return PreprocessPlan(cmdSeq, scaledDecode)
+
+
+_planCache = OrderedDict()
+
+def _cachedPlan(key, cmdSeq, scaledDecode=False):
+    # plans are keyed on the scalar parameters of the calling helper; array
+    # parameters are keyed by identity and kept alive by the cached cmdSeq
+    key += (scaledDecode,)
+    plan = _planCache.get(key)
+    if plan is None:
+        if len(_planCache) >= 16:
+            _planCache.popitem(last=False)
+        plan = _planCache[key] = compilePreprocessPlan(cmdSeq, scaledDecode)
+    return plan
+
+def _runPlan(plan, imgFile, out, cache):
+    if cache is None or isinstance(imgFile, np.ndarray):
+        return plan.run(imgFile, out)
+    return cache.run(plan, imgFile, out)
+
+def _paramKey(param):
+    if isinstance(param, np.ndarray):
+        return ('ndarray', id(param))
+    if isinstance(param, (list, tuple)):
+        return tuple(param)
+    return param
+
+def getImageBlobPlan(raw_scale, mean, input_scale, img_h, img_w, scaledDecode=False):
+    """
+    PreprocessPlan used by loadImageBlobFromFile, e.g. to split it across
+    processes with runRaw/finish.
+    """
     # Direct resize only
     cmdseqResize = [
         ('resize',(img_w,img_h)),
@@ -408,7 +737,14 @@ def loadImageBlobFromFile(imgFile, raw_scale, mean, input_scale, img_h, img_w):
         ('pxlscale', input_scale),
         ('chtranspose',(2,0,1))
         ]
-    img, orig_shape = loadImageBlobFromFileScriptBase(imgFile, cmdseqResize)
+    return _cachedPlan(('resize', raw_scale, _paramKey(mean), input_scale, img_h, img_w),
+                       cmdseqResize, scaledDecode)
+
+# This runs image manipulation script
+def loadImageBlobFromFile(imgFile, raw_scale, mean, input_scale, img_h, img_w, out=None,
+                          scaledDecode=False, cache=None):
+    plan = getImageBlobPlan(raw_scale, mean, input_scale, img_h, img_w, scaledDecode)
+    img, orig_shape = _runPlan(plan, imgFile, out, cache)
 
     # Change initial resize to match network training (shown as {alpha x 256 or 256 x alpha}->224,224,
     # alpha being at least 256 such that the original aspect ratio is maintained)
@@ -423,13 +759,14 @@ def loadImageBlobFromFile(imgFile, raw_scale, mean, input_scale, img_h, img_w):
     #img, orig_shape = loadImageBlobFromFileScriptBase(imgFile, cmdseqCenterCrop)
 
     img = img[ np.newaxis, ...]
-    np.ascontiguousarray(img, dtype=np.float32)
-
 
     return img, None
 
 
-def loadYoloImageBlobFromFile(imgFile, img_h, img_w):
+def getYoloImageBlobPlan(img_h, img_w, scaledDecode=False):
+    """
+    PreprocessPlan used by loadYoloImageBlobFromFile.
+    """
     # This first loads the image
     # letterboxes/resizes
     # divides by 255 to create values from 0.0 to 1.0
@@ -452,9 +789,12 @@ def loadYoloImageBlobFromFile(imgFile, img_h, img_w):
         ('chswap',(2,1,0))
         ]
 
-    img, orig_shape = loadImageBlobFromFileScriptBase(imgFile, cmdseqYolov2)
+    return _cachedPlan(('yolov2', img_h, img_w), cmdseqYolov2, scaledDecode)
+
+def loadYoloImageBlobFromFile(imgFile, img_h, img_w, out=None, scaledDecode=False, cache=None):
+    plan = getYoloImageBlobPlan(img_h, img_w, scaledDecode)
+    img, orig_shape = _runPlan(plan, imgFile, out, cache)
     img = img[ np.newaxis, ...]
-    np.ascontiguousarray(img, dtype=np.float32)
     return img, orig_shape
 
 
@@ -481,6 +821,86 @@ def getTopK(output, labels, topK):
     topKList.reverse()
     return [(topKList[j][0], labels[topKList[j][1]]) for j in range(topK)]
 
+def getTopKBatch(output, topK):
+    """
+    Top-k class indices and scores for every row of a batch, best first.
+
+    :param output: Class scores, shape [batch, ...].
+    :type output: numpy.ndarray.
+    :param topK: Number of classes to keep per row.
+    :type topK: int.
+    :returns: (numpy.ndarray, numpy.ndarray) -- [batch, topK] indices and scores.
+    """
+    output = output.reshape(output.shape[0], -1)
+    topK = min(topK, output.shape[1])
+    rows = np.arange(output.shape[0])[:, None]
+    # argpartition selects the k best in O(n); only those k are then sorted
+    topKIdx = np.argpartition(output, -topK, axis=1)[:, -topK:]
+    order = np.argsort(output[rows, topKIdx], axis=1)[:, ::-1]
+    topKIdx = topKIdx[rows, order]
+    return topKIdx, output[rows, topKIdx]
+
+class ClassificationHead(object):
+  """
+  Batched FC + softmax + top-k on the FPGA output block.
+
+  The FC weights are reshaped and transposed once, so each batch is a single
+  matrix multiply, a numerically stable softmax over the whole block and an
+  argpartition based top-k, all into preallocated buffers.
+  """
+  def __init__(self, weight, bias, maxBatch=1):
+    """
+    :param weight: FC weights as loaded by loadFCWeightsBias, [outsz * K] in [outsz, K] order.
+    :type weight: numpy.ndarray.
+    :param bias: FC biases, [outsz].
+    :type bias: numpy.ndarray.
+    :param maxBatch: Initial size of the output buffers; grown on demand.
+    :type maxBatch: int.
+    """
+    bias = np.asarray(bias, dtype=np.float32).flatten()
+    weight = np.asarray(weight, dtype=np.float32)
+    N = bias.size
+    if weight.size % N:
+      raise ValueError('FC weight size %d is not a multiple of %d outputs' % (weight.size, N))
+    self._weightT = np.ascontiguousarray(weight.reshape(N, -1).T)
+    self._bias = bias
+    self._out = np.empty((maxBatch, N), dtype=np.float32)
+
+  def getInputSize(self):
+    return self._weightT.shape[0]
+
+  def getOutputSize(self):
+    return self._weightT.shape[1]
+
+  def forward(self, fpgaOutput, num=None):
+    """
+    FC + softmax for the first num rows of fpgaOutput.
+
+    :returns: numpy.ndarray -- [num, outsz] probabilities. The buffer is reused by the next call.
+    """
+    if num is None:
+      num = fpgaOutput.shape[0]
+    data = fpgaOutput.reshape(fpgaOutput.shape[0], -1)[:num]
+    if data.shape[1] != self._weightT.shape[0]:
+      raise ValueError('FC input has %d elements per image, expected %d' \
+        % (data.shape[1], self._weightT.shape[0]))
+    if self._out.shape[0] < num:
+      self._out = np.empty((num, self._out.shape[1]), dtype=np.float32)
+
+    out = self._out[:num]
+    np.dot(data, self._weightT, out=out)
+    out += self._bias
+    out -= out.max(axis=1, keepdims=True)
+    np.exp(out, out=out)
+    out /= out.sum(axis=1, keepdims=True)
+    return out
+
+  def run(self, fpgaOutput, topK=5, num=None):
+    """
+    :returns: (numpy.ndarray, numpy.ndarray) -- [num, topK] class indices and probabilities, best first.
+    """
+    return getTopKBatch(self.forward(fpgaOutput, num), topK)
+
 def getGoldenMap(goldenFile):
     goldenMap = OrderedDict()
     with open(goldenFile, 'r') as f:
@@ -522,21 +942,31 @@ def getClassification(output, img_paths, labels, topK = 5, zmqPub = False):
   :param label_file: path to label file
   :type args: dict.
   """
-  ret = ""
   if not isinstance(img_paths, list):
     img_paths = [img_paths]
 
+  topKIdx, topKVals = getTopKBatch(output[:len(img_paths)], topK)
+  return formatClassification(topKIdx, topKVals, img_paths, labels,
+    zmqPub=zmqPub, numTotal=output.shape[0])
+
+def formatClassification(topKIdx, topKVals, img_paths, labels, zmqPub = False, numTotal = None):
+  """
+  Formats precomputed top-k results (see getTopKBatch, ClassificationHead.run)
+  the same way as getClassification.
+  """
+  if numTotal is None:
+    numTotal = topKIdx.shape[0]
+  ret = []
   for i,p in enumerate(img_paths):
-    topXs = getTopK(output[i,...], labels, topK)
     inputImage = "for {:s} ".format(p if isinstance(p, str) else 'raw_input')
     if zmqPub :
-      ret += (img_paths[i] + '\n')
+      ret.append(img_paths[i] + '\n')
     else :
-      ret += "---------- Prediction {:d}/{:d} {:s}----------\n".format(i+1, output.shape[0], inputImage)
-    for (prob, label) in topXs:
-      ret += ("{:.4f} \"{:s}\"\n".format(prob, label))
+      ret.append("---------- Prediction {:d}/{:d} {:s}----------\n".format(i+1, numTotal, inputImage))
+    for prob, idx in zip(topKVals[i], topKIdx[i]):
+      ret.append("{:.4f} \"{:s}\"\n".format(prob, labels[idx]))
 
-  return ret
+  return "".join(ret)
 
 
 def getNearFileMatchWithPrefix(path, prefix, index = 0):
@@ -551,6 +981,7 @@ def getNearFileMatchWithPrefix(path, prefix, index = 0):
 def loadFCWeightsBias(arg, index = 0):
   data_dir = arg['weights']
   if ".h5" in data_dir:
+    import h5py # deferred, only needed for .h5 weights
     with h5py.File(data_dir,'r') as f:
       #keys = f.keys()
       #print (keys)
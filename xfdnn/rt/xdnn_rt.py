@@ -13,17 +13,9 @@ from ast import literal_eval as l_eval
 from collections import defaultdict, OrderedDict
 from copy import deepcopy
 
-import tensorflow as tf
-import caffe
 import numpy as np
-from tensorflow.python.ops import script_ops as _script_ops
 
-from xfdnn.tools.compile.bin.xfdnn_compiler_tensorflow import TFFrontend
-from xfdnn.tools.compile.bin.xfdnn_compiler_caffe import CaffeFrontend
 from . import xdnn_util
-from . import xdnn_tf_util
-from .xdnn_opt import CPUTransform, HWEmuTransform, FPGATransform
-from ext.PyTurboJPEG import imread as _imread
 
 
 
@@ -32,19 +24,73 @@ global_fpga_device    = 'cpu:0'   ## TODO: replace with FPGA:0
 global_pyfunc_counter = 0
 save = None
 
-######################################################
-## tensorflow specific utility functions
-######################################################
-## expanding tf.NodeDef methods
-tf.NodeDef.set_shape = xdnn_tf_util.set_shape
-tf.NodeDef.get_shape = xdnn_tf_util.get_shape
-tf.NodeDef.get_dtype = xdnn_tf_util.get_dtype
-
-## expanding tf.GraphDef methods
-tf.GraphDef.get_node_dict   = xdnn_tf_util.get_node_dict
-tf.GraphDef.get_output_dict = xdnn_tf_util.get_output_dict
-tf.GraphDef.is_cyclic       = xdnn_tf_util.is_cyclic
-tf.GraphDef.all_cycles      = xdnn_tf_util.all_cycles
+## frameworks, compiler frontends and transforms are bound on first use by
+## _importCommon/_importTF/_importCaffe, so importing this module stays cheap
+tf             = None
+_script_ops    = None
+TFFrontend     = None
+xdnn_tf_util   = None
+caffe          = None
+CaffeFrontend  = None
+CPUTransform   = None
+HWEmuTransform = None
+FPGATransform  = None
+_imread        = None
+
+def _importCommon():
+    global CPUTransform, HWEmuTransform, FPGATransform, _imread
+    if CPUTransform is not None:
+        return
+
+    from . import xdnn_opt
+    from ext.PyTurboJPEG import imread
+
+    HWEmuTransform = xdnn_opt.HWEmuTransform
+    FPGATransform  = xdnn_opt.FPGATransform
+    _imread        = imread
+    CPUTransform   = xdnn_opt.CPUTransform
+
+def _importTF():
+    global tf, _script_ops, TFFrontend, xdnn_tf_util
+    _importCommon()
+    if tf is not None:
+        return
+
+    import tensorflow
+    from tensorflow.python.ops import script_ops
+    from xfdnn.tools.compile.bin.xfdnn_compiler_tensorflow import TFFrontend as _TFFrontend
+    from . import xdnn_tf_util as _xdnn_tf_util
+
+    ######################################################
+    ## tensorflow specific utility functions
+    ######################################################
+    ## expanding tf.NodeDef methods
+    tensorflow.NodeDef.set_shape = _xdnn_tf_util.set_shape
+    tensorflow.NodeDef.get_shape = _xdnn_tf_util.get_shape
+    tensorflow.NodeDef.get_dtype = _xdnn_tf_util.get_dtype
+
+    ## expanding tf.GraphDef methods
+    tensorflow.GraphDef.get_node_dict   = _xdnn_tf_util.get_node_dict
+    tensorflow.GraphDef.get_output_dict = _xdnn_tf_util.get_output_dict
+    tensorflow.GraphDef.is_cyclic       = _xdnn_tf_util.is_cyclic
+    tensorflow.GraphDef.all_cycles      = _xdnn_tf_util.all_cycles
+
+    _script_ops  = script_ops
+    TFFrontend   = _TFFrontend
+    xdnn_tf_util = _xdnn_tf_util
+    tf           = tensorflow
+
+def _importCaffe():
+    global caffe, CaffeFrontend
+    _importCommon()
+    if caffe is not None:
+        return
+
+    import caffe as _caffe
+    from xfdnn.tools.compile.bin.xfdnn_compiler_caffe import CaffeFrontend as _CaffeFrontend
+
+    CaffeFrontend = _CaffeFrontend
+    caffe         = _caffe
 
 
 
@@ -528,6 +574,7 @@ class xdnnRT(object):
 
 class CaffexdnnRT(xdnnRT):
     def __init__ (self, args, **kwargs):
+        _importCaffe()
         super(CaffexdnnRT, self).__init__(CaffeFrontend, args, **kwargs)
 
     def load_graph(self, args, **kwargs):
@@ -621,6 +668,7 @@ class CaffexdnnRT(xdnnRT):
 
 class TFxdnnRT(xdnnRT):
     def __init__ (self, args, **kwargs):
+        _importTF()
         super(TFxdnnRT, self).__init__(TFFrontend, args, **kwargs)
 
     def load_graph(self, args, **kwargs):
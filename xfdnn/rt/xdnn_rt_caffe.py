@@ -7,18 +7,37 @@
 from os import mkdir as _mkdir
 from os.path import exists as _exists
 
-import caffe
-
 from xfdnn.rt.xdnn_rt_base import xdnnRT as _xdnnRT
-from xfdnn.rt.xdnn_opt import CPUTransform, HWEmuTransform, FPGATransform
-from xfdnn.tools.compile.bin.xfdnn_compiler_caffe import CaffeFrontend
 
+## Caffe, the compiler frontend and the transforms are bound by
+## _importFramework() when the first CaffexdnnRT is created
+caffe          = None
+CaffeFrontend  = None
+CPUTransform   = None
+HWEmuTransform = None
+FPGATransform  = None
+
+def _importFramework():
+    global caffe, CaffeFrontend, CPUTransform, HWEmuTransform, FPGATransform
+    if caffe is not None:
+        return
+
+    import caffe as _caffe
+    from xfdnn.tools.compile.bin.xfdnn_compiler_caffe import CaffeFrontend as _CaffeFrontend
+    from xfdnn.rt import xdnn_opt
+
+    CaffeFrontend  = _CaffeFrontend
+    CPUTransform   = xdnn_opt.CPUTransform
+    HWEmuTransform = xdnn_opt.HWEmuTransform
+    FPGATransform  = xdnn_opt.FPGATransform
+    caffe          = _caffe
 
 
 
 
 class CaffexdnnRT(_xdnnRT):
     def __init__ (self, args, **kwargs):
+        _importFramework()
         self.inputs = None
         self.outputs = None
         super(CaffexdnnRT, self).__init__(CaffeFrontend, args, **kwargs)
@@ -8,16 +8,10 @@ from collections import OrderedDict
 from copy import deepcopy
 from six import string_types as _string_types
 
-import tensorflow as tf
 import numpy as np
-from tensorflow.python.ops import script_ops as _script_ops
 
-from xfdnn.tools.compile.bin.xfdnn_compiler_tensorflow import TFFrontend
 from xfdnn.rt import xdnn_util
-from xfdnn.rt import xdnn_util_tf
 from xfdnn.rt.xdnn_rt_base import xdnnRT as _xdnnRT
-from xfdnn.rt.xdnn_opt import CPUTransform, HWEmuTransform, FPGATransform
-from ext.PyTurboJPEG import imread as _imread
 
 
 
@@ -25,28 +19,62 @@ from ext.PyTurboJPEG import imread as _imread
 global_fpga_device    = 'cpu:0'   ## TODO: replace with FPGA:0
 global_pyfunc_counter = 0
 
-######################################################
-## tensorflow specific utility functions
-######################################################
-## expanding tf.NodeDef methods
-tf.NodeDef.set_name  = xdnn_util_tf.set_name
-tf.NodeDef.set_shape = xdnn_util_tf.set_shape
-tf.NodeDef.get_shape = xdnn_util_tf.get_shape
-tf.NodeDef.get_dtype = xdnn_util_tf.get_dtype
-
-## expanding tf.GraphDef methods
-tf.GraphDef.get_node_dict   = xdnn_util_tf.get_node_dict
-tf.GraphDef.get_output_dict = xdnn_util_tf.get_output_dict
-tf.GraphDef.get_node_index  = xdnn_util_tf.get_node_index
-tf.GraphDef.remove_nodes    = xdnn_util_tf.remove_nodes
-tf.GraphDef.is_cyclic       = xdnn_util_tf.is_cyclic
-tf.GraphDef.all_cycles      = xdnn_util_tf.all_cycles
+## TensorFlow, the compiler frontend and the transforms are bound by
+## _importFramework() when the first TFxdnnRT is created
+tf             = None
+_script_ops    = None
+TFFrontend     = None
+xdnn_util_tf   = None
+CPUTransform   = None
+HWEmuTransform = None
+FPGATransform  = None
+_imread        = None
+
+def _importFramework():
+    global tf, _script_ops, TFFrontend, xdnn_util_tf, \
+           CPUTransform, HWEmuTransform, FPGATransform, _imread
+    if tf is not None:
+        return
+
+    import tensorflow
+    from tensorflow.python.ops import script_ops
+    from xfdnn.tools.compile.bin.xfdnn_compiler_tensorflow import TFFrontend as _TFFrontend
+    from xfdnn.rt import xdnn_util_tf as _xdnn_util_tf
+    from xfdnn.rt import xdnn_opt
+    from ext.PyTurboJPEG import imread
+
+    ######################################################
+    ## tensorflow specific utility functions
+    ######################################################
+    ## expanding tf.NodeDef methods
+    tensorflow.NodeDef.set_name  = _xdnn_util_tf.set_name
+    tensorflow.NodeDef.set_shape = _xdnn_util_tf.set_shape
+    tensorflow.NodeDef.get_shape = _xdnn_util_tf.get_shape
+    tensorflow.NodeDef.get_dtype = _xdnn_util_tf.get_dtype
+
+    ## expanding tf.GraphDef methods
+    tensorflow.GraphDef.get_node_dict   = _xdnn_util_tf.get_node_dict
+    tensorflow.GraphDef.get_output_dict = _xdnn_util_tf.get_output_dict
+    tensorflow.GraphDef.get_node_index  = _xdnn_util_tf.get_node_index
+    tensorflow.GraphDef.remove_nodes    = _xdnn_util_tf.remove_nodes
+    tensorflow.GraphDef.is_cyclic       = _xdnn_util_tf.is_cyclic
+    tensorflow.GraphDef.all_cycles      = _xdnn_util_tf.all_cycles
+
+    _script_ops    = script_ops
+    TFFrontend     = _TFFrontend
+    xdnn_util_tf   = _xdnn_util_tf
+    CPUTransform   = xdnn_opt.CPUTransform
+    HWEmuTransform = xdnn_opt.HWEmuTransform
+    FPGATransform  = xdnn_opt.FPGATransform
+    _imread        = imread
+    tf             = tensorflow
 
 
 
 
 class TFxdnnRT(_xdnnRT):
     def __init__ (self, args, **kwargs):
+        _importFramework()
         super(TFxdnnRT, self).__init__(TFFrontend, args, **kwargs)
 
         if not hasattr(self, 'graph_def'):
@@ -0,0 +1,745 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+"""
+Shared-memory slot transports for multi-process pipelines.
+
+Both classes hand out numbered slots of preallocated numpy buffers between
+processes with the same contract:
+
+  writer:  slot = q.openWriteId(); bufs = q.accessNumpyBuffer(slot); ...; q.closeWriteId(slot)
+  reader:  slot = q.openReadId();  bufs = q.accessNumpyBuffer(slot); ...; q.closeReadId(slot)
+
+openReadId returns None once close() has been called by a writer.
+
+SharedMemoryQueue passes slot IDs through two mp.Queues, so every slot costs
+two pickled round trips through a feeder thread and a pipe.
+
+Slots default to float32 buffers; pass dtypes to carry e.g. uint8 pixels
+(a quarter of the memory traffic) or int8/int16 tensors instead.
+
+SharedMemoryRing keeps all slot buffers in one shared memory segment and
+passes slot IDs through two index rings (free and ready) that live in shared
+memory as well. Each ring is a bounded array of slot IDs with head/tail
+counters, a semaphore counting queued IDs, and a lock per end. Only N slot
+IDs exist, so the rings are sized to never fill up and pushes never block.
+The ready ring also holds close() end markers, one per reader: up to
+N + numReaders fit, and a push that would overwrite an unread entry
+raises OverflowError.
+Any number of processes may write and read.
+
+NamedSharedMemoryRing is a SharedMemoryRing in a file under /dev/shm, with
+process-shared semaphores inside the file, so processes that were not
+forked from the creator can attach by name (see xdnn_ingest).
+"""
+from __future__ import print_function
+
+import ctypes
+import ctypes.util
+import errno
+import json
+import mmap
+import multiprocessing as mp
+import os
+import struct
+import time
+
+import numpy as np
+
+# returned by tryOpenReadId once a writer has called close()
+CLOSED = -1
+
+# buffer offsets within a ring segment are aligned to a cache line
+_ALIGN = 64
+
+def _dtypes(buf_shapes_list, dtypes):
+  if dtypes is None:
+    return [np.dtype(np.float32)] * len(buf_shapes_list)
+  if len(dtypes) != len(buf_shapes_list):
+    raise ValueError("Need one dtype per buffer, got %d for %d buffers" \
+      % (len(dtypes), len(buf_shapes_list)))
+  return [np.dtype(d) for d in dtypes]
+
+class SharedMemoryQueue(object):
+  def __init__(self, name, length, buf_shapes_list, dtypes=None):
+    """
+    :param name: Name, for messages only.
+    :type name: str.
+    :param length: Number of slots.
+    :type length: int.
+    :param buf_shapes_list: Shape of every buffer in a slot.
+    :type buf_shapes_list: list.
+    :param dtypes: numpy dtype of every buffer in a slot. Default is float32 for all.
+    :type dtypes: list.
+    """
+    self._name = name
+    self._len = length
+    self._np_types = _dtypes(buf_shapes_list, dtypes)
+
+    # openWriteId takes from the free list, closeReadId returns to it
+    self._freeList = mp.Queue(length)
+    # closeWriteId publishes to the read list, openReadId takes from it
+    self._readList = mp.Queue(length)
+
+    self._buf_shapes_list = buf_shapes_list
+    self._buf_sizes_list = [int(np.prod(x)) for x in buf_shapes_list]
+
+    self._shared_memory_arrs = list()
+    for i in range(length):
+      buf_list = list()
+      for buf_size, np_type in zip(self._buf_sizes_list, self._np_types):
+        buf_list.append(mp.Array(ctypes.c_ubyte, max(1, buf_size * np_type.itemsize)))
+      self._shared_memory_arrs.append(buf_list)
+      self._freeList.put(i)
+
+  def close(self):
+    self._readList.put(None)
+
+  def accessBuffer(self, slot_id):
+    return self._shared_memory_arrs[slot_id]
+
+  def accessNumpyBuffer(self, slot_id):
+    buf_list = list()
+    for i in range(len(self._buf_shapes_list)):
+      np_arr = np.frombuffer(self._shared_memory_arrs[slot_id][i].get_obj(), dtype = self._np_types[i],
+                             count = self._buf_sizes_list[i])
+      np_arr = np.reshape(np_arr, self._buf_shapes_list[i], order = 'C')
+      buf_list.append(np_arr)
+    return buf_list
+
+  def openWriteId(self):
+    return self._freeList.get()
+
+  def closeWriteId(self, id):
+    self._readList.put(id)
+
+  def openReadId(self):
+    return self._readList.get()
+
+  def closeReadId(self, id):
+    self._freeList.put(id)
+
+  def dump(self):
+    for i in range(self._len):
+      for j, np_arr in enumerate(self.accessNumpyBuffer(i)):
+        print("Slot=", i, "Array=", j, "Val=", np_arr)
+
+
+class _IndexRing(object):
+  """
+  Bounded FIFO of slot IDs in shared memory: index[ctr] and index[ctr+1]
+  hold the head and tail counters, index[buf:buf+length] the entries.
+  The semaphore and locks default to multiprocessing ones, shared with
+  forked children only.
+  """
+  def __init__(self, index, ctr, buf, length, items=None, pushLock=None, popLock=None):
+    self._index = index
+    self._ctr = ctr
+    self._buf = buf
+    self._len = length
+    self._items = items if items is not None else mp.Semaphore(0)
+    self._pushLock = pushLock if pushLock is not None else mp.Lock()
+    self._popLock = popLock if popLock is not None else mp.Lock()
+
+  def push(self, id):
+    index = self._index
+    with self._pushLock:
+      tail = index[self._ctr + 1]
+      # the head only moves forward, so a stale read errs on the safe side
+      if tail - index[self._ctr] >= self._len:
+        raise OverflowError("Index ring of %d entries is full" % self._len)
+      index[self._buf + tail % self._len] = id
+      index[self._ctr + 1] = tail + 1
+    self._items.release()
+
+  def pop(self, block=True, timeout=None):
+    if timeout is not None:
+      ok = self._items.acquire(block, timeout)
+    else:
+      ok = self._items.acquire(block)
+    if not ok:
+      return None, False
+    index = self._index
+    with self._popLock:
+      head = index[self._ctr]
+      id = index[self._buf + head % self._len]
+      index[self._ctr] = head + 1
+    return id, True
+
+  def qsize(self):
+    return self._index[self._ctr + 1] - self._index[self._ctr]
+
+
+class SharedMemoryRing(object):
+  def __init__(self, name, length, buf_shapes_list, dtypes=None, numReaders=1):
+    """
+    Drop-in for SharedMemoryQueue; see the module docstring.
+
+    :param name: Name, for messages only.
+    :type name: str.
+    :param length: Number of slots.
+    :type length: int.
+    :param buf_shapes_list: Shape of every buffer in a slot.
+    :type buf_shapes_list: list.
+    :param dtypes: numpy dtype of every buffer in a slot. Default is float32 for all.
+    :type dtypes: list.
+    :param numReaders: Reading processes, each ending on its own close() marker.
+    :type numReaders: int.
+    """
+    self._name = name
+    self._len = length
+    self._np_types = _dtypes(buf_shapes_list, dtypes)
+
+    self._buf_shapes_list = buf_shapes_list
+    self._buf_sizes_list = [int(np.prod(x)) for x in buf_shapes_list]
+
+    # one segment for every buffer of every slot, at aligned byte offsets
+    self._buf_offsets = []
+    offset = 0
+    for size, np_type in zip(self._buf_sizes_list, self._np_types):
+      self._buf_offsets.append(offset)
+      offset += -(-size * np_type.itemsize // _ALIGN) * _ALIGN
+    self._slot_bytes = max(_ALIGN, offset)
+    self._mem = mp.RawArray(ctypes.c_ubyte, length * self._slot_bytes + _ALIGN)
+    self._views = None
+
+    # [free head, free tail, ready head, ready tail] + free ring + ready ring
+    # (the ready ring leaves room for close() sentinels)
+    readyLen = 2 * length + max(1, numReaders)
+    self._index = mp.RawArray(ctypes.c_long, 4 + length + readyLen)
+    self._free = _IndexRing(self._index, 0, 4, length)
+    self._ready = _IndexRing(self._index, 2, 4 + length, readyLen)
+    for i in range(length):
+      self._free.push(i)
+
+  def __getstate__(self):
+    # numpy views would be pickled by value; rebuild them in the receiver
+    state = dict(self.__dict__)
+    state['_views'] = None
+    return state
+
+  def _buildViews(self):
+    mem = np.frombuffer(self._mem, dtype=np.uint8)
+    base = -mem.ctypes.data % _ALIGN
+    views = []
+    for i in range(self._len):
+      buf_list = []
+      for shape, size, np_type, offset in zip(self._buf_shapes_list, self._buf_sizes_list,
+                                              self._np_types, self._buf_offsets):
+        start = base + i * self._slot_bytes + offset
+        buf = mem[start:start + size * np_type.itemsize].view(np_type)
+        buf_list.append(buf.reshape(shape))
+      views.append(buf_list)
+    self._views = views
+
+  def nbytes(self):
+    """
+    :returns: int -- size of the shared memory segment holding the slots.
+    """
+    return len(self._mem)
+
+  def close(self):
+    self._ready.push(CLOSED)
+
+  def accessBuffer(self, slot_id):
+    return self.accessNumpyBuffer(slot_id)
+
+  def accessNumpyBuffer(self, slot_id):
+    if self._views is None:
+      self._buildViews()
+    return list(self._views[slot_id])
+
+  def openWriteId(self):
+    return self._free.pop()[0]
+
+  def tryOpenWriteId(self, timeout=0):
+    """
+    :returns: int -- a free slot, or None if none frees up within timeout seconds.
+    """
+    id, ok = self._free.pop(True, timeout)
+    return id if ok else None
+
+  def closeWriteId(self, id):
+    self._ready.push(id)
+
+  def abortWriteId(self, id):
+    """
+    Returns a slot from openWriteId to the free list without publishing it.
+    """
+    self._free.push(id)
+
+  def openReadId(self):
+    id = self._ready.pop()[0]
+    return None if id == CLOSED else id
+
+  def tryOpenReadId(self, timeout=0):
+    """
+    :returns: int -- a readable slot, None if none is ready within timeout seconds, or CLOSED after close().
+    """
+    id, ok = self._ready.pop(True, timeout)
+    return id if ok else None
+
+  def closeReadId(self, id):
+    self._free.push(id)
+
+  def numReady(self):
+    return self._ready.qsize()
+
+  def numFree(self):
+    return self._free.qsize()
+
+  def numSlots(self):
+    return self._len
+
+  def baseAddress(self):
+    """
+    :returns: int -- address of the shared memory segment, e.g. for xdnn_affinity.memoryNodes.
+    """
+    return ctypes.addressof(self._mem)
+
+  def dump(self):
+    for i in range(self._len):
+      for j, np_arr in enumerate(self.accessNumpyBuffer(i)):
+        print("Slot=", i, "Array=", j, "Val=", np_arr)
+
+
+class SharedMemoryBatchRing(SharedMemoryRing):
+  def __init__(self, name, length, buf_shapes_list, batch_sz, dtypes=None):
+    """
+    SharedMemoryRing whose slots are whole batches that writers fill one row
+    at a time. openWriteRow hands out (slot, row) pairs from the batch
+    currently being filled, so rows of one batch are contiguous in shared
+    memory and a reader can submit a slot as a single [batch, ...] block.
+    A slot becomes readable once all of its rows are written and it is full
+    or has been flushed.
+
+      writer:  slot, row = q.openWriteRow(); q.accessNumpyBuffer(slot)[0][row] = ...; q.closeWriteRow(slot, row)
+      reader:  slot = q.openReadId(); n = q.numRows(slot); ...; q.closeReadId(slot)
+
+    :param buf_shapes_list: Shape of every buffer in a slot, batch first.
+    :type buf_shapes_list: list.
+    :param batch_sz: Rows per slot.
+    :type batch_sz: int.
+    :param dtypes: numpy dtype of every buffer in a slot. Default is float32 for all.
+    :type dtypes: list.
+    """
+    for shape in buf_shapes_list:
+      if np.ndim(shape) == 0 or shape[0] != batch_sz:
+        raise ValueError("Batch slot buffers need a leading dimension of %d, got %s" \
+          % (batch_sz, shape))
+    super(SharedMemoryBatchRing, self).__init__(name, length, buf_shapes_list, dtypes)
+    self._batch_sz = batch_sz
+
+    # [filling slot] + per slot [rows claimed, rows written, closed]
+    self._rows = mp.RawArray(ctypes.c_long, 1 + 3 * length)
+    self._rows[0] = -1
+    # time.time() at which the filling slot got its first row
+    self._started = mp.RawValue(ctypes.c_double, 0.)
+    self._rowLock = mp.Lock()
+    # serializes writers that need a fresh slot; never held by closers
+    self._openLock = mp.Lock()
+
+  def _claim(self):
+    # caller holds _rowLock
+    rows = self._rows
+    slot = rows[0]
+    if slot < 0:
+      return None
+    base = 1 + 3 * slot
+    row = rows[base]
+    rows[base] = row + 1
+    if row + 1 == self._batch_sz:
+      rows[base + 2] = 1
+      rows[0] = -1
+    return slot, row
+
+  def openWriteRow(self):
+    """
+    :returns: (int, int) -- slot and row to write one item to.
+    """
+    with self._rowLock:
+      claim = self._claim()
+    if claim is not None:
+      return claim
+
+    with self._openLock:
+      with self._rowLock:
+        claim = self._claim()
+      if claim is not None:
+        return claim
+      slot = self._free.pop()[0]
+      with self._rowLock:
+        base = 1 + 3 * slot
+        self._rows[base] = 0
+        self._rows[base + 1] = 0
+        self._rows[base + 2] = 0
+        self._rows[0] = slot
+        self._started.value = time.time()
+        return self._claim()
+
+  def _publishable(self, slot):
+    # caller holds _rowLock
+    base = 1 + 3 * slot
+    return self._rows[base + 2] == 1 and self._rows[base + 1] == self._rows[base]
+
+  def closeWriteRow(self, slot, row):
+    with self._rowLock:
+      self._rows[2 + 3 * slot] += 1
+      publish = self._publishable(slot)
+    if publish:
+      self._ready.push(slot)
+
+  def pendingAge(self):
+    """
+    :returns: float -- seconds since the first row of the partially filled batch was claimed, or None if there is none.
+    """
+    with self._rowLock:
+      slot = self._rows[0]
+      if slot < 0 or self._rows[1 + 3 * slot] == 0:
+        return None
+      return time.time() - self._started.value
+
+  def flush(self, minAge=0.):
+    """
+    Closes the partially filled batch, if any, so it is published as soon as
+    its claimed rows are written (immediately if they already are).
+
+    :param minAge: Only flush a batch whose first row was claimed at least this many seconds ago.
+    :type minAge: float.
+    :returns: int -- rows in the flushed batch, 0 if nothing was flushed.
+    """
+    with self._rowLock:
+      slot = self._rows[0]
+      if slot < 0 or self._rows[1 + 3 * slot] == 0:
+        return 0
+      if minAge > 0 and time.time() - self._started.value < minAge:
+        return 0
+      self._rows[3 + 3 * slot] = 1
+      self._rows[0] = -1
+      publish = self._publishable(slot)
+      numRows = self._rows[1 + 3 * slot]
+    if publish:
+      self._ready.push(slot)
+    return numRows
+
+  def numRows(self, slot):
+    """
+    :returns: int -- valid rows of a slot returned by openReadId; rows [0, numRows) hold data.
+    """
+    return self._rows[1 + 3 * slot]
+
+
+class SharedNameTable(object):
+  def __init__(self, capacity, width=1024, buf=None):
+    """
+    Fixed-size table of names in shared memory, for passing e.g. image paths
+    of a streaming source to other processes by a small integer id.
+    Writers reuse entries round robin (id % capacity), so capacity must
+    exceed the number of ids in flight.
+
+    :param capacity: Number of entries.
+    :type capacity: int.
+    :param width: Maximum bytes per name (UTF-8); longer names are truncated.
+    :type width: int.
+    :param buf: ctypes char array of capacity * width bytes to use, e.g. in a NamedSharedMemoryRing. Default allocates one.
+    """
+    self._capacity = capacity
+    self._width = width
+    self._buf = buf if buf is not None else mp.RawArray(ctypes.c_char, capacity * width)
+
+  def __len__(self):
+    return self._capacity
+
+  def __setitem__(self, idx, name):
+    if isinstance(name, bytes):
+      data = name
+    else:
+      data = name.encode('utf-8')
+    data = data[:self._width]
+    start = (idx % self._capacity) * self._width
+    self._buf[start:start + len(data)] = data
+    if len(data) < self._width:
+      self._buf[start + len(data)] = b'\0'
+
+  def __getitem__(self, idx):
+    start = (idx % self._capacity) * self._width
+    data = self._buf[start:start + self._width]
+    end = data.find(b'\0')
+    if end >= 0:
+      data = data[:end]
+    return data.decode('utf-8', 'replace') if not isinstance(data, str) else data
+
+
+
+_libc = None
+
+def _getLibc():
+  # sem_* live in libpthread before glibc 2.34 and in libc since
+  global _libc
+  if _libc is None:
+    _libc = ctypes.CDLL(ctypes.util.find_library("pthread") or ctypes.util.find_library("c"),
+                        use_errno=True)
+  return _libc
+
+class _Timespec(ctypes.Structure):
+  _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+class _PosixSemaphore(object):
+  """
+  Process-shared sem_t at a fixed address of a shared mapping, with the
+  acquire/release interface of multiprocessing.Semaphore.
+  """
+  # sizeof(sem_t) is 32 on 64-bit Linux; leave room and keep cache lines apart
+  SIZE = 64
+
+  def __init__(self, address):
+    self._sem = ctypes.c_void_p(address)
+
+  def init(self, value):
+    if _getLibc().sem_init(self._sem, 1, value) != 0:
+      raise OSError(ctypes.get_errno(), "sem_init failed")
+
+  def acquire(self, block=True, timeout=None):
+    libc = _getLibc()
+    while True:
+      if not block:
+        ret = libc.sem_trywait(self._sem)
+      elif timeout is None:
+        ret = libc.sem_wait(self._sem)
+      else:
+        deadline = time.time() + max(timeout, 0.)
+        ts = _Timespec(int(deadline), int((deadline % 1) * 1e9))
+        ret = libc.sem_timedwait(self._sem, ctypes.byref(ts))
+      if ret == 0:
+        return True
+      err = ctypes.get_errno()
+      if err == errno.EINTR:
+        # interrupted by a signal; the deadline is absolute
+        continue
+      if err in (errno.EAGAIN, errno.ETIMEDOUT):
+        return False
+      raise OSError(err, "sem_wait failed")
+
+  def release(self):
+    if _getLibc().sem_post(self._sem) != 0:
+      raise OSError(ctypes.get_errno(), "sem_post failed")
+
+  def __enter__(self):
+    self.acquire()
+    return self
+
+  def __exit__(self, *exc):
+    self.release()
+
+
+class NamedSharedMemoryRing(SharedMemoryRing):
+  """
+  SharedMemoryRing backed by /dev/shm/<name>, attachable by any process:
+
+    ring = NamedSharedMemoryRing("camera0", 64, [(1, 3, 224, 224), (8,)], config={...})
+    # elsewhere, e.g. a capture daemon
+    ring = NamedSharedMemoryRing.attach("camera0")
+    slot = ring.openWriteId(); ...; ring.closeWriteId(slot)
+
+  The file starts with a header describing the slot buffers and a JSON
+  config left by the creator, followed by the free/ready index rings, their
+  semaphores, an optional SharedNameTable and the slots. A process that dies
+  while holding a ring lock blocks the ring; recreate it.
+  """
+  _MAGIC = b"XDNNRNG1"
+  # magic, ready flag, length, buffers, name capacity, name width, config bytes,
+  # slot bytes and the offsets of index, semaphores, names and slots
+  _HEADER = struct.Struct("<8sIIIIIIQQQQQ")
+  _BUFFER = struct.Struct("<8sI8Q")
+  _HEADER_BYTES = 4096
+  # free items/push/pop, ready items/push/pop, id counter lock
+  _NUM_SEMS = 7
+
+  def __init__(self, name, length, buf_shapes_list, dtypes=None, config=None, nameCapacity=0, nameWidth=256):
+    """
+    Creates the ring, replacing a stale file of the same name.
+
+    :param name: File name under /dev/shm.
+    :type name: str.
+    :param length: Number of slots.
+    :type length: int.
+    :param buf_shapes_list: Shape of every buffer in a slot, at most 8 dimensions.
+    :type buf_shapes_list: list.
+    :param dtypes: numpy dtype of every buffer in a slot. Default is float32 for all.
+    :type dtypes: list.
+    :param config: JSON serializable description for attaching processes, see config().
+    :type config: dict.
+    :param nameCapacity: Entries of the SharedNameTable returned by names(); 0 for none.
+    :type nameCapacity: int.
+    :param nameWidth: Maximum bytes per name.
+    :type nameWidth: int.
+    """
+    buf_shapes_list = [tuple(np.atleast_1d(shape)) for shape in buf_shapes_list]
+    np_types = _dtypes(buf_shapes_list, dtypes)
+    configBytes = json.dumps(config or {}).encode("utf-8")
+    if self._HEADER.size + len(buf_shapes_list) * self._BUFFER.size + len(configBytes) > self._HEADER_BYTES:
+      raise ValueError("Too many buffers or too large a config for the %d byte header" % self._HEADER_BYTES)
+    if not nameCapacity:
+      nameWidth = 0
+
+    sizes = [int(np.prod(shape)) for shape in buf_shapes_list]
+    slot_bytes = max(_ALIGN, sum(-(-size * t.itemsize // _ALIGN) * _ALIGN for size, t in zip(sizes, np_types)))
+    indexOffset = self._HEADER_BYTES
+    semOffset = _alignUp(indexOffset + 8 * self._indexLen(length), _ALIGN)
+    namesOffset = semOffset + self._NUM_SEMS * _PosixSemaphore.SIZE
+    dataOffset = _alignUp(namesOffset + nameCapacity * nameWidth, mmap.PAGESIZE)
+    total = dataOffset + length * slot_bytes
+
+    path = self.path(name)
+    if os.path.exists(path):
+      os.unlink(path)
+    fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_RDWR, 0o600)
+    try:
+      os.ftruncate(fd, total)
+      mm = mmap.mmap(fd, total)
+    finally:
+      os.close(fd)
+
+    header = self._HEADER.pack(self._MAGIC, 0, length, len(buf_shapes_list), nameCapacity, nameWidth,
+                               len(configBytes), slot_bytes, indexOffset, semOffset, namesOffset, dataOffset)
+    for shape, np_type in zip(buf_shapes_list, np_types):
+      if len(shape) > 8:
+        raise ValueError("Buffers have at most 8 dimensions, got %s" % (shape,))
+      header += self._BUFFER.pack(np_type.str.encode("ascii"), len(shape), *(list(shape) + [0] * (8 - len(shape))))
+    mm[:len(header)] = header
+    mm[len(header):len(header) + len(configBytes)] = configBytes
+
+    self._map(name, mm)
+    for sem, value in zip(self._sems, [0, 1, 1, 0, 1, 1, 1]):
+      sem.init(value)
+    for i in range(length):
+      self._free.push(i)
+    # attachers wait for this flag
+    struct.pack_into("<I", mm, 8, 1)
+
+  @staticmethod
+  def path(name):
+    """
+    :returns: str -- file backing the ring called name.
+    """
+    return os.path.join("/dev/shm", name)
+
+  @staticmethod
+  def _indexLen(length):
+    # [free head, free tail, ready head, ready tail] + free ring + ready ring + [id counter]
+    return 4 + length + (2 * length + 1) + 1
+
+  @classmethod
+  def attach(cls, name, timeout=10.):
+    """
+    Attaches to a ring created by another process.
+
+    :param timeout: Seconds to wait for the ring to be created.
+    :type timeout: float.
+    """
+    path = cls.path(name)
+    deadline = time.time() + timeout
+    while True:
+      try:
+        fd = os.open(path, os.O_RDWR)
+        try:
+          size = os.fstat(fd).st_size
+          mm = mmap.mmap(fd, size) if size >= cls._HEADER_BYTES else None
+        finally:
+          os.close(fd)
+        if mm is not None and mm[:8] == cls._MAGIC and struct.unpack_from("<I", mm, 8)[0] == 1:
+          break
+      except (IOError, OSError):
+        pass
+      if time.time() > deadline:
+        raise IOError("No shared memory ring %s" % path)
+      time.sleep(0.05)
+    self = cls.__new__(cls)
+    self._map(name, mm)
+    return self
+
+  def _map(self, name, mm):
+    (magic, ready, length, numBufs, nameCapacity, nameWidth, configLen, slot_bytes,
+     indexOffset, semOffset, namesOffset, dataOffset) = self._HEADER.unpack_from(mm, 0)
+    shapes = []
+    np_types = []
+    pos = self._HEADER.size
+    for i in range(numBufs):
+      fields = self._BUFFER.unpack_from(mm, pos)
+      pos += self._BUFFER.size
+      np_types.append(np.dtype(fields[0].rstrip(b"\0").decode("ascii")))
+      shapes.append(tuple(int(d) for d in fields[2:2 + fields[1]]))
+
+    self._name = name
+    self._mmap = mm
+    self._config = json.loads(mm[pos:pos + configLen].decode("utf-8"))
+    self._len = length
+    self._np_types = np_types
+    self._buf_shapes_list = shapes
+    self._buf_sizes_list = [int(np.prod(x)) for x in shapes]
+    self._buf_offsets = []
+    offset = 0
+    for size, np_type in zip(self._buf_sizes_list, np_types):
+      self._buf_offsets.append(offset)
+      offset += -(-size * np_type.itemsize // _ALIGN) * _ALIGN
+    self._slot_bytes = slot_bytes
+    self._mem = (ctypes.c_ubyte * (length * slot_bytes)).from_buffer(mm, dataOffset)
+    self._views = None
+
+    self._index = np.frombuffer(mm, dtype=np.int64, count=self._indexLen(length), offset=indexOffset)
+    base = ctypes.addressof(ctypes.c_ubyte.from_buffer(mm, semOffset))
+    self._sems = [_PosixSemaphore(base + i * _PosixSemaphore.SIZE) for i in range(self._NUM_SEMS)]
+    self._free = _IndexRing(self._index, 0, 4, length, *self._sems[0:3])
+    self._ready = _IndexRing(self._index, 2, 4 + length, 2 * length + 1, *self._sems[3:6])
+    self._names = None
+    if nameCapacity:
+      self._names = SharedNameTable(nameCapacity, nameWidth,
+        (ctypes.c_char * (nameCapacity * nameWidth)).from_buffer(mm, namesOffset))
+
+  def __getstate__(self):
+    return {'_name': self._name}
+
+  def __setstate__(self, state):
+    # reattach by name, e.g. in a spawned child
+    attached = self.attach(state['_name'], 0.)
+    self.__dict__.update(attached.__dict__)
+
+  def name(self):
+    return self._name
+
+  def config(self):
+    """
+    :returns: dict -- config passed by the creator.
+    """
+    return dict(self._config)
+
+  def names(self):
+    """
+    :returns: SharedNameTable -- name table in the ring file, or None.
+    """
+    return self._names
+
+  def newId(self):
+    """
+    :returns: int -- next value of a counter shared by all attached processes, e.g. for SharedNameTable ids.
+    """
+    counter = self._indexLen(self._len) - 1
+    with self._sems[6]:
+      id = int(self._index[counter])
+      self._index[counter] = id + 1
+    return id
+
+  def unlink(self):
+    """
+    Removes the file; attached processes keep their mapping.
+    """
+    try:
+      os.unlink(self.path(self._name))
+    except OSError:
+      pass
+
+def _alignUp(value, align):
+  return -(-value // align) * align
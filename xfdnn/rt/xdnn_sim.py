@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+"""
+Software stand-in for libxfdnn.so.
+
+XDNNManager and XDNNFPGAOp bind the library through ctypes attribute access
+(``lib.Func.argtypes = ...; lib.Func(...)``). XDNNSimLib exposes the same
+symbols as plain Python callables, so the runtime, and every pipeline built
+on it, runs unchanged without a card. Outputs are written with correct
+shapes and become "ready" after a modelled FPGA latency.
+
+Select it by setting LIBXDNN_PATH (or the libFile argument) to a spec string:
+
+  sim
+  sim:latency_ms=2.5,num_pe=2
+  sim:gops=1200,output=random,seed=7
+  sim:output=golden,golden=/path/to/golden.npz
+
+Options
+  latency_ms  fixed latency per submitted batch (overrides gops)
+  gops        modelled throughput; latency = ops * batch / gops, where ops
+              is the per-image "ops" count from the compiler JSON, which
+              must then have one (default 1000 when the JSON has "ops",
+              else no latency, with a warning)
+  num_pe      number of PEs batches are spread over (default 1)
+  output      zeros | random | golden (default zeros)
+  golden      .npz of [N, ...] arrays keyed by output name, replayed in order
+  seed        seed for output=random
+"""
+from __future__ import print_function
+
+from ctypes import POINTER, c_float, cast
+import json
+import sys
+import threading
+import time
+
+import numpy as np
+
+SIM_PREFIX = "sim"
+DEFAULT_GOPS = 1000.
+
+_defaults = {
+  'latency_ms': None,
+  'gops': None,
+  'num_pe': 1,
+  'output': 'zeros',
+  'golden': None,
+  'seed': None,
+}
+
+def isSimSpec(libFile):
+  if not libFile:
+    return False
+  return libFile == SIM_PREFIX or libFile.startswith(SIM_PREFIX + ":") \
+    or libFile == SIM_PREFIX + ".v3"
+
+def parseSpec(libFile):
+  """
+  Parses a "sim:key=val,..." spec into an options dict.
+  """
+  opts = dict(_defaults)
+  spec = libFile[len(SIM_PREFIX):]
+  if spec.endswith(".v3"):
+    # make_dict_args/xdnn_fpga_env append .v3 for v3 overlays
+    spec = spec[:-len(".v3")]
+  spec = spec.lstrip(":")
+  for item in spec.split(","):
+    if not item:
+      continue
+    if "=" not in item:
+      raise ValueError("Malformed simulator option '%s' in %s" % (item, libFile))
+    key, val = item.split("=", 1)
+    if key not in opts:
+      raise ValueError("Unknown simulator option '%s', expected one of %s" \
+        % (key, sorted(opts.keys())))
+    if key in ('latency_ms', 'gops'):
+      val = float(val)
+    elif key in ('num_pe', 'seed'):
+      val = int(val)
+    elif key == 'output' and val not in ('zeros', 'random', 'golden'):
+      raise ValueError("Simulator output must be zeros, random or golden")
+    opts[key] = val
+
+  if opts['output'] == 'golden' and not opts['golden']:
+    raise ValueError("Simulator output=golden needs golden=<file.npz>")
+  return opts
+
+def _val(x):
+  # arguments arrive as ctypes objects when callers pre-wrap them
+  return getattr(x, 'value', x)
+
+def _str(x):
+  x = _val(x)
+  if isinstance(x, bytes) and not isinstance(x, str):
+    x = x.decode('utf-8')
+  return x
+
+
+class _SimFunction(object):
+  """
+  Callable carrying the argtypes/restype attributes xdnn.py assigns.
+  """
+  def __init__(self, fn):
+    self._fn = fn
+    self.argtypes = None
+    self.restype = None
+    self.__name__ = fn.__name__
+
+  def __call__(self, *args):
+    return self._fn(*args)
+
+
+class _SimExecutor(object):
+  def __init__(self, sim, netcfg, peMask):
+    self._sim = sim
+    self._opts = sim._opts
+
+    self._ops = 0.
+    with open(netcfg) as f:
+      obj = json.load(f)
+    self._gops = self._opts['gops']
+    if 'ops' in obj:
+      self._ops = float(obj['ops'])
+    elif self._opts['latency_ms'] is None:
+      if self._gops:
+        raise ValueError("Simulator gops=%g needs an \"ops\" count in %s; use latency_ms instead" \
+          % (self._gops, netcfg))
+      if self._gops is None:
+        print("[sim] %s has no \"ops\" count, batches complete immediately; "
+              "set latency_ms to model the FPGA" % netcfg, file=sys.stderr)
+        self._gops = 0.
+    if self._gops is None:
+      self._gops = DEFAULT_GOPS
+
+    numPE = max(1, self._opts['num_pe'])
+    pes = [pe for pe in range(numPE) if not peMask or peMask & (1 << pe)]
+    self._pes = pes if pes else list(range(numPE))
+    self._peFree = [0.] * numPE
+    self._streams = {}
+    self._busyMs = [0.] * numPE
+    self._lock = threading.Lock()
+
+    self._golden = None
+    self._goldenIdx = 0
+    if self._opts['output'] == 'golden':
+      self._golden = dict(np.load(self._opts['golden']).items())
+    self._rng = np.random.RandomState(self._opts['seed'])
+
+  def batchLatency(self, bsz):
+    if self._opts['latency_ms'] is not None:
+      return self._opts['latency_ms'] / 1000.
+    if not self._gops:
+      return 0.
+    return self._ops * bsz / (self._gops * 1e9)
+
+  def submit(self, streamId, bsz):
+    latency = self.batchLatency(bsz)
+    with self._lock:
+      now = time.time()
+      pe = min(self._pes, key=lambda p: self._peFree[p])
+      done = max(now, self._peFree[pe]) + latency
+      self._peFree[pe] = done
+      self._busyMs[pe] += latency * 1000.
+      self._streams[streamId] = done
+    return done
+
+  def wait(self, streamId):
+    with self._lock:
+      done = self._streams.pop(streamId, None)
+    if done is not None:
+      remaining = done - time.time()
+      if remaining > 0:
+        time.sleep(remaining)
+    return 0
+
+  def fill(self, name, out, bsz):
+    mode = self._opts['output']
+    if mode == 'zeros':
+      out[...] = 0
+    elif mode == 'random':
+      out[...] = self._rng.random_sample(out.shape)
+    else:
+      if name not in self._golden:
+        raise KeyError("Golden file has no tensor for output %s" % name)
+      gold = self._golden[name].reshape(self._golden[name].shape[0], -1)
+      for b in range(bsz):
+        out[b, :] = gold[(self._goldenIdx + b) % gold.shape[0], :out.shape[1]]
+
+  def execute(self, inArr, inNames, numIn, outArr, outSz, outNames, numOut,
+              bsz, streamId, blocking):
+    bsz = _val(bsz)
+    for i in range(_val(numOut)):
+      addr = _val(outArr[i])
+      sz = int(outSz[i])
+      out = np.ctypeslib.as_array(cast(addr, POINTER(c_float)), shape=(bsz * sz,))
+      self.fill(_str(outNames[i]), out.reshape(bsz, sz), bsz)
+    self._goldenIdx += bsz
+
+    streamId = _val(streamId)
+    self.submit(streamId, bsz)
+    if _val(blocking):
+      self.wait(streamId)
+
+  def readCounter(self, devIdx, cuIdx):
+    pe = _val(cuIdx)
+    if pe < 0 or pe >= len(self._busyMs):
+      return 0.
+    return self._busyMs[pe]
+
+
+class XDNNSimLib(object):
+  """
+  Drop-in for the ctypes CDLL handle of libxfdnn.so.
+  """
+  def __init__(self, libFile=SIM_PREFIX):
+    self._name = libFile
+    self._opts = parseSpec(libFile)
+    self._executors = {}
+    self._nextHandle = 1
+
+    for name in dir(self):
+      if name.startswith("_sim_"):
+        setattr(self, name[len("_sim_"):], _SimFunction(getattr(self, name)))
+
+  def _newHandle(self, obj):
+    h = self._nextHandle
+    self._nextHandle += 1
+    self._executors[h] = obj
+    return h
+
+  def _executor(self, h):
+    return self._executors[_val(h)]
+
+  # device handles
+  def _sim_xblasCreate(self, handlePtr, xclbin, kernel, deviceIdx):
+    handlePtr.contents.value = self._newHandle(None)
+    return 0
+
+  def _sim_xblasDestroy(self, handle):
+    self._executors.pop(_val(handle), None)
+
+  def _sim_XDNNGetHostDeviceName(self, name):
+    return b"xdnn_sim"
+
+  # executors
+  def _sim_XDNNMakeScriptExecutor(self, handles, numHandles, weights, netcfg,
+                                  quantizecfg, scaleB, peMask):
+    return self._newHandle(_SimExecutor(self, _str(netcfg), _val(peMask)))
+
+  def _sim_XDNNMakeScriptExecutorAndLoadWeights(self, handles, numHandles,
+                                                weights, netcfg, quantizecfg,
+                                                scaleB, peMask):
+    return self._newHandle(_SimExecutor(self, _str(netcfg), _val(peMask)))
+
+  def _sim_XDNNMakeScriptExecutorAndLoadWeightsFromMem(self, handles,
+      numHandles, numWeightLayers, names, weights, weightsSz, bias, biasSz,
+      netcfg, quantizecfg, scaleB, peMask):
+    return self._newHandle(_SimExecutor(self, _str(netcfg), _val(peMask)))
+
+  def _sim_XDNNExecute_2D_float(self, executor, *args):
+    self._executor(executor).execute(*args)
+
+  def _sim_XDNNWaitForResults(self, executor, streamId):
+    return self._executor(executor).wait(_val(streamId))
+
+  def _sim_XDNNReadHardwareCounter(self, executor, devIdx, cuIdx):
+    return self._executor(executor).readCounter(devIdx, cuIdx)
+
+  def _sim_XDNNV3ComputeWeightsBiasQuantSize(self, *args):
+    return 0
+
+  def _sim_XDNNComputeWeightsBiasQuantSize(self, *args):
+    return 0
+
+  def _sim_XDNNMakeWeightsBiasQuantBlob(self, *args):
+    return 0
+
+  # host-side math used by pipelines
+  def _sim_computeFC(self, weight, bias, data, M, N, K, out):
+    M, N, K = _val(M), _val(N), _val(K)
+    res = np.dot(data.reshape(M, K), weight.reshape(N, K).T) + bias.reshape(1, N)
+    out.reshape(M, N)[...] = res
+
+  def _sim_computeSoftmax(self, data, num, size):
+    v = data.reshape(_val(num), _val(size))
+    v -= v.max(axis=1, keepdims=True)
+    np.exp(v, out=v)
+    v /= v.sum(axis=1, keepdims=True)
+
+  # quantization helpers only matter for bit-accurate runs on a card
+  def _sim_XDNNQuantizeAvgPool(self, *args):
+    return 0
+
+  def _sim_XDNNQuantizeTensor(self, *args):
+    return 0
+
+  def _sim_XDNNUnQuantizeTensor(self, *args):
+    return 0
+
+  def _sim_XDNNV3QuantizeInterLayer(self, *args):
+    return 0
+
+  def _sim_XDNNQuantizeInterLayer(self, *args):
+    return 0
+
+  def _sim_XDNNQuantizeBias(self, *args):
+    return 0
+
+  def _sim_XDNNV3QuantizeBias(self, *args):
+    return 0
+
+  def _sim_XDNNQuantizeWeights(self, *args):
+    return 0
+
+
+def loadLibrary(libFile=SIM_PREFIX):
+  return XDNNSimLib(libFile)
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+"""
+Streaming input sources for long-running pipelines.
+
+A source is an iterable of (name, data) items produced lazily, so a
+pipeline can run over millions of images or an endless stream without
+materializing a file list. data is one of
+
+  - a path (str), read by the preprocessing loaders as before;
+  - an encoded image as a 1-D uint8 array, e.g. JPEG bytes off a socket;
+  - a decoded HxWxC uint8 image, e.g. a video frame.
+
+decodeItem turns the second form into the third and leaves the others
+alone, so workers can pass any item straight to xdnn_io loaders.
+
+  with openSource("watch:/data/incoming") as source:
+    for name, data in source:
+      img = decodeItem(data)
+
+Sources understood by openSource:
+
+  dir:PATH        image files under PATH, walked lazily
+  watch:PATH      files already in PATH, then new ones as they appear
+  stdin           one path per line on standard input
+  zmq:ENDPOINT    PULL socket; messages are [jpeg] or [name, jpeg]
+  video:PATH      frames of a video file
+  PATH            dir: for a directory, video: for a video file
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from ext.PyTurboJPEG import imdecode
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp', '.ppm', '.pgm', '.tif', '.tiff', '.webp')
+VIDEO_EXTS = ('.mp4', '.avi', '.mkv', '.mov', '.webm')
+
+
+def decodeItem(data):
+  """
+  :param data: Item data from a source.
+  :returns: str or numpy.ndarray -- a path or a decoded image, as accepted by the xdnn_io loaders.
+  """
+  if isinstance(data, np.ndarray) and data.ndim == 1:
+    img = imdecode(data)
+    if img is None:
+      raise ValueError("Unable to decode %d byte image" % data.size)
+    return img
+  return data
+
+
+class InputSource(object):
+  """
+  Base class: iterate for (name, data) items, close() to release resources.
+  """
+  def __iter__(self):
+    raise NotImplementedError()
+
+  def close(self):
+    pass
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+
+def _isImage(name, exts):
+  return not name.startswith('.') and os.path.splitext(name)[1].lower() in exts
+
+
+class ListSource(InputSource):
+  def __init__(self, paths):
+    """
+    :param paths: Image paths, e.g. from xdnn_io.getFilePaths.
+    :type paths: list.
+    """
+    self._paths = paths
+
+  def __iter__(self):
+    for path in self._paths:
+      yield path, path
+
+
+class DirectorySource(InputSource):
+  def __init__(self, root, recursive=True, exts=IMAGE_EXTS):
+    """
+    :param root: Directory to read.
+    :type root: str.
+    :param recursive: Descend into subdirectories.
+    :type recursive: bool.
+    :param exts: Lower case file extensions to accept.
+    :type exts: tuple.
+    """
+    self._root = root
+    self._recursive = recursive
+    self._exts = exts
+
+  def __iter__(self):
+    # one directory listing in memory at a time
+    for dirpath, dirnames, filenames in os.walk(self._root):
+      dirnames.sort()
+      if not self._recursive:
+        del dirnames[:]
+      for name in sorted(filenames):
+        if _isImage(name, self._exts):
+          path = os.path.join(dirpath, name)
+          yield path, path
+
+
+class WatchedDirectorySource(InputSource):
+  def __init__(self, root, pollInterval=1., exts=IMAGE_EXTS, existing=True):
+    """
+    Yields files as they appear in root, never ending. A file is yielded
+    once its size has stayed the same across two polls, so writers that
+    do not rename complete files into place are not read half written.
+
+    :param root: Directory to watch.
+    :type root: str.
+    :param pollInterval: Seconds between directory scans.
+    :type pollInterval: float.
+    :param exts: Lower case file extensions to accept.
+    :type exts: tuple.
+    :param existing: Also yield files present when iteration starts.
+    :type existing: bool.
+    """
+    self._root = root
+    self._pollInterval = pollInterval
+    self._exts = exts
+    self._existing = existing
+    self._closed = False
+
+  def _scan(self):
+    sizes = {}
+    for name in os.listdir(self._root):
+      if not _isImage(name, self._exts):
+        continue
+      try:
+        sizes[name] = os.path.getsize(os.path.join(self._root, name))
+      except OSError:
+        pass
+    return sizes
+
+  def __iter__(self):
+    seen = set()
+    if not self._existing:
+      seen.update(self._scan())
+    pending = {}
+    while not self._closed:
+      sizes = self._scan()
+      for name in sorted(sizes):
+        if name in seen:
+          continue
+        if pending.get(name) == sizes[name]:
+          seen.add(name)
+          del pending[name]
+          path = os.path.join(self._root, name)
+          yield path, path
+        else:
+          pending[name] = sizes[name]
+      # forget files that were removed, so the set tracks the directory
+      seen.intersection_update(sizes)
+      for name in [n for n in pending if n not in sizes]:
+        del pending[name]
+      time.sleep(self._pollInterval)
+
+  def close(self):
+    self._closed = True
+
+
+class LineSource(InputSource):
+  def __init__(self, stream=None):
+    """
+    :param stream: File object with one path per line. Default is sys.stdin.
+    """
+    self._stream = stream
+
+  def __iter__(self):
+    stream = self._stream if self._stream is not None else sys.stdin
+    # readline instead of iteration: Python 2 file iteration reads ahead in blocks
+    for line in iter(stream.readline, ''):
+      path = line.strip()
+      if path:
+        yield path, path
+
+
+class ZmqSource(InputSource):
+  def __init__(self, endpoint, bind=True, hwm=64):
+    """
+    :param endpoint: ZMQ endpoint, e.g. "tcp://*:5560".
+    :type endpoint: str.
+    :param bind: Bind the PULL socket; otherwise connect to a PUSH that binds.
+    :type bind: bool.
+    :param hwm: Receive high water mark; senders block once this many messages are queued.
+    :type hwm: int.
+    """
+    import zmq
+    self._zmq = zmq
+    self._context = zmq.Context()
+    self._socket = self._context.socket(zmq.PULL)
+    self._socket.setsockopt(zmq.RCVHWM, hwm)
+    if bind:
+      self._socket.bind(endpoint)
+    else:
+      self._socket.connect(endpoint)
+    self._endpoint = endpoint
+
+  def __iter__(self):
+    count = 0
+    while True:
+      try:
+        parts = self._socket.recv_multipart()
+      except self._zmq.ZMQError:
+        # socket closed
+        return
+      if len(parts) >= 2:
+        name = parts[0].decode('utf-8', 'replace')
+      else:
+        name = "%s#%d" % (self._endpoint, count)
+      count += 1
+      yield name, np.frombuffer(parts[-1], dtype=np.uint8)
+
+  def close(self):
+    self._socket.close(linger=0)
+    self._context.term()
+
+
+class VideoSource(InputSource):
+  def __init__(self, path, step=1):
+    """
+    :param path: Video file, or anything else cv2.VideoCapture opens.
+    :type path: str.
+    :param step: Yield every step-th frame.
+    :type step: int.
+    """
+    self._path = path
+    self._step = step
+
+  def __iter__(self):
+    import cv2
+    cap = cv2.VideoCapture(self._path)
+    if not cap.isOpened():
+      raise IOError("Unable to open video %s" % self._path)
+    try:
+      frame = 0
+      while True:
+        ok, img = cap.read()
+        if not ok:
+          return
+        if frame % self._step == 0:
+          yield "%s#%d" % (self._path, frame), img
+        frame += 1
+    finally:
+      cap.release()
+
+
+def openSource(spec):
+  """
+  :param spec: Source description, see the module docstring.
+  :type spec: str.
+  :returns: InputSource.
+  """
+  kind, sep, arg = spec.partition(':')
+  if kind == 'dir' and sep:
+    return DirectorySource(arg)
+  if kind == 'watch' and sep:
+    return WatchedDirectorySource(arg)
+  if kind == 'zmq' and sep:
+    return ZmqSource(arg)
+  if kind == 'video' and sep:
+    return VideoSource(arg)
+  if spec == 'stdin' or spec == '-':
+    return LineSource()
+  if os.path.isdir(spec):
+    return DirectorySource(spec)
+  if os.path.splitext(spec)[1].lower() in VIDEO_EXTS:
+    return VideoSource(spec)
+  raise ValueError("Unknown input source %r" % spec)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+#
+# // SPDX-License-Identifier: BSD-3-CLAUSE
+#
+# (C) Copyright 2019, Xilinx, Inc.
+#
+"""
+On-disk cache of preprocessed input tensors.
+
+Perpetual and benchmark runs feed the same images through the same
+preprocessing over and over. TensorCache stores the float32 result of a
+PreprocessPlan once per (image path, mtime, size, plan digest) as a .npy
+shard and memory-maps it on later hits, so repeated passes (and restarts)
+skip JPEG decode and resize entirely.
+
+  cache = TensorCache("/tmp/xdnn_tensors", maxBytes=4 << 30)
+  blob, shape = xdnn_io.loadImageBlobFromFile(path, ..., cache=cache)
+
+Layout: <root>/<plan digest>/<key>.<H>x<W>x<C>.npy, where H, W, C is the
+decoded image shape that the loaders return alongside the tensor. The index
+(key -> shard) is rebuilt from the directory listing, so several
+preprocessing processes can share a root without coordinating: shards are
+written to a temporary file and renamed into place. Hits refresh the shard's
+mtime, and once the cache grows past maxBytes the least recently used shards
+are removed.
+"""
+from __future__ import print_function
+
+import hashlib
+import os
+import time
+
+import numpy as np
+
+
+class TensorCache(object):
+  def __init__(self, root, maxBytes=1 << 30, rescanInterval=1.):
+    """
+    :param root: Cache directory, created if missing.
+    :type root: str.
+    :param maxBytes: Size cap; least recently used shards are evicted above it.
+    :type maxBytes: int.
+    :param rescanInterval: Minimum seconds between directory rescans on a miss, to pick up shards written by other processes.
+    :type rescanInterval: float.
+    """
+    self._root = os.path.abspath(root)
+    self._maxBytes = maxBytes
+    self._rescanInterval = rescanInterval
+    self._index = {}      # (plan digest, key) -> (shard path, orig shape, bytes)
+    self._bytes = 0
+    self._lastScan = 0.
+    self.hits = 0
+    self.misses = 0
+
+    if not os.path.isdir(self._root):
+      os.makedirs(self._root)
+    self._scan()
+
+  def _scan(self):
+    index = {}
+    total = 0
+    for planDir in os.listdir(self._root):
+      planPath = os.path.join(self._root, planDir)
+      if not os.path.isdir(planPath):
+        continue
+      for name in os.listdir(planPath):
+        parts = name.split(".")
+        if len(parts) != 3 or parts[2] != "npy":
+          continue
+        try:
+          shape = tuple(int(d) for d in parts[1].split("x"))
+          size = os.path.getsize(os.path.join(planPath, name))
+        except (ValueError, OSError):
+          continue
+        index[(planDir, parts[0])] = (os.path.join(planPath, name), shape, size)
+        total += size
+    self._index = index
+    self._bytes = total
+    self._lastScan = time.time()
+
+  @staticmethod
+  def _key(imgFile):
+    path = os.path.abspath(imgFile)
+    st = os.stat(path)
+    return hashlib.sha1(("%s|%r|%d" % (path, st.st_mtime, st.st_size)).encode("utf-8")).hexdigest()
+
+  def get(self, digest, imgFile):
+    """
+    :returns: (numpy.memmap, tuple) -- cached tensor and decoded image shape, or (None, None).
+    """
+    key = (digest, self._key(imgFile))
+    entry = self._index.get(key)
+    if entry is None and time.time() - self._lastScan > self._rescanInterval:
+      self._scan()
+      entry = self._index.get(key)
+    if entry is None:
+      return None, None
+
+    path, shape, _ = entry
+    try:
+      # copy-on-write: callers may modify the tensor without touching the shard
+      arr = np.load(path, mmap_mode='c')
+      os.utime(path, None)
+    except (IOError, OSError, ValueError):
+      self._drop(key)
+      return None, None
+    return arr, shape
+
+  def put(self, digest, imgFile, tensor, shape):
+    key = (digest, self._key(imgFile))
+    planPath = os.path.join(self._root, digest)
+    path = os.path.join(planPath, "%s.%s.npy" % (key[1], "x".join(str(int(d)) for d in shape)))
+    tmp = "%s.%d.tmp" % (path, os.getpid())
+    try:
+      if not os.path.isdir(planPath):
+        os.makedirs(planPath)
+      with open(tmp, "wb") as f:
+        np.save(f, np.ascontiguousarray(tensor, dtype=np.float32))
+      os.rename(tmp, path)
+    except (IOError, OSError):
+      # a full or read-only disk only costs the caching, not the run
+      if os.path.exists(tmp):
+        os.remove(tmp)
+      return
+
+    size = os.path.getsize(path)
+    old = self._index.get(key)
+    if old is not None:
+      self._bytes -= old[2]
+    self._index[key] = (path, tuple(shape), size)
+    self._bytes += size
+    if self._bytes > self._maxBytes:
+      self.evict()
+
+  def _drop(self, key):
+    entry = self._index.pop(key, None)
+    if entry is None:
+      return
+    self._bytes -= entry[2]
+    try:
+      os.remove(entry[0])
+    except OSError:
+      pass
+
+  def evict(self, targetBytes=None):
+    """
+    Removes least recently used shards until the cache holds at most
+    targetBytes (default 90% of maxBytes, so a full cache does not evict on
+    every insert).
+    """
+    if targetBytes is None:
+      targetBytes = int(self._maxBytes * 0.9)
+    # other processes may have added or touched shards
+    self._scan()
+    byAge = []
+    for key, (path, _, _) in self._index.items():
+      try:
+        byAge.append((os.path.getmtime(path), key))
+      except OSError:
+        pass
+    byAge.sort()
+    for _, key in byAge:
+      if self._bytes <= targetBytes:
+        break
+      self._drop(key)
+
+  def run(self, plan, imgFile, out=None):
+    """
+    PreprocessPlan.run through the cache.
+
+    :returns: (numpy.ndarray, tuple) -- as PreprocessPlan.run.
+    """
+    digest = plan.digest()
+    arr, shape = self.get(digest, imgFile)
+    if arr is None:
+      self.misses += 1
+      res, shape = plan.run(imgFile, out)
+      self.put(digest, imgFile, res, shape)
+      return res, shape
+
+    self.hits += 1
+    if out is None:
+      return arr, shape
+    if out.size != arr.size:
+      raise ValueError("out must have %d elements" % arr.size)
+    dst = out.reshape(arr.shape)
+    dst[...] = arr
+    return dst, shape
+
+  def numBytes(self):
+    return self._bytes
+
+  def __len__(self):
+    return len(self._index)